@@ -1,76 +1,159 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Optional
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
 
-from api.models import OptimizeRequest, NodeType
-from models.Customers import Customers
-from models.Vehicles import Vehicles
-from solver.route_exporter import RouteExporter, build_route_for_export
-from solver.routing_model_builder import RoutingModelBuilder
-from solver.solution_printer import SolutionPrinter
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from api.batch import restrict_matrices, run_scenario, scenario_requests, summarize
+from api.jobs import job_manager
+from api.models import OptimizeBatchRequest, OptimizeRequest
+from api.pipeline import OptimizationCancelled, build_shared_matrices, run_optimization
+from api.solution_cache import get_default_solution_cache
+from api.worker_pool import SolverPool, get_pool_size
+from solver.instrumentation import REGISTRY, configure_logging
+
+configure_logging()
+
+
+solver_pool = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global solver_pool
+    size = get_pool_size()
+    if size > 0:
+        solver_pool = SolverPool(size)
+        solver_pool.warmup()
+        job_manager.pool = solver_pool
+    yield
+    job_manager.pool = None
+    if solver_pool is not None:
+        solver_pool.shutdown()
+        solver_pool = None
+
+
+app = FastAPI(lifespan=lifespan)
+
+async def _solve(request):
+    # Senza pool (SOLVER_WORKERS=0) si risolve nel threadpool come prima
+    if solver_pool is None:
+        return await run_in_threadpool(run_optimization, request)
+    return await solver_pool.solve(request)
 
 
-app = FastAPI()
 @app.post("/optimize")
-def optimize(request: OptimizeRequest):
-    # 🔁 Mapping da string ID → index
-    node_id_map = {str(node.id): idx for idx, node in enumerate(request.nodes)}
-    pdp_pairs = []
-    for order in request.orders:
-        pickup_id = str(order.pickup_node_id)
-        delivery_id = str(order.delivery_node_id)
-        if pickup_id in node_id_map and delivery_id in node_id_map:
-            pdp_pairs.append((node_id_map[pickup_id], node_id_map[delivery_id]))
+async def optimize(request: OptimizeRequest):
+    # Richieste identiche (retry, più schede della dashboard) riusano lo stesso solve
+    cache = get_default_solution_cache()
+    if cache is None:
+        return await _solve(request)
+    return await cache.get_or_compute(cache.make_key(request), lambda: _solve(request))
+
+
+@app.post("/optimize/batch")
+async def optimize_batch(request: OptimizeBatchRequest):
+    """
+    Più scenari what-if sugli stessi nodi (flotte, capacità, ordini diversi): la matrice
+    si calcola una volta sola e gli scenari si risolvono in parallelo (nel pool di processi
+    se attivo). Restituisce i risultati per scenario e una tabella di riepilogo.
+    """
+    scenarios = scenario_requests(request)
+    matrices = await run_in_threadpool(build_shared_matrices, request.nodes)
+    runs = []
+    for name, scenario, node_idx in scenarios:
+        scenario_matrices = await run_in_threadpool(restrict_matrices, matrices, node_idx)
+        if solver_pool is None:
+            runs.append(run_in_threadpool(run_scenario, name, scenario, scenario_matrices, node_idx))
         else:
-            return {"error": f"ID non trovato in mapping: {pickup_id} o {delivery_id}"}
-
-    customers = Customers.from_nodes_and_orders(request.nodes, request.orders)
-    customers.pdp_pairs = pdp_pairs  # 👈 assegniamo le coppie costruite correttamente
-    vehicles = Vehicles.from_json(request.vehicles)
-
-    # Ricerca del depot
-    depot_idxs = [i for i, node in enumerate(request.nodes) if node.type == NodeType.DEPOT]
-    if not depot_idxs:
-        return {"error": "Manca un nodo di tipo depot"}
-    depot = depot_idxs[0]
-    vehicles.starts = [depot] * vehicles.number
-    vehicles.ends = [depot] * vehicles.number
-    customers.zero_depot_demands(depot)
-
-    # Validazione
-    from solver.pdp_validator import validate_pdp
-    valid, _ = validate_pdp(customers, vehicles)
-    if not valid:
-        return {"error": "Configurazione PDP non valida"}
-
-    # Costruzione modello e risoluzione
-    builder = RoutingModelBuilder(customers, vehicles)
-    manager, routing = builder.get_model()
-    params = builder.get_default_parameters()
-    assignment = routing.SolveWithParameters(params)
-
-    if not assignment:
-        return {"error": "Nessuna soluzione trovata"}
-
-    printer = SolutionPrinter(manager, routing, assignment, customers, vehicles)
-
-    vehicle_routes = printer.get_vehicle_routes()
-    # Costruisci la lista route con vehicle_id per GraphHopper
-    route = build_route_for_export(vehicle_routes, customers)
-
-    # Fetch tratte da GraphHopper
-    exporter = RouteExporter(route, vehicle_ids=vehicles.ids)
-    exporter.fetch_routes()
-
-    # Esporta (se vuoi salvarli su disco, puoi commentare se no)
-    exporter.export_json("routes.json")
-    exporter.export_geojson("routes.geojson")
-    exporter.export_distances_csv("route_metrics.csv")
-    exporter.visualize_folium("percorso_reale.html")
-    printer.print()
-    return {
-        "solution": printer.get_solution_json(),
-        "geoRoutes": exporter.routes_data  # con segmenti geometrici per mappa
-    }
+            runs.append(solver_pool.solve_scenario(name, scenario, scenario_matrices, node_idx))
+
+    results = []
+    for (name, _, _), result in zip(scenarios, await asyncio.gather(*runs, return_exceptions=True)):
+        # uno scenario che fallisce non invalida gli altri
+        results.append({"name": name, "error": str(result)} if isinstance(result, Exception) else result)
+    return {"scenarios": results, "summary": summarize(results)}
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/optimize/stream")
+async def optimize_stream(request: OptimizeRequest):
+    """
+    Come /optimize ma in server-sent events: un evento "solution" per ogni soluzione
+    migliorativa trovata dal solver, poi "result" con la risposta completa (o "error").
+    Con il pool attivo la ricerca gira in un worker e le soluzioni arrivano tramite una coda
+    del pool; il thread locale si limita a inoltrarle.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    pool = solver_pool
+    cancel_event = threading.Event() if pool is None else pool.make_cancel_event()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def worker():
+        try:
+            on_solution = lambda data: emit("solution", data)
+            if pool is None:
+                result = run_optimization(request, cancel_event=cancel_event, on_solution=on_solution)
+            else:
+                result = pool.run(request, cancel_event=cancel_event, on_solution=on_solution)
+            emit("error" if "error" in result else "result", result)
+        except OptimizationCancelled:
+            emit("error", {"error": "Ottimizzazione annullata"})
+        except Exception as e:
+            emit("error", {"error": str(e)})
+        finally:
+            emit(None, None)
+
+    async def events():
+        thread = threading.Thread(target=worker, name="optimize-stream", daemon=True)
+        thread.start()
+        try:
+            while True:
+                event, data = await queue.get()
+                if event is None:
+                    break
+                yield _sse(event, data)
+        finally:
+            # client disconnesso: ferma la ricerca invece di lasciarla girare
+            cancel_event.set()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Durate delle fasi, callback Python e statistiche del solver in formato Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: OptimizeRequest):
+    # Risposta immediata: risoluzione e tratte girano in background
+    job = job_manager.submit(request)
+    return job.to_json()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} non trovato")
+    return job.to_json()
 
 
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} non trovato")
+    return job.to_json()
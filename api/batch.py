@@ -0,0 +1,74 @@
+from api.models import NodeType, OptimizeRequest
+from api.pipeline import solve_request
+
+
+def scenario_requests(batch):
+    """
+    Una OptimizeRequest per scenario, con gli ordini comuni se lo scenario non ne indica.
+
+    Ogni scenario tiene solo i depot e i nodi referenziati dai propri ordini: un nodo
+    usato soltanto da altri scenari diventerebbe un cliente opzionale con penalità
+    altissima, e verrebbe visitato senza motivo.
+
+    Returns:
+        lista di (nome, OptimizeRequest, node_idx) con node_idx le posizioni dei nodi
+        dello scenario in ``batch.nodes``, per restrict_matrices
+    """
+    requests = []
+    for i, scenario in enumerate(batch.scenarios):
+        orders = scenario.orders if scenario.orders is not None else batch.orders
+        used_ids = {str(o.pickup_node_id) for o in orders} | {str(o.delivery_node_id) for o in orders}
+        node_idx = [j for j, node in enumerate(batch.nodes)
+                    if node.type == NodeType.DEPOT or str(node.id) in used_ids]
+        requests.append((scenario.name or f"scenario-{i + 1}", OptimizeRequest(
+            nodes=[batch.nodes[j] for j in node_idx],
+            orders=orders,
+            vehicles=scenario.vehicles,
+            time_limit_s=scenario.time_limit_s,
+            solution_limit=scenario.solution_limit,
+            knn_neighbours=scenario.knn_neighbours
+        ), node_idx))
+    return requests
+
+
+def restrict_matrices(matrices, node_idx):
+    """Matrici condivise ristrette ai nodi di uno scenario (le stesse se li usa tutti)."""
+    if len(node_idx) == len(matrices["distances"]):
+        return matrices
+    return {name: matrix.submatrix(node_idx) for name, matrix in matrices.items()}
+
+
+def run_scenario(name, request, matrices, node_idx=None):
+    """
+    Risolve uno scenario con le matrici condivise, senza tratte GraphHopper né export.
+    Restituisce la soluzione e le metriche della riga di riepilogo, oppure "error".
+    Con node_idx i nodeIndex della soluzione tornano posizioni in ``batch.nodes``.
+    """
+    plan = solve_request(request, matrices=matrices)
+    if isinstance(plan, dict):
+        return {"name": name, **plan}
+
+    if node_idx is not None:
+        for vehicle in plan.solution["path"]:
+            for stop in vehicle["route"]:
+                stop["nodeIndex"] = node_idx[stop["nodeIndex"]]
+
+    assigned = {str(entry["orderId"]) for entry in plan.solution["assignedOrders"]}
+    return {
+        "name": name,
+        "objective": plan.objective,
+        "vehiclesUsed": plan.printer.solution.vehicles_used(),
+        "droppedOrders": sum(1 for order in request.orders if str(order.id) not in assigned),
+        "solveSeconds": plan.solve_seconds,
+        "solution": plan.solution
+    }
+
+
+def summarize(results):
+    """Tabella di confronto (una riga per scenario, senza le soluzioni) e scenario migliore."""
+    columns = ["name", "objective", "vehiclesUsed", "droppedOrders", "solveSeconds", "error"]
+    table = [{key: result[key] for key in columns if key in result} for result in results]
+    solved = [result for result in results if "error" not in result]
+    # l'obiettivo comprende già costi fissi dei veicoli e penalità dei nodi scartati
+    best = min(solved, key=lambda r: r["objective"], default=None)
+    return {"table": table, "best": best["name"] if best else None}
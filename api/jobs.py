@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from api.pipeline import OptimizationCancelled, run_optimization
+
+
+class JobStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
+class Job:
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = JobStatus.PENDING
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def to_json(self):
+        data = {
+            "jobId": self.id,
+            "status": self.status,
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Esegue le ottimizzazioni in background.
+
+    Con un SolverPool impostato in ``pool`` i job girano nei processi worker e i thread
+    di questo pool si limitano ad attenderli; senza pool la risoluzione avviene qui, nel
+    processo API, contendendo il GIL alle richieste HTTP (le callback del modello sono
+    Python). I job terminati oltre ``max_finished`` vengono dimenticati (i più vecchi per primi).
+    """
+
+    def __init__(self, max_workers=2, max_finished=200):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="optimize-job")
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, request):
+        job = Job(request)
+        if self.pool is not None:
+            # l'evento deve essere visibile dal processo worker
+            job.cancel_event = self.pool.make_cancel_event()
+        with self._lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Annulla un job in attesa o in esecuzione. Restituisce il job o None se sconosciuto."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status in (JobStatus.PENDING, JobStatus.RUNNING):
+                # la pipeline controlla l'evento anche durante la ricerca OR-Tools
+                job.cancel_event.set()
+                if job.status == JobStatus.PENDING:
+                    self._finish(job, JobStatus.CANCELLED)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = JobStatus.RUNNING
+
+        try:
+            if self.pool is not None:
+                result = self.pool.run(job.request, cancel_event=job.cancel_event)
+            else:
+                result = run_optimization(job.request, cancel_event=job.cancel_event)
+            status = JobStatus.FAILED if "error" in result else JobStatus.COMPLETED
+            with self._lock:
+                job.result = result
+                job.error = result.get("error")
+                self._finish(job, status)
+        except OptimizationCancelled:
+            with self._lock:
+                self._finish(job, JobStatus.CANCELLED)
+        except Exception as e:
+            traceback.print_exc()
+            with self._lock:
+                job.error = str(e)
+                self._finish(job, JobStatus.FAILED)
+
+    def _finish(self, job, status):
+        # da chiamare con self._lock acquisito
+        job.status = status
+        job.finished_at = time.time()
+        job.request = None
+
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        for old in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[old.id]
+
+
+job_manager = JobManager(max_workers=int(os.getenv("JOB_WORKERS", "2")))
@@ -67,8 +67,38 @@ class OptimizeRequest(BaseModel):
     nodes: List[Node]
     orders: List[Order]
     vehicles: List[Vehicle]
+    portfolio: bool = False  # più strategie OR-Tools in parallelo, vince la migliore
+    reoptimize: bool = False  # ripianifica dalla posizione attuale dei veicoli
+    # con reoptimize: istante attuale in secondi dall'epoca del piano (stesso riferimento di twOpen/twClose)
+    current_time_s: int = Field(0, alias="currentTimeSeconds", ge=0)
+    time_limit_s: float = Field(10, alias="timeLimitSeconds", gt=0)  # budget di ricerca
+    solution_limit: Optional[int] = Field(None, alias="solutionLimit", gt=0)
+    knn_neighbours: Optional[int] = Field(None, alias="knnNeighbours", gt=0)  # filtro archi k vicini
 
     model_config = {
         "validate_by_name": True,
         "extra": "ignore"
-    }
\ No newline at end of file
+    }
+
+class Scenario(BaseModel):
+    name: Optional[str] = None
+    orders: Optional[List[Order]] = None  # None = ordini comuni del batch
+    vehicles: List[Vehicle]
+    time_limit_s: float = Field(10, alias="timeLimitSeconds", gt=0)
+    solution_limit: Optional[int] = Field(None, alias="solutionLimit", gt=0)
+    knn_neighbours: Optional[int] = Field(None, alias="knnNeighbours", gt=0)
+
+    model_config = {
+        "validate_by_name": True,
+        "extra": "ignore"
+    }
+
+class OptimizeBatchRequest(BaseModel):
+    nodes: List[Node]  # condivisi: la matrice si calcola una volta per tutti gli scenari
+    orders: List[Order] = []
+    scenarios: List[Scenario] = Field(..., min_length=1)
+
+    model_config = {
+        "validate_by_name": True,
+        "extra": "ignore"
+    }
@@ -0,0 +1,281 @@
+import os
+import tempfile
+import time
+from collections import namedtuple
+
+from api.models import NodeType
+from api.reoptimization import prepare_reoptimization
+from models.Customers import Customers
+from models.incremental_matrix import IncrementalMatrixBuilder
+from models.matrix_cache import get_default_cache
+from models.Vehicles import Vehicles
+from solver.route_exporter import RouteExporter, build_route_for_export
+from solver.instrumentation import span
+from solver.portfolio import get_portfolio_executor, solve_portfolio
+from solver.routing_model_builder import RoutingModelBuilder
+from solver.segment_cache import get_default_segment_cache
+from solver.solution_printer import SolutionPrinter
+
+
+# Matrici condivise tra richieste consecutive: si calcolano solo i nodi nuovi
+matrix_builder = IncrementalMatrixBuilder(cache=get_default_cache())
+
+# Esito di solve_request: soluzione estratta più quanto serve per tratte ed export
+SolvedPlan = namedtuple('SolvedPlan', ['solution', 'route', 'vehicle_ids', 'printer', 'objective',
+                                       'solve_seconds', 'portfolio_stats'])
+
+
+class OptimizationCancelled(Exception):
+    """Sollevata quando l'ottimizzazione viene annullata tramite cancel_event."""
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise OptimizationCancelled()
+
+
+class _LiveAssignment:
+    """Vista sulla soluzione corrente durante la ricerca, compatibile con SolutionPrinter."""
+
+    def __init__(self, routing):
+        self.routing = routing
+
+    def Value(self, var):
+        return var.Value()
+
+    def ObjectiveValue(self):
+        return self.routing.CostVar().Value()
+
+
+def _add_cancel_check(routing, cancel_event):
+    # Controllo a ogni soluzione accettata, non a ogni ramo della ricerca: una CustomLimit
+    # richiamerebbe Python per ogni nodo esplorato. Prima della prima soluzione l'annullamento
+    # non viene visto, e la ricerca resta limitata da time_limit_s / solution_limit.
+    def check():
+        if cancel_event.is_set():
+            routing.solver().FinishCurrentSearch()
+
+    routing.AddAtSolutionCallback(check)
+
+
+def _add_solution_callback(manager, routing, customers, vehicles, on_solution):
+    # Chiamata da OR-Tools a ogni soluzione accettata: si inoltrano solo i miglioramenti
+    live = SolutionPrinter(manager, routing, _LiveAssignment(routing), customers, vehicles, cumuls=False)
+    best = [None]
+
+    def callback():
+        objective = routing.CostVar().Value()
+        if best[0] is not None and objective >= best[0]:
+            return
+        best[0] = objective
+        live.refresh()
+        on_solution({"objective": objective, "solution": live.get_solution_json()})
+
+    routing.AddAtSolutionCallback(callback)
+
+
+def _build_model(customers, vehicles, cancel_event=None, on_solution=None, knn_k=None, shared_matrices=False):
+    # con matrici già assegnate (batch) il builder le usa così come sono
+    builder = RoutingModelBuilder(customers, vehicles, use_transit_matrices=True,
+                                  matrix_builder=None if shared_matrices else matrix_builder, knn_k=knn_k)
+    manager, routing = builder.get_model()
+
+    if cancel_event is not None:
+        _add_cancel_check(routing, cancel_event)
+    if on_solution is not None:
+        _add_solution_callback(manager, routing, customers, vehicles, on_solution)
+    return manager, routing, builder
+
+
+def build_shared_matrices(nodes):
+    """
+    Matrici distanza/tempo per un insieme di nodi, da calcolare una volta sola e
+    riusare in più richieste sugli stessi nodi (vedi ``solve_request(matrices=...)``).
+    """
+    customers = Customers.from_nodes_and_orders(nodes, [])
+    with span("matrix"):
+        return matrix_builder.build(customers)
+
+
+def run_optimization(request, cancel_event=None, on_solution=None):
+    """
+    Esegue l'intera pipeline di /optimize: modello, risoluzione, tratte GraphHopper ed export
+    (questi ultimi solo con EXPORT_DIR, vedi _export_files).
+
+    Args:
+        request (OptimizeRequest): richiesta già validata
+        cancel_event (threading.Event, optional): se impostato, la ricerca OR-Tools si ferma
+            alla soluzione successiva e la pipeline solleva OptimizationCancelled
+        on_solution (callable, optional): riceve {"objective", "solution"} a ogni soluzione
+            migliorativa trovata durante la ricerca (ignorato in modalità portfolio)
+
+    Returns:
+        dict con "solution", "geoRoutes" (ed "exportDir" se esportato), oppure {"error": ...}
+    """
+    plan = solve_request(request, cancel_event=cancel_event, on_solution=on_solution)
+    if isinstance(plan, dict):
+        return plan
+
+    # Fetch tratte da GraphHopper
+    with RouteExporter(plan.route, vehicle_ids=plan.vehicle_ids,
+                       segment_cache=get_default_segment_cache()) as exporter:
+        with span("routes"):
+            exporter.fetch_routes()
+        _check_cancelled(cancel_event)
+
+        with span("export"):
+            export_dir = _export_files(exporter)
+    plan.printer.print()
+    response = {
+        "solution": plan.solution,
+        "geoRoutes": exporter.routes_data  # con segmenti geometrici per mappa
+    }
+    if export_dir is not None:
+        response["exportDir"] = export_dir
+    if plan.portfolio_stats is not None:
+        response["portfolioStats"] = plan.portfolio_stats
+    return response
+
+
+def _export_files(exporter):
+    """
+    Export su disco (JSON, GeoJSON, CSV e mappa) solo se è impostata EXPORT_DIR.
+    Ogni richiesta scrive in una propria sottocartella, così richieste concorrenti
+    non si sovrascrivono i file. Restituisce la cartella usata, o None.
+    """
+    base = os.getenv("EXPORT_DIR")
+    if not base:
+        return None
+    os.makedirs(base, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=base)
+    exporter.export_json(os.path.join(folder, "routes.json"))
+    exporter.export_geojson(os.path.join(folder, "routes.geojson"))
+    exporter.export_distances_csv(os.path.join(folder, "route_metrics.csv"))
+    exporter.visualize_folium(os.path.join(folder, "percorso_reale.html"))
+    return folder
+
+
+def solve_request(request, cancel_event=None, on_solution=None, matrices=None):
+    """
+    Parte della pipeline fino alla soluzione estratta (senza tratte GraphHopper né export).
+
+    Args:
+        request (OptimizeRequest): richiesta già validata
+        cancel_event, on_solution: come in run_optimization
+        matrices (dict, optional): matrici già calcolate per ``request.nodes`` (da
+            build_shared_matrices), usate al posto del matrix_builder
+
+    Returns:
+        SolvedPlan, oppure {"error": ...}
+    """
+    with span("parse"):
+        nodes, orders, request_vehicles = request.nodes, request.orders, request.vehicles
+        live = None
+        if request.reoptimize:
+            # Solo il lavoro residuo, con i veicoli nella posizione attuale
+            live = prepare_reoptimization(request)
+            if isinstance(live, dict):
+                return live
+            nodes, orders, request_vehicles = live.nodes, live.orders, live.vehicles
+
+        # 🔁 Mapping da string ID → index
+        node_id_map = {str(node.id): idx for idx, node in enumerate(nodes)}
+        pdp_pairs = []
+        for order in orders:
+            pickup_id = str(order.pickup_node_id)
+            delivery_id = str(order.delivery_node_id)
+            if pickup_id in node_id_map and delivery_id in node_id_map:
+                pdp_pairs.append((node_id_map[pickup_id], node_id_map[delivery_id]))
+            else:
+                return {"error": f"ID non trovato in mapping: {pickup_id} o {delivery_id}"}
+
+    with span("customers"):
+        customers = Customers.from_nodes_and_orders(nodes, orders)
+        customers.pdp_pairs = pdp_pairs  # 👈 assegniamo le coppie costruite correttamente
+        vehicles = Vehicles.from_json(request_vehicles)
+
+    # Ricerca del depot
+    depot_idxs = [i for i, node in enumerate(nodes) if node.type == NodeType.DEPOT]
+    if not depot_idxs:
+        return {"error": "Manca un nodo di tipo depot"}
+    depot = depot_idxs[0]
+    vehicles.starts = [depot] * vehicles.number
+    vehicles.ends = [depot] * vehicles.number
+    customers.zero_depot_demands(depot)
+
+    if live is not None:
+        vehicles.starts = [depot if node_id is None else node_id_map[node_id] for node_id in live.start_node_ids]
+        customers.live_start_nodes = {node_id_map[node_id] for node_id in live.start_node_ids if node_id is not None}
+        customers.start_time_s = live.start_time_s
+        customers.time_horizon = max(customers.time_horizon, live.start_time_s + 3600)
+        vehicle_idx = {str(v.id): i for i, v in enumerate(live.vehicles)}
+        customers.set_onboard_orders(
+            [(order, vehicle_idx[str(order.assigned_vehicle_id)]) for order in live.onboard],
+            vehicles.starts
+        )
+
+    # Validazione
+    from solver.pdp_validator import validate_pdp
+    valid, _ = validate_pdp(customers, vehicles)
+    if not valid:
+        return {"error": "Configurazione PDP non valida"}
+
+    shared = matrices is not None
+    if shared:
+        if len(matrices["distances"]) != customers.number:
+            return {"error": "Matrici condivise non coerenti con i nodi della richiesta"}
+        customers.distmat = matrices["distances"]
+        if "times" in matrices:
+            customers.timemat = matrices["times"]
+
+    # Costruzione modello e risoluzione
+    portfolio_stats = None
+    solve_start = time.perf_counter()
+    if request.portfolio:
+        # Più strategie in processi paralleli (in sequenza nei worker del pool), si tiene la migliore
+        if not shared:
+            with span("matrix"):
+                matrix_builder.build(customers)
+        _check_cancelled(cancel_event)
+        with span("solve"):
+            manager, routing, assignment, portfolio_stats = solve_portfolio(
+                customers, vehicles, time_limit_s=request.time_limit_s, solution_limit=request.solution_limit,
+                executor=get_portfolio_executor())
+        _check_cancelled(cancel_event)
+    else:
+        assignment = None
+        if request.knn_neighbours is not None:
+            # Grafo sparso: PATH_CHEAPEST_ARC resta facilmente senza archi ammessi, meglio l'inserimento
+            manager, routing, builder = _build_model(customers, vehicles, cancel_event, on_solution,
+                                                     knn_k=request.knn_neighbours, shared_matrices=shared)
+            params = builder.get_default_parameters("LOCAL_CHEAPEST_INSERTION", time_limit_s=request.time_limit_s,
+                                                    solution_limit=request.solution_limit)
+            _check_cancelled(cancel_event)
+            assignment = builder.solve(params)
+            _check_cancelled(cancel_event)
+            if not assignment:
+                print("⚠️ Nessuna soluzione con il filtro dei vicini, si riprova con il grafo completo")
+
+        if not assignment:
+            manager, routing, builder = _build_model(customers, vehicles, cancel_event, on_solution,
+                                                     shared_matrices=shared)
+            params = builder.get_default_parameters(time_limit_s=request.time_limit_s,
+                                                    solution_limit=request.solution_limit)
+            _check_cancelled(cancel_event)
+            assignment = builder.solve(params)
+            _check_cancelled(cancel_event)
+
+    if not assignment:
+        return {"error": "Nessuna soluzione trovata"}
+    solve_seconds = time.perf_counter() - solve_start
+
+    with span("extraction"):
+        # una sola lettura dell'assignment, condivisa da JSON, tratte e stampa
+        printer = SolutionPrinter(manager, routing, assignment, customers, vehicles)
+
+        # Costruisci la lista route con vehicle_id per GraphHopper
+        route = build_route_for_export(printer.solution, customers)
+        solution = printer.get_solution_json()
+
+    return SolvedPlan(solution, route, vehicles.ids, printer, assignment.ObjectiveValue(),
+                      solve_seconds, portfolio_stats)
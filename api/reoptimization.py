@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+from api.models import Node, NodeType, OrderStatus, VehicleStatus
+
+# Problema ridotto al solo lavoro residuo, con i veicoli nella loro posizione attuale
+LivePlan = namedtuple('LivePlan', ['nodes', 'orders', 'onboard', 'vehicles', 'start_node_ids', 'start_time_s'])
+
+# Ordini da pianificare per intero (pickup + delivery)
+OPEN_STATUSES = (OrderStatus.PENDING, OrderStatus.ASSIGNED)
+
+
+def vehicle_start_node_id(vehicle):
+    return f"vehicle:{vehicle.id}"
+
+
+def prepare_reoptimization(request):
+    """
+    Riduce una OptimizeRequest al lavoro ancora da fare mentre la flotta è in strada.
+
+    - ordini PENDING / ASSIGNED: coppie pickup-delivery da pianificare
+    - ordini IN_PROGRESS: merce già a bordo, resta solo la delivery, vincolata al veicolo
+    - ordini DELIVERED / FAILED e nodi non più referenziati: esclusi dal modello
+    - veicoli OFFLINE: esclusi; gli altri partono dalla posizione attuale se nota,
+      altrimenti dal depot, all'istante ``current_time_s`` della richiesta
+
+    Returns:
+        LivePlan, oppure {"error": ...} se un ordine in corso non ha un veicolo utilizzabile
+        o la sua consegna cade su un nodo sconosciuto o che non può essere solo suo (condiviso con un
+        ordine aperto o con merce a bordo di un altro veicolo)
+    """
+    vehicles = [v for v in request.vehicles if v.status != VehicleStatus.OFFLINE]
+    positioned = {str(v.id) for v in vehicles if v.current_lat is not None and v.current_lon is not None}
+
+    orders = [o for o in request.orders if o.status in OPEN_STATUSES]
+    onboard = []
+    for order in request.orders:
+        if order.status != OrderStatus.IN_PROGRESS:
+            continue
+        if order.assigned_vehicle_id is None or str(order.assigned_vehicle_id) not in positioned:
+            return {"error": f"Ordine in corso {order.id} senza veicolo disponibile con posizione nota"}
+        onboard.append(order)
+
+    used_ids = {str(o.pickup_node_id) for o in orders}
+    used_ids |= {str(o.delivery_node_id) for o in orders}
+
+    # La consegna di merce a bordo è vincolata al veicolo: il nodo non può servire anche
+    # un ordine aperto, né consegne a bordo di veicoli diversi (stesso veicolo: si sommano)
+    known_ids = {str(n.id) for n in request.nodes}
+    onboard_vehicle = {}
+    for order in onboard:
+        node_id = str(order.delivery_node_id)
+        if node_id not in known_ids:
+            return {"error": f"Ordine in corso {order.id}: nodo di consegna {node_id} sconosciuto"}
+        if node_id in used_ids:
+            return {"error": f"Ordine in corso {order.id}: il nodo di consegna {node_id} è usato anche da un ordine aperto"}
+        vehicle_id = onboard_vehicle.setdefault(node_id, str(order.assigned_vehicle_id))
+        if vehicle_id != str(order.assigned_vehicle_id):
+            return {"error": f"Ordine in corso {order.id}: il nodo di consegna {node_id} ha merce a bordo di più veicoli"}
+    used_ids |= set(onboard_vehicle)
+    nodes = [n for n in request.nodes if n.type == NodeType.DEPOT or str(n.id) in used_ids]
+
+    start_node_ids = []
+    for vehicle in vehicles:
+        if str(vehicle.id) in positioned:
+            node_id = vehicle_start_node_id(vehicle)
+            nodes.append(Node(id=node_id, name=f"Posizione {vehicle.id}", lat=vehicle.current_lat,
+                              lon=vehicle.current_lon, type=NodeType.INTERMEDIATE))
+            start_node_ids.append(node_id)
+        else:
+            start_node_ids.append(None)
+
+    return LivePlan(nodes, orders, onboard, vehicles, start_node_ids, request.current_time_s)
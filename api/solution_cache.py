@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from solver.instrumentation import REGISTRY
+
+
+class SolutionCache:
+    """
+    Cache in memoria delle risposte di /optimize, con deduplicazione delle richieste in corso.
+
+    La chiave è un hash SHA-256 della richiesta canonicalizzata (nodi, ordini, veicoli
+    e parametri del solver, con i valori di default espliciti e le chiavi ordinate),
+    così due richieste identiche danno la stessa chiave anche se il JSON differisce
+    per ordine dei campi o spazi. Le voci scadono dopo ``ttl_s`` secondi e oltre
+    ``max_entries`` si scartano le meno usate di recente (LRU).
+
+    Single-flight: se arriva una richiesta identica a una già in risoluzione non parte
+    un secondo solve, ma si attende il risultato di quello in corso. Le risposte con
+    "error" e le eccezioni non vengono memorizzate.
+
+    Va usata dal solo event loop dell'API (i task in corso sono asyncio.Task).
+
+    Args:
+        max_entries (int): risposte massime in memoria
+        ttl_s (float): validità di una risposta in secondi
+    """
+
+    def __init__(self, max_entries=128, ttl_s=300):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._entries = OrderedDict()  # chiave -> (stored_at, risposta)
+        self._inflight = {}            # chiave -> asyncio.Task del solve in corso
+        self._lock = threading.Lock()
+
+    def make_key(self, request):
+        canonical = json.dumps(request.model_dump(mode="json", by_alias=True),
+                               sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if time.time() - stored_at > self.ttl_s:
+                del self._entries[key]
+                REGISTRY.set("solution_cache_entries", len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._entries[key] = (time.time(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            REGISTRY.set("solution_cache_entries", len(self._entries))
+
+    async def get_or_compute(self, key, compute):
+        """
+        Risposta in cache, oppure quella del solve già in corso per la stessa chiave,
+        oppure il risultato di ``compute()`` (coroutine), che viene poi memorizzato.
+        """
+        response = self.get(key)
+        if response is not None:
+            self._count("hit")
+            return response
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count("coalesced")
+        else:
+            self._count("miss")
+            # task separato: se il client che l'ha avviato si disconnette, gli altri lo attendono comunque
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        if isinstance(response, dict) and "error" not in response:
+            self.put(key, response)
+
+    def _count(self, result):
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            elif result == "miss":
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        REGISTRY.inc("solution_cache_requests_total", result=result)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0
+            }
+
+
+_default_cache = None
+
+
+def get_default_solution_cache():
+    """
+    Cache condivisa del processo API, configurata da variabili d'ambiente:
+    SOLUTION_CACHE_TTL_S (default 300, 0 per disabilitarla)
+    e SOLUTION_CACHE_MAX_ENTRIES (default 128).
+    """
+    global _default_cache
+    if _default_cache is None:
+        ttl_s = float(os.getenv("SOLUTION_CACHE_TTL_S", "300"))
+        if ttl_s <= 0:
+            return None
+        max_entries = int(os.getenv("SOLUTION_CACHE_MAX_ENTRIES", "128"))
+        _default_cache = SolutionCache(max_entries=max_entries, ttl_s=ttl_s)
+    return _default_cache
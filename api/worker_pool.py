@@ -0,0 +1,201 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import Empty
+
+from solver.instrumentation import REGISTRY, span
+
+# Risposta per la richiesta in corso quando il suo worker muore (segfault, OOM killer)
+WORKER_CRASHED = "Worker del solver terminato inaspettatamente, riprovare"
+
+
+def _init_worker():
+    # Un portfolio nel worker gira in sequenza: un pool annidato per worker darebbe
+    # SOLVER_WORKERS × PORTFOLIO_WORKERS processi sugli stessi core
+    os.environ["PORTFOLIO_WORKERS"] = "0"
+    # Import pesanti fatti una volta sola all'avvio del processo worker
+    import numpy  # noqa: F401
+    from ortools.constraint_solver import pywrapcp  # noqa: F401
+    import api.pipeline  # noqa: F401
+    from solver.instrumentation import configure_logging
+    configure_logging()
+
+
+def _warmup():
+    return os.getpid()
+
+
+def _solve_payload(payload, cancel_event=None, solutions=None):
+    """
+    Eseguita nel worker: la richiesta arriva come JSON compatto e viene rivalidata.
+    Restituisce anche le metriche accumulate, da sommare a quelle del processo API.
+
+    Args:
+        cancel_event: Event del Manager del pool, impostato dal processo API per annullare
+        solutions: Queue del Manager su cui inviare le soluzioni migliorative (None a fine ricerca)
+    """
+    from api.models import OptimizeRequest
+    from api.pipeline import run_optimization
+
+    with span("validate"):
+        request = OptimizeRequest.model_validate_json(payload)
+    on_solution = solutions.put if solutions is not None else None
+    try:
+        # se la pipeline fallisce, quanto misurato arriva con la risposta successiva
+        return run_optimization(request, cancel_event=cancel_event, on_solution=on_solution), REGISTRY.drain()
+    finally:
+        if solutions is not None:
+            solutions.put(None)
+
+
+def _solve_scenario_payload(name, payload, matrices, node_idx=None):
+    """Come _solve_payload, per uno scenario di /optimize/batch con le matrici già calcolate."""
+    from api.batch import run_scenario
+    from api.models import OptimizeRequest
+
+    with span("validate"):
+        request = OptimizeRequest.model_validate_json(payload)
+    return run_scenario(name, request, matrices, node_idx), REGISTRY.drain()
+
+
+class SolverPool:
+    """
+    Pool di processi worker pre-avviati per le ottimizzazioni.
+
+    Ogni worker ha già importato ortools, numpy e il codice del modello, così le
+    risoluzioni concorrenti usano core diversi invece di contendersi il GIL di un
+    unico processo. Le richieste viaggiano come JSON compatto (per alias).
+
+    Job e stream passano da ``run``: l'annullamento e le soluzioni intermedie
+    attraversano i processi tramite Event e Queue di un Manager, avviato alla prima
+    richiesta che ne ha bisogno.
+
+    Se un worker muore il ProcessPoolExecutor diventa inutilizzabile: viene sostituito
+    da uno nuovo, la richiesta che era in corso riceve {"error": WORKER_CRASHED} e le
+    successive girano sul pool nuovo. Allo stesso modo si riavvia il Manager se il suo
+    processo non è più attivo.
+
+    Args:
+        size (int): numero di processi worker
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        self._manager = None
+        self._manager_lock = threading.Lock()
+
+    def _new_executor(self):
+        # spawn: il server ha già thread attivi, fork non sarebbe sicuro
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def _replace_executor(self, broken):
+        # più richieste possono accorgersi dello stesso pool rotto: lo si sostituisce una volta
+        with self._executor_lock:
+            if self.executor is not broken:
+                return
+            print("⚠️ Worker del solver terminato, si ricrea il pool di processi")
+            self.executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        """Invia al pool; se era già rotto (crash in una richiesta precedente) lo si ricrea e si riprova."""
+        executor = self.executor
+        try:
+            return executor, executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            executor = self.executor
+            return executor, executor.submit(fn, *args)
+
+    def _get_manager(self):
+        with self._manager_lock:
+            # _process: il Manager non espone altro modo per sapere se il suo processo è vivo
+            if self._manager is not None and not self._manager._process.is_alive():
+                print("⚠️ Manager del solver pool terminato, si riavvia")
+                self._manager = None
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager
+
+    def make_cancel_event(self):
+        """Evento di annullamento visibile dai worker, da passare a ``run``."""
+        return self._get_manager().Event()
+
+    def warmup(self):
+        """Avvia subito tutti i worker invece di crearli alla prima richiesta."""
+        for future in [self.executor.submit(_warmup) for _ in range(self.size)]:
+            future.result()
+        print(f"🚀 Solver pool pronto: {self.size} processi")
+
+    async def solve(self, request):
+        payload = request.model_dump_json(by_alias=True, exclude_none=True)
+        executor, future = self._submit(_solve_payload, payload)
+        try:
+            result, metrics = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return {"error": WORKER_CRASHED}
+        REGISTRY.merge(metrics)
+        return result
+
+    def run(self, request, cancel_event=None, on_solution=None):
+        """
+        Versione bloccante di ``solve`` per i thread di job e stream.
+
+        Args:
+            cancel_event: evento creato con ``make_cancel_event``
+            on_solution (callable, optional): chiamata in questo thread a ogni soluzione
+                migliorativa inviata dal worker
+        """
+        payload = request.model_dump_json(by_alias=True, exclude_none=True)
+        solutions = self._get_manager().Queue() if on_solution is not None else None
+        executor, future = self._submit(_solve_payload, payload, cancel_event, solutions)
+        while solutions is not None:
+            try:
+                data = solutions.get(timeout=0.5)
+            except Empty:
+                if future.done():  # worker terminato senza chiudere la coda
+                    break
+                continue
+            if data is None:
+                break
+            on_solution(data)
+        try:
+            result, metrics = future.result()
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return {"error": WORKER_CRASHED}
+        REGISTRY.merge(metrics)
+        return result
+
+    async def solve_scenario(self, name, request, matrices, node_idx=None):
+        # le matrici (CompactMatrix int32) viaggiano serializzate con lo scenario
+        payload = request.model_dump_json(by_alias=True, exclude_none=True)
+        executor, future = self._submit(_solve_scenario_payload, name, payload, matrices, node_idx)
+        try:
+            result, metrics = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            return {"name": name, "error": WORKER_CRASHED}
+        REGISTRY.merge(metrics)
+        return result
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+def get_pool_size():
+    """SOLVER_WORKERS: numero di processi (default = numero di core, 0 = risoluzione in-process)."""
+    return int(os.getenv("SOLVER_WORKERS", str(os.cpu_count() or 1)))
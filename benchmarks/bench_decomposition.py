@@ -0,0 +1,91 @@
+"""
+Risoluzione di un'istanza PDP molto grande con la decomposizione geografica.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.bench_decomposition --nodes 5000 --vehicles 100 --seconds 40
+
+Esce con codice 1 se la risoluzione supera --target-seconds (default 60) o scarta nodi.
+
+Riferimento (1 core, sweep, 40s di budget più 10s di riparazione):
+    nodes     clusters  vehicles     objective  dropped   seconds
+    4999            25        87      73220483        0      53.7
+"""
+import argparse
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from models.Customers import Customer, Customers
+from models.Vehicles import Vehicles
+from solver.decomposition import solve_decomposed
+
+
+def build_instance(seed, num_nodes, num_vehicles, radius_km=40, capacity=30):
+    """Depot centrale (nodo 0) e (num_nodes - 1) // 2 coppie pickup-delivery con finestre larghe."""
+    rng = np.random.default_rng(seed)
+    center_lat, center_lon = 45.4642, 9.19
+    num_pairs = (num_nodes - 1) // 2
+
+    lat = center_lat + rng.uniform(-1, 1, 2 * num_pairs) * radius_km / 111
+    lon = center_lon + rng.uniform(-1, 1, 2 * num_pairs) * radius_km / (111 * np.cos(np.deg2rad(center_lat)))
+    quantities = rng.integers(1, 6, num_pairs)
+
+    horizon = timedelta(hours=24)
+    stops = [Customer(0, 0, center_lat, center_lon, None, None)]
+    pdp_pairs = []
+    for i in range(num_pairs):
+        pickup, delivery = 2 * i + 1, 2 * i + 2
+        qty = int(quantities[i])
+        stops.append(Customer(pickup, qty, lat[2 * i], lon[2 * i], timedelta(0), horizon))
+        stops.append(Customer(delivery, -qty, lat[2 * i + 1], lon[2 * i + 1], timedelta(hours=1), horizon))
+        pdp_pairs.append((pickup, delivery))
+
+    customers = Customers(prebuilt_customers=stops)
+    customers.time_horizon = int(horizon.total_seconds()) + 3600
+    customers.pdp_pairs = pdp_pairs
+    customers.pdp_pairs_flat = [n for pair in pdp_pairs for n in pair]
+
+    vehicles = Vehicles(capacity=capacity, cost=100, number=num_vehicles, speed_kmph=40)
+    vehicles.starts = [0] * num_vehicles
+    vehicles.ends = [0] * num_vehicles
+    return customers, vehicles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=40)
+    parser.add_argument("--cluster-nodes", type=int, default=200)
+    parser.add_argument("--method", choices=["sweep", "kmeans"], default="sweep")
+    parser.add_argument("--no-repair", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-seconds", type=float, default=60,
+                        help="tempo massimo atteso per l'intera risoluzione")
+    args = parser.parse_args()
+
+    customers, vehicles = build_instance(args.seed, args.nodes, args.vehicles)
+
+    start = time.perf_counter()
+    result = solve_decomposed(customers, vehicles, method=args.method, max_cluster_nodes=args.cluster_nodes,
+                              time_limit_s=args.seconds, repair=not args.no_repair,
+                              repair_time_s=args.seconds / 4, max_workers=args.workers, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    used = result["solution"].vehicles_used()
+    print(f"{'nodes':<8}{'clusters':>10}{'vehicles':>10}{'objective':>14}{'dropped':>9}{'seconds':>10}")
+    print(f"{customers.number:<8}{len(result['clusters']):>10}{used:>10}{result['objective']:>14}"
+          f"{len(result['dropped']):>9}{elapsed:>10.1f}")
+
+    if elapsed <= args.target_seconds and not result["dropped"]:
+        print(f"✅ Entro l'obiettivo: {elapsed:.1f}s ≤ {args.target_seconds:.0f}s, nessun nodo scartato")
+    else:
+        print(f"⚠️ Obiettivo mancato: {elapsed:.1f}s (limite {args.target_seconds:.0f}s), "
+              f"{len(result['dropped'])} nodi scartati")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Tempo di import a freddo dell'API, misurato in processi Python nuovi.
+
+Esce con codice 1 se la mediana supera la soglia o se dopo l'import risultano
+caricate dipendenze pesanti che l'API non usa (matplotlib, pandas, folium):
+pensato per girare in CI e bloccare le regressioni sull'avvio dei worker.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.bench_import_time --module api.api --runs 5 --max-seconds 1.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["matplotlib", "pandas", "folium"]
+
+# eseguito in un interprete pulito: misura solo l'import, non l'avvio di Python
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module, cwd):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=cwd,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api.api")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.2,
+                        help="soglia sulla mediana dei tempi di import")
+    parser.add_argument("--forbid", nargs="*", default=HEAVY_MODULES,
+                        help="moduli che non devono risultare importati")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [measure(args.module, root) for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    median = statistics.median(times)
+
+    loaded = set(runs[-1]["modules"])
+    leaked = [m for m in args.forbid if m in loaded]
+
+    print(f"{'module':<12}{'runs':>6}{'min_s':>9}{'median_s':>10}{'max_s':>9}{'limit_s':>9}")
+    print(f"{args.module:<12}{args.runs:>6}{min(times):>9.3f}{median:>10.3f}{max(times):>9.3f}{args.max_seconds:>9.2f}")
+
+    failed = False
+    if median > args.max_seconds:
+        print(f"❌ Import di {args.module} troppo lento: {median:.3f}s > {args.max_seconds:.2f}s")
+        failed = True
+    if leaked:
+        print(f"❌ Dipendenze pesanti caricate all'import di {args.module}: {', '.join(leaked)}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Tempo di import entro la soglia.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Suite di benchmark riproducibile: istanze PDP con seed, scala di dimensioni e, per
+ogni fase (matrice, modello, solve, estrazione, export), tempo e picco di memoria.
+
+I risultati vanno in un file JSON; il comando compare confronta due file ed esce
+con codice 1 se tempi, memoria, obiettivo o nodi scartati peggiorano oltre le soglie.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.bench_suite run --sizes 10 30 60 100 500 1000 --output base.json
+    python -m benchmarks.bench_suite compare base.json new.json --time-tolerance 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from models.Customers import Customers
+from models.Vehicles import Vehicles
+from solver.export_solution import export_dropped_nodes_csv, export_vehicle_routes_csv
+from solver.routing_model_builder import RoutingModelBuilder
+from solver.solution_printer import SolutionPrinter
+
+SIZES = [10, 30, 60, 100, 250, 500, 1000, 2000]
+PHASES = ["matrix", "model", "solve", "extraction", "export"]
+
+
+def build_instance(seed, num_stops, num_pairs, num_vehicles):
+    """Come test_runner.run_test, ma con seed: stessa istanza a ogni esecuzione."""
+    np.random.seed(seed)
+    customers = Customers(num_stops=num_stops, min_demand=0, max_demand=0,
+                          box_size=10, min_tw=1, max_tw=4)
+    vehicles = Vehicles(capacity=[25] * num_vehicles, cost=[0] * num_vehicles, speed_kmph=40)
+    vehicles.return_starting_callback(customers, sameStartFinish=False)
+    customers.add_pickup_delivery_requests(num_pairs=num_pairs, min_qty=5, max_qty=15)
+    return customers, vehicles
+
+
+def _read_peak_rss_kb():
+    # VmHWM: picco di RSS del processo, azzerabile su Linux tramite clear_refs
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # altrove: massimo dall'avvio del processo (non per fase); ru_maxrss è in byte su macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == "darwin" else maxrss
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class PhaseTimer:
+    """Tempo (perf_counter) e picco di RSS di ogni fase, in ordine di esecuzione."""
+
+    def __init__(self):
+        self.phases = {}
+        self.per_phase_memory = True
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.per_phase_memory = _reset_peak_rss() and self.per_phase_memory
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = {
+                "seconds": time.perf_counter() - start,
+                "peak_rss_mb": _read_peak_rss_kb() / 1024,
+            }
+
+
+def run_size(num_stops, seed, seconds, solution_limit, use_transit_matrices, penalty=1_000_000):
+    num_pairs = max(1, round(num_stops * 0.15))
+    num_vehicles = max(8, num_stops // 25)
+    timer = PhaseTimer()
+
+    with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as out_dir:
+        customers, vehicles = build_instance(seed, num_stops, num_pairs, num_vehicles)
+
+        with timer.phase("matrix"):
+            customers.make_distance_mat()
+
+        with timer.phase("model"):
+            builder = RoutingModelBuilder(customers, vehicles, penalty=penalty,
+                                          use_transit_matrices=use_transit_matrices)
+            manager, routing = builder.get_model()
+            parameters = builder.get_default_parameters(time_limit_s=seconds, solution_limit=solution_limit)
+
+        with timer.phase("solve"):
+            assignment = routing.SolveWithParameters(parameters)
+
+        dropped = []
+        with timer.phase("extraction"):
+            if assignment:
+                printer = SolutionPrinter(manager, routing, assignment, customers, vehicles)
+                solution = printer.solution
+                dropped = printer.get_dropped_nodes()
+
+        with timer.phase("export"):
+            if assignment:
+                export_vehicle_routes_csv(solution, customers, output_path=os.path.join(out_dir, "solution.csv"))
+                export_dropped_nodes_csv(dropped, output_path=os.path.join(out_dir, "dropped.csv"))
+
+    return {
+        "size": num_stops,
+        "pairs": len(customers.pdp_pairs),
+        "vehicles": num_vehicles,
+        "objective": assignment.ObjectiveValue() if assignment else None,
+        "dropped": len(dropped) if assignment else None,
+        "phases": timer.phases,
+        "total_seconds": sum(p["seconds"] for p in timer.phases.values()),
+        "per_phase_memory": timer.per_phase_memory,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _environment():
+    from ortools import __version__ as ortools_version
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "ortools": ortools_version,
+        "git_commit": _git_commit(),
+    }
+
+
+def cmd_run(args):
+    results = []
+    print(f"{'size':<7}{'pairs':>6}{'veh':>5}" + "".join(f"{p + '_s':>13}" for p in PHASES)
+          + f"{'peak_mb':>9}{'objective':>12}{'dropped':>9}")
+    for size in args.sizes:
+        r = run_size(size, args.seed, args.seconds, args.solution_limit, not args.callbacks)
+        results.append(r)
+        peak = max(p["peak_rss_mb"] for p in r["phases"].values())
+        print(f"{r['size']:<7}{r['pairs']:>6}{r['vehicles']:>5}"
+              + "".join(f"{r['phases'][p]['seconds']:>13.3f}" for p in PHASES)
+              + f"{peak:>9.1f}{str(r['objective']):>12}{str(r['dropped']):>9}")
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {"seed": args.seed, "seconds": args.seconds, "solution_limit": args.solution_limit,
+                   "use_transit_matrices": not args.callbacks},
+        "environment": _environment(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Risultati salvati in: {args.output}")
+
+
+def compare_reports(base, new, time_tolerance, min_seconds, memory_tolerance, objective_tolerance):
+    """Righe di confronto e regressioni trovate, per le dimensioni presenti in entrambi i file."""
+    base_by_size = {r["size"]: r for r in base["results"]}
+    rows, regressions = [], []
+
+    for r in new["results"]:
+        b = base_by_size.get(r["size"])
+        if b is None:
+            continue
+        for phase in PHASES:
+            old_s, new_s = b["phases"][phase]["seconds"], r["phases"][phase]["seconds"]
+            old_mb, new_mb = b["phases"][phase]["peak_rss_mb"], r["phases"][phase]["peak_rss_mb"]
+            slower = new_s > old_s * (1 + time_tolerance) and new_s - old_s > min_seconds
+            # la memoria è confrontabile per fase solo se entrambe le esecuzioni l'hanno misurata così
+            heavier = (b.get("per_phase_memory") and r.get("per_phase_memory")
+                       and new_mb > old_mb * (1 + memory_tolerance))
+            rows.append((r["size"], phase, old_s, new_s, old_mb, new_mb, slower or heavier))
+            if slower:
+                regressions.append(f"size {r['size']} {phase}: {old_s:.3f}s → {new_s:.3f}s")
+            if heavier:
+                regressions.append(f"size {r['size']} {phase}: picco {old_mb:.1f}MB → {new_mb:.1f}MB")
+
+        if b["objective"] is not None and r["objective"] is None:
+            regressions.append(f"size {r['size']}: nessuna soluzione (prima {b['objective']})")
+        elif b["objective"] is not None and r["objective"] > b["objective"] * (1 + objective_tolerance):
+            regressions.append(f"size {r['size']}: obiettivo {b['objective']} → {r['objective']}")
+        if b["dropped"] is not None and r["dropped"] is not None and r["dropped"] > b["dropped"]:
+            regressions.append(f"size {r['size']}: nodi scartati {b['dropped']} → {r['dropped']}")
+
+    return rows, regressions
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if base.get("config") != new.get("config"):
+        print(f"⚠️ Configurazioni diverse: {base.get('config')} vs {new.get('config')}")
+
+    rows, regressions = compare_reports(base, new, args.time_tolerance, args.min_seconds,
+                                        args.memory_tolerance, args.objective_tolerance)
+
+    print(f"{'size':<7}{'phase':<12}{'base_s':>10}{'new_s':>10}{'ratio':>8}{'base_mb':>10}{'new_mb':>10}")
+    for size, phase, old_s, new_s, old_mb, new_mb, flagged in rows:
+        ratio = new_s / old_s if old_s else float("inf")
+        mark = "  ❌" if flagged else ""
+        print(f"{size:<7}{phase:<12}{old_s:>10.3f}{new_s:>10.3f}{ratio:>8.2f}{old_mb:>10.1f}{new_mb:>10.1f}{mark}")
+
+    if regressions:
+        print("❌ Regressioni:")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    print("✅ Nessuna regressione oltre le soglie.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="esegue la suite e salva il JSON")
+    run.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    run.add_argument("--seed", type=int, default=0)
+    # il limite sulle soluzioni (non sul tempo) rende l'obiettivo identico a ogni esecuzione;
+    # il tempo resta solo come tetto di sicurezza
+    run.add_argument("--seconds", type=float, default=120)
+    run.add_argument("--solution-limit", type=int, default=100)
+    run.add_argument("--callbacks", action="store_true", help="callback Python invece delle matrici native")
+    run.add_argument("--output", default="bench_results.json")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="confronta due JSON (base, nuovo)")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--time-tolerance", type=float, default=0.2, help="peggioramento relativo ammesso")
+    compare.add_argument("--min-seconds", type=float, default=0.05, help="differenze più piccole sono rumore")
+    compare.add_argument("--memory-tolerance", type=float, default=0.2)
+    compare.add_argument("--objective-tolerance", type=float, default=0.0)
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
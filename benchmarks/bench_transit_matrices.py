@@ -0,0 +1,73 @@
+"""
+Confronto di throughput tra callback Python e matrici di transito native.
+
+Uso (dalla root del progetto):
+    python -m benchmarks.bench_transit_matrices --stops 200 --pairs 40 --seconds 5
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from models.Customers import Customers
+from models.Vehicles import Vehicles
+from solver.routing_model_builder import RoutingModelBuilder
+
+
+def build_instance(seed, num_stops, num_pairs):
+    np.random.seed(seed)
+    customers = Customers(num_stops=num_stops, min_demand=0, max_demand=0,
+                          box_size=10, min_tw=1, max_tw=4)
+    vehicles = Vehicles(capacity=[25] * 8, cost=[0] * 8, speed_kmph=40)
+    vehicles.return_starting_callback(customers, sameStartFinish=False)
+    customers.add_pickup_delivery_requests(num_pairs=num_pairs, min_qty=5, max_qty=15)
+    return customers, vehicles
+
+
+def run(seed, num_stops, num_pairs, seconds, use_transit_matrices):
+    with contextlib.redirect_stdout(io.StringIO()):
+        customers, vehicles = build_instance(seed, num_stops, num_pairs)
+        builder = RoutingModelBuilder(customers, vehicles, penalty=1_000_000,
+                                      use_transit_matrices=use_transit_matrices)
+        manager, routing = builder.get_model()
+        parameters = builder.get_default_parameters()
+        parameters.time_limit.seconds = seconds
+
+        start = time.perf_counter()
+        assignment = routing.SolveWithParameters(parameters)
+        elapsed = time.perf_counter() - start
+
+    solver = routing.solver()
+    return {
+        "mode": "matrix" if use_transit_matrices else "callback",
+        "objective": assignment.ObjectiveValue() if assignment else None,
+        "branches": solver.Branches(),
+        "solutions": solver.Solutions(),
+        "seconds": elapsed,
+        "branches_per_s": solver.Branches() / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, default=200)
+    parser.add_argument("--pairs", type=int, default=40)
+    parser.add_argument("--seconds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = [run(args.seed, args.stops, args.pairs, args.seconds, mode) for mode in (False, True)]
+
+    print(f"{'mode':<10}{'objective':>12}{'branches':>12}{'solutions':>11}{'branches/s':>14}")
+    for r in results:
+        print(f"{r['mode']:<10}{str(r['objective']):>12}{r['branches']:>12}{r['solutions']:>11}{r['branches_per_s']:>14.0f}")
+
+    callback, matrix = results
+    if callback["branches_per_s"]:
+        print(f"Speedup throughput: x{matrix['branches_per_s'] / callback['branches_per_s']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from solver.solution_printer import SolutionPrinter
 from solver.route_plotter import RoutePlotter
 from solver.export_solution import export_vehicle_routes_csv, export_dropped_nodes_csv
 from solver.pdp_validator import validate_pdp
+from solver.instrumentation import configure_logging
 
 def main():
     # 1. Inizializza clienti
@@ -61,26 +62,25 @@ def main():
         printer = SolutionPrinter(manager, routing, assignment, customers, vehicles)
         printer.print()
 
-        vehicle_routes = printer.get_vehicle_routes()
-
-        route = build_route_for_export(vehicle_routes, customers)
+        route = build_route_for_export(printer.solution, customers)
         # Richiama GraphHopper Directions API e visualizza con Folium
-        exporter = RouteExporter(route)
-        exporter.fetch_routes()
-        exporter.export_json("routes.json")
-        exporter.export_geojson()
-        exporter.export_distances_csv("route_metrics.csv")
-        exporter.visualize_folium(save_path="percorso_reale.html")
-        export_vehicle_routes_csv(vehicle_routes, manager, routing, assignment, customers)
+        with RouteExporter(route) as exporter:
+            exporter.fetch_routes()
+            exporter.export_json("routes.json")
+            exporter.export_geojson()
+            exporter.export_distances_csv("route_metrics.csv")
+            exporter.visualize_folium(save_path="percorso_reale.html")
+        export_vehicle_routes_csv(printer.solution, customers)
 
         dropped_nodes = printer.get_dropped_nodes()
         export_dropped_nodes_csv(dropped_nodes)
 
         plotter = RoutePlotter(customers, vehicles)
-        plotter.plot(vehicle_routes, save_path="pdp_routes.png", plot_annotations=True)
+        plotter.plot(printer.solution, save_path="pdp_routes.png", plot_annotations=True)
         print(f"Numero clienti: {customers.number}")
     else:
         print("❌ Nessuna soluzione trovata.")
 
 if __name__ == '__main__':
+    configure_logging()
     main()
@@ -1,11 +1,18 @@
 import os
 import numpy as np
-from matplotlib import pyplot as plt
 from collections import namedtuple
 from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
 from datetime import datetime, timedelta
-import pandas as pd
+
+from models.compact_matrix import METRES_PER_KM, CompactMatrix
+from models.customer_table import Customer, CustomerTable, ROLE_DEPOT
+from models.distance_matrix import haversine_matrix
+from models.graphhopper_matrix import TiledMatrixFetcher
+from models.spatial_index import SpatialIndex
+
+# Definite a livello di modulo così che Customers sia serializzabile (pickle) verso altri processi
+Location = namedtuple('Location', ['lat', 'lon'])
 
 
 class Customers():
@@ -22,23 +29,18 @@ class Customers():
                  prebuilt_customers=None):
 
         if prebuilt_customers is not None:
-            self.customers = prebuilt_customers
-            self.number = len(prebuilt_customers)
+            # lista di Customer oppure CustomerTable già pronta
+            self.customers = CustomerTable.from_records(prebuilt_customers)
+            self.number = len(self.customers)
             self.time_horizon = 24 * 3600
             self.service_time_per_dem = 60
 
             # Calcola centro geografico
-            lats = [c.lat for c in prebuilt_customers]
-            lons = [c.lon for c in prebuilt_customers]
-            avg_lat = sum(lats) / len(lats)
-            avg_lon = sum(lons) / len(lons)
-            Location = namedtuple('Location', ['lat', 'lon'])
-            self.center = Location(avg_lat, avg_lon)
+            self.center = Location(float(self.customers.lat.mean()), float(self.customers.lon.mean()))
             return
 
         # === COSTRUZIONE RANDOM (se non si usa prebuilt) ===
         self.number = num_stops
-        Location = namedtuple('Location', ['lat', 'lon'])
 
         if extents is not None:
             self.extents = extents
@@ -56,7 +58,6 @@ class Customers():
                 'urcrnrlat': clat + 180 * box_size / circ_earth
             }
 
-        stops = np.array(range(0, num_stops))
         stdv = 6
 
         lats = (self.extents['llcrnrlat'] + np.random.randn(num_stops) *
@@ -73,107 +74,109 @@ class Customers():
 
         time_windows = np.random.randint(min_tw * 3600, max_tw * 3600, num_stops)
         latest_time = self.time_horizon - time_windows
-        start_times = [timedelta(seconds=np.random.randint(0, latest_time[i])) for i in range(num_stops)]
-        stop_times = [start + timedelta(seconds=int(w)) for start, w in zip(start_times, time_windows)]
-
-        Customer = namedtuple('Customer', ['index', 'demand', 'lat', 'lon', 'tw_open', 'tw_close'])
+        # estrazioni una alla volta: stessa sequenza casuale a parità di seed
+        start_times = np.array([np.random.randint(0, latest_time[i]) for i in range(num_stops)], dtype=np.int64)
+        stop_times = start_times + time_windows
 
-        self.customers = [
-            Customer(idx, dem, lat, lon, open_t, close_t)
-            for idx, dem, lat, lon, open_t, close_t in zip(stops, demands, lats, lons, start_times, stop_times)
-        ]
+        self.customers = CustomerTable(lats, lons, demands, start_times, stop_times)
 
         self.service_time_per_dem = 60
 
     def set_manager(self, manager):
         self.manager = manager
 
-    def make_real_distance_time_matrix(self):
-        import requests
-        import json
+    def __getstate__(self):
+        # Il RoutingIndexManager (oggetto SWIG) non è serializzabile: va reimpostato dal builder
+        state = self.__dict__.copy()
+        state.pop('manager', None)
+        return state
 
-        coords = [[c.lon, c.lat] for c in self.customers]  # [lon, lat] come richiesto
-        url = "http://localhost:8989/matrix"
-        #params = {"key": api_key}
-        payload = {
-            "from_points": coords,
-            "to_points": coords,
-            "out_arrays": ["distances", "times"],
-            "profile": "car"
-        }
+    def make_real_distance_time_matrix(self, cache=None, profile="car", fetcher=None):
+        """
+        Carica le matrici reali distanza/tempo da GraphHopper /matrix, a blocchi paralleli.
 
-        print("📡 Invio richiesta a GraphHopper")
-        #print(json.dumps(payload, indent=2))  # stampa JSON formattato
+        Args:
+            cache (MatrixCache, optional): se presente, le matrici già calcolate per lo
+                stesso insieme di coordinate vengono lette da disco senza chiamare GraphHopper
+            profile (str): profilo GraphHopper
+            fetcher (TiledMatrixFetcher, optional): client da usare, default con parametri standard
 
-        headers = {"Content-Type": "application/json"}
+        Solleva RuntimeError se GraphHopper non risponde dopo i tentativi previsti,
+        invece di proseguire con una matrice tutta a zero.
+
+        Le matrici restano dense (GraphHopper non è simmetrico) ma in int32: metri e secondi.
+        """
+        n = self.number
+        if cache is not None:
+            key = cache.make_key(self.customers.lat, self.customers.lon, profile, kind="graphhopper_m_s")
+            cached = cache.get(key, ["distances", "times"])
+            if cached is not None:
+                self.distmat = CompactMatrix.from_data(cached["distances"], n)
+                self.timemat = CompactMatrix.from_data(cached["times"], n)
+                print("✅ Matrici reali caricate dalla cache.")
+                return
+
+        coords = np.column_stack([self.customers.lon, self.customers.lat]).tolist()  # [lon, lat] come richiesto
+        fetcher = fetcher if fetcher is not None else TiledMatrixFetcher()
+
+        print("📡 Invio richiesta a GraphHopper")
         try:
-            response = requests.post(url, data=json.dumps(payload), headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            self.distmat = result["distances"]
-            self.timemat = result["times"]
-            print("✅ Matrici reali caricate correttamente da GraphHopper.")
+            distances, times = fetcher.fetch(coords, profile=profile)
         except Exception as e:
             print(f"❌ Errore durante la chiamata a GraphHopper: {e}")
-            n = len(coords)
-            self.distmat = [[0 for _ in range(n)] for _ in range(n)]
-            self.timemat = [[0 for _ in range(n)] for _ in range(n)]
+            raise RuntimeError(f"Matrice GraphHopper non disponibile: {e}") from e
+
+        print("✅ Matrici reali caricate correttamente da GraphHopper.")
+        self.distmat = CompactMatrix.from_dense(distances)
+        self.timemat = CompactMatrix.from_dense(times)
+        if cache is not None:
+            cache.put(key, {"distances": self.distmat.data, "times": self.timemat.data})
 
     @classmethod
-    def from_csv(cls, path):
-        import pandas as pd
-        df = pd.read_csv(path)
+    def from_csv(cls, path, chunksize=None):
+        """
+        Carica i clienti da CSV con operazioni vettoriali (vedi models.customer_loader).
 
-        number = len(df)
-        time_horizon = 24 * 3600
-        Customer = namedtuple('Customer', ['index', 'demand', 'lat', 'lon', 'tw_open', 'tw_close'])
+        Args:
+            path (str): file CSV con colonne lat, lon, demand [, tw_open, tw_close, type, pair_id]
+            chunksize (int, optional): righe lette per blocco, per file molto grandi
+        """
+        from models.customer_loader import read_csv_chunks
+        return cls._from_frames(read_csv_chunks(path, chunksize=chunksize))
 
-        customers = []
-        pickup_dict = {}
-        delivery_dict = {}
+    @classmethod
+    def from_parquet(cls, path, batch_size=None):
+        """Come from_csv ma da file Parquet (richiede pyarrow), a blocchi di batch_size righe."""
+        from models.customer_loader import read_parquet_chunks
+        return cls._from_frames(read_parquet_chunks(path, batch_size=batch_size))
 
-        for idx, row in df.iterrows():
-            demand = int(row['demand'])
-            lat = float(row['lat'])
-            lon = float(row['lon'])
+    @classmethod
+    def _from_frames(cls, frames):
+        from models.customer_loader import load_customer_table
 
-            # Finestra temporale dal CSV, fallback controllato
-            try:
-                open_sec = int(row['tw_open'])
-                close_sec = int(row['tw_close'])
-                assert 0 <= open_sec <= close_sec <= time_horizon, \
-                    f"Time window non valida per idx={idx}: {open_sec} → {close_sec}"
-                assert 0 <= open_sec <= close_sec <= time_horizon
-                tw_open = timedelta(seconds=open_sec)
-                tw_close = timedelta(seconds=close_sec)
-            except:
-                # Fallback: finestra 00:00 - 24:00
-                tw_open = timedelta(seconds=0)
-                tw_close = timedelta(seconds=time_horizon)
-
-            customers.append(Customer(idx, demand, lat, lon, tw_open, tw_close))
-
-            # Se presenti colonne PDP
-            if 'type' in row and 'pair_id' in row and not pd.isna(row['type']) and not pd.isna(row['pair_id']):
-                pair_id = int(row['pair_id'])
-                if row['type'].strip().lower() == 'pickup':
-                    pickup_dict[pair_id] = idx
-                elif row['type'].strip().lower() == 'delivery':
-                    delivery_dict[pair_id] = idx
-
-        # Crea le coppie PDP
-        pdp_pairs = []
-        for pair_id in pickup_dict:
-            if pair_id in delivery_dict:
-                pdp_pairs.append((pickup_dict[pair_id], delivery_dict[pair_id]))
+        time_horizon = 24 * 3600
+        table, pdp_pairs, invalid_tw = load_customer_table(frames, time_horizon=time_horizon)
+        if invalid_tw:
+            # Fallback: finestra 00:00 - 24:00
+            print(f"⚠️ {invalid_tw} finestre temporali non valide sostituite con 00:00 - 24:00")
 
-        obj = cls(prebuilt_customers=customers)
+        obj = cls(prebuilt_customers=table)
         obj.pdp_pairs = pdp_pairs
         obj.pdp_pairs_flat = list(set(i for pair in pdp_pairs for i in pair))
         return obj
 
+    @property
+    def pdp_pairs(self):
+        return self._pdp_pairs
+
+    @pdp_pairs.setter
+    def pdp_pairs(self, pairs):
+        # tiene allineate le colonne role/pair della tabella
+        self._pdp_pairs = pairs
+        self.customers.set_pairs(pairs)
+
     def add_pickup_delivery_requests(self, num_pairs=10, min_qty=5, max_qty=15):
-        self.pdp_pairs = []
+        pdp_pairs = []
 
         used_indexes = set()
         depot_indexes = set(getattr(self, "used_as_depots", []))
@@ -181,10 +184,10 @@ class Customers():
         attempts = 0
         max_attempts = 500  # Evita loop infiniti
 
-        now = timedelta(seconds=0)
-        end = timedelta(seconds=self.time_horizon)
+        now = 0
+        end = self.time_horizon
 
-        while len(self.pdp_pairs) < num_pairs and attempts < max_attempts:
+        while len(pdp_pairs) < num_pairs and attempts < max_attempts:
             pickup = np.random.randint(0, self.number)
             delivery = np.random.randint(0, self.number)
 
@@ -199,21 +202,21 @@ class Customers():
                 continue
 
             qty = np.random.randint(min_qty, max_qty + 1)
-            self.pdp_pairs.append((pickup, delivery))
+            pdp_pairs.append((pickup, delivery))
 
-            # Assegna quantità
-            self.customers[pickup] = self.customers[pickup]._replace(demand=qty)
-            self.customers[delivery] = self.customers[delivery]._replace(demand=-qty)
-
-            # Imposta finestre temporali larghe per sicurezza
-            self.customers[pickup] = self.customers[pickup]._replace(tw_open=now, tw_close=end)
-            self.customers[delivery] = self.customers[delivery]._replace(tw_open=now + timedelta(hours=2), tw_close=end)
+            # Assegna quantità e finestre temporali larghe per sicurezza
+            table = self.customers
+            table.demand[[pickup, delivery]] = (qty, -qty)
+            table.tw_open_s[[pickup, delivery]] = (now, now + 2 * 3600)
+            table.tw_close_s[[pickup, delivery]] = end
+            table.has_tw[[pickup, delivery]] = True
 
             used_indexes.add(pickup)
             used_indexes.add(delivery)
 
             attempts += 1
 
+        self.pdp_pairs = pdp_pairs
         if len(self.pdp_pairs) < num_pairs:
             print(f"⚠️ Solo {len(self.pdp_pairs)} coppie PDP create su {num_pairs} richieste.")
 
@@ -222,12 +225,10 @@ class Customers():
 
     def central_start_node(self, invert=False):
 
+        # distanze dal centro in un'unica chiamata vettoriale (stessi valori di _haversine)
+        dist = haversine_matrix([self.center.lat], [self.center.lon],
+                                self.customers.lat, self.customers.lon).reshape(-1, 1)
         num_nodes = len(self.customers)
-        dist = np.empty((num_nodes, 1))
-        for idx_to in range(num_nodes):
-            dist[idx_to] = self._haversine(self.center.lon, self.center.lat,
-                                           self.customers[idx_to].lon,
-                                           self.customers[idx_to].lat)
         furthest = np.max(dist)
 
         if invert:
@@ -239,21 +240,50 @@ class Customers():
             indexes.flatten(), size=1, replace=True, p=prob.flatten())
         return start_node[0]
 
-    def make_distance_mat(self, method='haversine'):
+    def get_spatial_index(self):
+        """
+        Indice spaziale (SpatialIndex) sui nodi, costruito alla prima richiesta e riusato
+        finché le coordinate non cambiano: query nearest-k, raggio e bounding box senza
+        scorrere tutti i clienti.
+        """
+        index = getattr(self, '_spatial_index', None)
+        lats, lons = self.customers.lat, self.customers.lon
+        if index is None or not (np.array_equal(index.lats, lats) and np.array_equal(index.lons, lons)):
+            index = SpatialIndex(lats, lons)
+            self._spatial_index = index
+        return index
+
+    def make_distance_mat(self, method='haversine', chunk_size=None, cache=None):
+        """
+        Costruisce la matrice n × n delle distanze in metri interi (CompactMatrix):
+        haversine è simmetrica, quindi se ne salva solo il triangolo superiore.
+
+        Args:
+            method (str): metodo di calcolo, al momento solo 'haversine'
+            chunk_size (int, optional): numero di righe calcolate per blocco; limita
+                la memoria dei temporanei per istanze molto grandi (10k+ nodi)
+            cache (MatrixCache, optional): cache su disco; in caso di hit la matrice
+                viene caricata in memory mapping senza ricalcolarla
+        """
         if hasattr(self, 'distmat') and self.distmat is not None:
             return self.distmat  # evita ricalcoli
 
-        self.distmat = np.zeros((self.number, self.number))
-        methods = {'haversine': self._haversine}
+        methods = {'haversine': CompactMatrix.from_haversine}
         assert (method in methods)
 
-        for frm_idx in range(self.number):
-            for to_idx in range(self.number):
-                if frm_idx != to_idx:
-                    frm_c = self.customers[frm_idx]
-                    to_c = self.customers[to_idx]
-                    self.distmat[frm_idx, to_idx] = self._haversine(
-                        frm_c.lon, frm_c.lat, to_c.lon, to_c.lat)
+        lats = self.customers.lat
+        lons = self.customers.lon
+
+        if cache is not None:
+            key = cache.make_key(lats, lons, method, kind="distance_m")
+            cached = cache.get(key, ["distances"])
+            if cached is not None:
+                self.distmat = CompactMatrix.from_data(cached["distances"], len(lats))
+                return self.distmat
+
+        self.distmat = methods[method](lats, lons, chunk_size=chunk_size)
+        if cache is not None:
+            cache.put(key, {"distances": self.distmat.data})
         return self.distmat
 
     def _haversine(self, lon1, lat1, lon2, lat2):
@@ -276,14 +306,14 @@ class Customers():
         """
         Return the total demand of all customers.
         """
-        return (sum([c.demand for c in self.customers]))
+        return int(self.customers.demand.sum())
 
     def return_dist_callback(self):
         def distance_callback(from_index, to_index):
             try:
                 from_node = self.manager.IndexToNode(from_index)
                 to_node = self.manager.IndexToNode(to_index)
-                return int(self.distmat[from_node][to_node])
+                return self.distmat.get(from_node, to_node)
             except Exception as e:
                 print(f"❌ Errore in distance_callback: {e}")
                 return 0
@@ -296,7 +326,7 @@ class Customers():
                 from_node = self.manager.IndexToNode(from_index)
                 if from_node < 0 or from_node >= len(self.customers):
                     return 0
-                return self.customers[from_node].demand
+                return int(self.customers.demand[from_node])
             except Exception as e:
                 print(f"❌ Errore in dem_return: {e}")
                 import traceback
@@ -305,16 +335,62 @@ class Customers():
 
         return dem_return
 
+    def make_distance_transit_matrix(self):
+        """
+        Matrice intera delle distanze per RegisterTransitMatrix: stessi valori
+        di distance_callback (metri), calcolati una volta sola.
+        """
+        return self.make_distance_mat().to_dense()
+
+    def make_demand_vector(self):
+        """Vettore delle domande per RegisterUnaryTransitVector (stessi valori di dem_return)."""
+        return self.customers.demand.copy()
+
     def zero_depot_demands(self, depot):
 
-        start_depot = self.customers[depot]
-        self.customers[depot] = start_depot._replace(
-            demand=0, tw_open=None, tw_close=None)
+        self.customers.demand[depot] = 0
+        self.customers.has_tw[depot] = False
+        self.customers.role[depot] = ROLE_DEPOT
+
+    def set_onboard_orders(self, onboard, vehicle_starts):
+        """
+        Ordini già ritirati (merce a bordo): resta solo la delivery, vincolata al veicolo.
+        Il carico parte dal nodo di partenza del veicolo, che deve essere suo (non condiviso).
+        Più consegne a bordo dello stesso veicolo sullo stesso nodo si sommano, con
+        l'intersezione delle finestre; il nodo non deve servire ordini aperti
+        (vedi prepare_reoptimization).
+
+        Args:
+            onboard (list): coppie (order, indice veicolo)
+            vehicle_starts (list): nodo di partenza di ogni veicolo
+        """
+        self.onboard_orders = []
+        self.pinned_nodes = {}
+        table = self.customers
+        for order, vehicle_idx in onboard:
+            delivery_idx = self.node_id_to_index[order.delivery_node_id]
+            start_idx = vehicle_starts[vehicle_idx]
+
+            # come in from_nodes_and_orders: la delivery ha un'ora in più
+            tw_open, tw_close = order.tw_open + 3600, order.tw_close + 3600
+            if delivery_idx in self.pinned_nodes:
+                tw_open = max(tw_open, int(table.tw_open_s[delivery_idx]))
+                tw_close = min(tw_close, int(table.tw_close_s[delivery_idx]))
+            else:
+                table.demand[delivery_idx] = 0
+            table.demand[delivery_idx] -= order.quantity
+            table.tw_open_s[delivery_idx] = tw_open
+            table.tw_close_s[delivery_idx] = tw_close
+            table.has_tw[delivery_idx] = True
+            table.demand[start_idx] += order.quantity
+
+            self.pinned_nodes[delivery_idx] = vehicle_idx
+            self.onboard_orders.append(order)
 
     def make_service_time_call_callback(self):
         def service_time_return(from_node, to_node):
             try:
-                return self.customers[from_node].demand * self.service_time_per_dem
+                return int(self.customers.demand[from_node]) * self.service_time_per_dem
             except Exception as e:
                 print(f"❌ Errore nella callback tempo di servizio: {e}")
                 return 0
@@ -325,44 +401,41 @@ class Customers():
 
 
         def transit_time_return(a, b):
-            return (self.distmat[a][b] / (speed_kmph * 1.0 / 60**2))
+            return (self.distmat.get(a, b) / (speed_kmph * METRES_PER_KM / 60**2))
 
         return transit_time_return
 
     @classmethod
     def from_nodes_and_orders(cls, nodes, orders):
         """
-        Converte nodes + orders in una lista di Customer usabile dall'algoritmo.
+        Converte nodes + orders nella tabella colonnare usabile dall'algoritmo.
         """
-        Customer = namedtuple("Customer", ['index', 'demand', 'lat', 'lon', 'tw_open', 'tw_close'])
-        customer_list = []
-        id_to_index = {}
-
-        for idx, node in enumerate(nodes):
-            id_to_index[node.id] = idx
-            # default: nessuna domanda, finestra piena
-            demand = 0
-            tw_open = timedelta(seconds=0)
-            tw_close = timedelta(seconds=86400)
-            customer_list.append(Customer(idx, demand, node.lat, node.lon, tw_open, tw_close))
-
-        # Ora aggiorna pickup/delivery
-        for order in orders:
-            pickup_idx = id_to_index[order.pickup_node_id]
-            delivery_idx = id_to_index[order.delivery_node_id]
-
-            customer_list[pickup_idx] = customer_list[pickup_idx]._replace(
-                demand=order.quantity,
-                tw_open=timedelta(seconds=order.tw_open),
-                tw_close=timedelta(seconds=order.tw_close)
-            )
-            customer_list[delivery_idx] = customer_list[delivery_idx]._replace(
-                demand=-order.quantity,
-                tw_open=timedelta(seconds=order.tw_open + 3600),  # +1 ora
-                tw_close=timedelta(seconds=order.tw_close + 3600)  # +1 ora
-            )
-
-        obj = cls(prebuilt_customers=customer_list)
+        id_to_index = {node.id: idx for idx, node in enumerate(nodes)}
+
+        # default: nessuna domanda, finestra piena
+        n = len(nodes)
+        table = CustomerTable(
+            lat=[node.lat for node in nodes],
+            lon=[node.lon for node in nodes],
+            tw_open_s=np.zeros(n, dtype=np.int64),
+            tw_close_s=np.full(n, 86400, dtype=np.int64)
+        )
+
+        # Ora aggiorna pickup/delivery: pickup e delivery alternati, così con nodi ripetuti
+        # vince l'ultima scrittura come nell'aggiornamento ordine per ordine
+        if orders:
+            pickups = [id_to_index[o.pickup_node_id] for o in orders]
+            deliveries = [id_to_index[o.delivery_node_id] for o in orders]
+            qty = np.array([o.quantity for o in orders], dtype=np.int64)
+            tw_open = np.array([o.tw_open for o in orders], dtype=np.int64)
+            tw_close = np.array([o.tw_close for o in orders], dtype=np.int64)
+
+            idx = np.column_stack([pickups, deliveries]).ravel()
+            table.demand[idx] = np.column_stack([qty, -qty]).ravel()
+            table.tw_open_s[idx] = np.column_stack([tw_open, tw_open + 3600]).ravel()  # delivery +1 ora
+            table.tw_close_s[idx] = np.column_stack([tw_close, tw_close + 3600]).ravel()
+
+        obj = cls(prebuilt_customers=table)
         obj.pdp_pairs = [(id_to_index[o.pickup_node_id], id_to_index[o.delivery_node_id]) for o in orders]
         obj.pdp_pairs_flat = list(set(i for pair in obj.pdp_pairs for i in pair))
         obj.orders = orders
@@ -371,7 +444,6 @@ class Customers():
         obj.index_to_node_id = {v: k for k, v in id_to_index.items()}
         obj.index_to_order_id = {i: o.id for i, o in enumerate(orders)}
         # 💡 Imposta time_horizon dinamico basato sul massimo tw_close
-        max_tw_close = max(c.tw_close for c in customer_list)
-        obj.time_horizon = int(max_tw_close.total_seconds()) + 3600  # buffer di sicurezza
+        obj.time_horizon = int(table.tw_close_s.max()) + 3600  # buffer di sicurezza
 
         return obj
\ No newline at end of file
@@ -3,6 +3,8 @@ from typing import List
 import numpy as np
 from collections import namedtuple
 
+Vehicle = namedtuple('Vehicle', ['index', 'capacity', 'cost', 'id'])
+
 class Vehicles:
 
 
@@ -26,8 +28,6 @@ class Vehicles:
     def __init__(self, capacity=100, cost=100, number=None, speed_kmph=70, ids=None):
         self.speed_kmph = speed_kmph
 
-        Vehicle = namedtuple('Vehicle', ['index', 'capacity', 'cost', 'id'])
-
         # Determina numero veicoli
         if number is None:
             self.number = np.size(capacity)
@@ -0,0 +1,165 @@
+import numpy as np
+
+from models.distance_matrix import haversine_matrix
+
+# Le distanze sono memorizzate in metri interi, i tempi in secondi interi
+METRES_PER_KM = 1000
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def quantize(values, scale=1.0):
+    """
+    Arrotonda all'intero più vicino (dopo la scala) in int32, con controllo di overflow.
+    NaN e infiniti (es. celle non raggiungibili) vanno sostituiti prima: qui sono un errore.
+    """
+    scaled = np.rint(np.asarray(values, dtype=np.float64) * scale)
+    if not np.isfinite(scaled).all():
+        raise ValueError("❌ Valori non finiti (NaN/inf) nella matrice da quantizzare")
+    if scaled.size and (scaled.max() > INT32_MAX or scaled.min() < -INT32_MAX):
+        raise ValueError("❌ Valori fuori dall'intervallo int32 dopo la quantizzazione")
+    return scaled.astype(np.int32)
+
+
+class CompactMatrix:
+    """
+    Matrice n × n di interi int32 (metri o secondi), quantizzata una volta sola.
+
+    Se simmetrica (es. haversine) viene salvata solo la parte triangolare superiore,
+    diagonale compresa, impacchettata riga per riga in un vettore di n(n+1)/2 elementi:
+    circa 8 volte meno memoria della matrice float64 densa. Altrimenti è un array
+    n × n int32 denso (4 volte meno).
+
+    Le callback leggono le celle con ``get(i, j)``; ``row``, ``to_dense`` e
+    ``submatrix`` servono alle operazioni vettoriali.
+
+    Args:
+        data (np.ndarray): vettore impacchettato (simmetrica) o array n × n
+        n (int): numero di nodi
+        symmetric (bool): True se data è il triangolo superiore impacchettato
+    """
+
+    def __init__(self, data, n, symmetric):
+        self.data = data
+        self.n = n
+        self.symmetric = symmetric
+
+    @classmethod
+    def empty(cls, n, symmetric):
+        if symmetric:
+            return cls(np.zeros(n * (n + 1) // 2, dtype=np.int32), n, True)
+        return cls(np.zeros((n, n), dtype=np.int32), n, False)
+
+    @classmethod
+    def from_dense(cls, matrix, scale=1.0, symmetric=False):
+        """Da una matrice densa (float o liste annidate); con symmetric si tiene il solo triangolo superiore."""
+        values = quantize(matrix, scale)
+        n = len(values)
+        if not symmetric:
+            return cls(values.reshape(n, n), n, False)
+        return cls(values[np.triu_indices(n)], n, True)
+
+    @classmethod
+    def from_data(cls, data, n):
+        """Ricostruisce la matrice dall'array ``data`` (es. letto dalla MatrixCache)."""
+        data = np.asarray(data)
+        return cls(data, n, data.ndim == 1)
+
+    @classmethod
+    def from_haversine(cls, lats, lons, chunk_size=None, packed=True):
+        """
+        Distanze haversine in metri interi. Con packed si calcola a blocchi di righe
+        solo il triangolo superiore, senza mai allocare la matrice float64 n × n.
+
+        Args:
+            chunk_size (int, optional): righe per blocco (default: blocchi da ~16M celle)
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n = len(lats)
+        if not packed:
+            return cls.from_dense(haversine_matrix(lats, lons, chunk_size=chunk_size), scale=METRES_PER_KM)
+
+        matrix = cls.empty(n, True)
+        step = chunk_size or max(1, (1 << 24) // max(n, 1))
+        for start in range(0, n, step):
+            stop = min(start + step, n)
+            # dal blocco di righe verso le sole colonne >= start (quelle sotto la diagonale non servono)
+            block = quantize(haversine_matrix(lats[start:stop], lons[start:stop], lats[start:], lons[start:]),
+                             METRES_PER_KM)
+            for r, i in enumerate(range(start, stop)):
+                offset = matrix._row_start(i)
+                matrix.data[offset:offset + n - i] = block[r, i - start:]
+        return matrix
+
+    def _row_start(self, i):
+        # posizione di (i, i) nel vettore impacchettato
+        return i * self.n - i * (i - 1) // 2
+
+    def get(self, i, j):
+        """Valore della cella (i, j) come int Python."""
+        if not self.symmetric:
+            return int(self.data[i, j])
+        if i > j:
+            i, j = j, i
+        return int(self.data[i * self.n - i * (i - 1) // 2 + j - i])
+
+    def row(self, i):
+        """Riga i completa (array int32 di lunghezza n)."""
+        if not self.symmetric:
+            return self.data[i]
+        # colonne j < i: celle (j, i) del triangolo superiore; colonne j >= i: tratto contiguo della riga i
+        j = np.arange(i, dtype=np.int64)
+        left = self.data[j * self.n - j * (j - 1) // 2 + i - j]
+        start = self._row_start(i)
+        return np.concatenate([left, self.data[start:start + self.n - i]])
+
+    def set_row(self, i, values):
+        """Scrive la riga i (per le simmetriche conta solo la parte j >= i)."""
+        if not self.symmetric:
+            self.data[i] = values
+        else:
+            start = self._row_start(i)
+            self.data[start:start + self.n - i] = np.asarray(values)[i:]
+
+    def to_dense(self):
+        """Copia densa n × n int32."""
+        if not self.symmetric:
+            return np.array(self.data, dtype=np.int32)
+        dense = np.zeros((self.n, self.n), dtype=np.int32)
+        for i in range(self.n):
+            start = self._row_start(i)
+            dense[i, i:] = self.data[start:start + self.n - i]
+        # parte sotto la diagonale per simmetria
+        dense += np.triu(dense, 1).T
+        return dense
+
+    def submatrix(self, idx):
+        """Matrice ristretta ai nodi idx (nell'ordine dato), stessa rappresentazione."""
+        idx = np.asarray(idx, dtype=np.int64)
+        if not self.symmetric:
+            return CompactMatrix(self.data[np.ix_(idx, idx)], len(idx), False)
+        sub = CompactMatrix.empty(len(idx), True)
+        for r, i in enumerate(idx):
+            sub.set_row(r, self.row(int(i))[idx])
+        return sub
+
+    @property
+    def shape(self):
+        return (self.n, self.n)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        # compatibilità: m[i, j] e m[i][j]
+        if isinstance(key, tuple):
+            return self.get(*key)
+        return self.row(key)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
@@ -0,0 +1,151 @@
+"""
+Caricamento vettoriale dei file clienti (CSV e Parquet) nella tabella colonnare.
+
+Colonne attese: lat, lon, demand; opzionali tw_open, tw_close (secondi) e
+type (pickup/delivery) + pair_id per le coppie PDP. Le altre colonne (es. name)
+vengono ignorate. Con chunksize il file viene letto a blocchi: di ogni blocco
+si tengono solo gli array numerici, senza mai materializzare il DataFrame intero.
+
+Dipendenze opzionali (non in requirements.txt): pandas, e pyarrow per il Parquet.
+"""
+import numpy as np
+
+from models.customer_table import CustomerTable
+
+COLUMNS = ["lat", "lon", "demand", "tw_open", "tw_close", "type", "pair_id"]
+
+
+def _import_pandas():
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("❌ Per caricare i file clienti serve pandas (pip install pandas)") from e
+    return pd
+
+
+def read_csv_chunks(path, chunksize=None):
+    """DataFrame (uno o più blocchi) con le sole colonne utili del CSV; richiede pandas."""
+    pd = _import_pandas()
+
+    reader = pd.read_csv(path, usecols=lambda c: c in COLUMNS, chunksize=chunksize)
+    return [reader] if chunksize is None else reader
+
+
+def read_parquet_chunks(path, batch_size=None):
+    """DataFrame (uno o più blocchi) con le sole colonne utili del Parquet; richiede pandas e pyarrow."""
+    _import_pandas()
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("❌ Per leggere file Parquet serve pyarrow (pip install pyarrow)") from e
+
+    parquet = pq.ParquetFile(path)
+    columns = [c for c in COLUMNS if c in parquet.schema_arrow.names]
+    if batch_size is None:
+        return [parquet.read(columns=columns).to_pandas()]
+    return (batch.to_pandas() for batch in parquet.iter_batches(batch_size=batch_size, columns=columns))
+
+
+def _time_windows(df, time_horizon):
+    """Finestre in secondi validate in blocco; quelle mancanti o non valide diventano 00:00 - 24:00."""
+    pd = _import_pandas()
+
+    n = len(df)
+    if "tw_open" not in df or "tw_close" not in df:
+        return np.zeros(n, dtype=np.int64), np.full(n, time_horizon, dtype=np.int64), 0
+
+    tw_open = np.trunc(pd.to_numeric(df["tw_open"], errors="coerce").to_numpy(dtype=np.float64))
+    tw_close = np.trunc(pd.to_numeric(df["tw_close"], errors="coerce").to_numpy(dtype=np.float64))
+    # i confronti con NaN sono falsi: valori mancanti o non numerici cadono nel fallback
+    valid = (0 <= tw_open) & (tw_open <= tw_close) & (tw_close <= time_horizon)
+
+    open_s = np.where(valid, tw_open, 0).astype(np.int64)
+    close_s = np.where(valid, tw_close, time_horizon).astype(np.int64)
+    return open_s, close_s, int(n - valid.sum())
+
+
+def _pdp_roles(df, offset):
+    """(indici globali, pair_id) dei pickup e delle delivery del blocco."""
+    empty = (np.empty(0, dtype=np.int64),) * 2
+    if "type" not in df or "pair_id" not in df:
+        return empty, empty
+
+    pd = _import_pandas()
+
+    kind = df["type"].astype("string").str.strip().str.lower()
+    pair_id = pd.to_numeric(df["pair_id"], errors="coerce").to_numpy(dtype=np.float64)
+    has_pair = ~np.isnan(pair_id)
+    pair_id = np.where(has_pair, pair_id, -1).astype(np.int64)
+    rows = np.arange(len(df), dtype=np.int64) + offset
+
+    roles = []
+    for name in ("pickup", "delivery"):
+        mask = has_pair & (kind == name).to_numpy(dtype=bool, na_value=False)
+        roles.append((rows[mask], pair_id[mask]))
+    return roles[0], roles[1]
+
+
+def _match_pairs(pickups, deliveries):
+    """
+    Coppie (pickup, delivery) con lo stesso pair_id. Con pair_id ripetuti vince
+    l'ultima riga; le coppie seguono l'ordine della prima apparizione del pickup.
+    """
+    (p_rows, p_ids), (d_rows, d_ids) = pickups, deliveries
+    if not len(p_rows) or not len(d_rows):
+        return []
+
+    def last_by_id(rows, ids):
+        # ultima riga per ogni id, con la posizione della prima apparizione dell'id
+        unique, first = np.unique(ids, return_index=True)
+        _, last_rev = np.unique(ids[::-1], return_index=True)
+        return unique, first, rows[len(ids) - 1 - last_rev]
+
+    p_unique, p_first, p_last = last_by_id(p_rows, p_ids)
+    d_unique, _, d_last = last_by_id(d_rows, d_ids)
+
+    _, p_pos, d_pos = np.intersect1d(p_unique, d_unique, assume_unique=True, return_indices=True)
+    order = np.argsort(p_first[p_pos], kind="stable")
+    return [(int(p), int(d)) for p, d in zip(p_last[p_pos][order], d_last[d_pos][order])]
+
+
+def load_customer_table(frames, time_horizon=24 * 3600):
+    """
+    Costruisce la tabella colonnare da uno o più DataFrame consecutivi.
+
+    Returns:
+        (table, pdp_pairs, invalid_tw): tabella, coppie PDP e numero di finestre
+        temporali scartate (sostituite con l'intera giornata)
+    """
+    columns = {name: [] for name in ("lat", "lon", "demand", "tw_open_s", "tw_close_s")}
+    pickups, deliveries = [], []
+    invalid_tw = 0
+    offset = 0
+
+    for df in frames:
+        columns["lat"].append(df["lat"].to_numpy(dtype=np.float64))
+        columns["lon"].append(df["lon"].to_numpy(dtype=np.float64))
+        if df["demand"].isna().any():
+            row = offset + int(np.flatnonzero(df["demand"].isna().to_numpy())[0])
+            raise ValueError(f"❌ demand mancante alla riga {row}")
+        columns["demand"].append(df["demand"].to_numpy().astype(np.int64))
+
+        tw_open, tw_close, invalid = _time_windows(df, time_horizon)
+        columns["tw_open_s"].append(tw_open)
+        columns["tw_close_s"].append(tw_close)
+        invalid_tw += invalid
+
+        chunk_pickups, chunk_deliveries = _pdp_roles(df, offset)
+        pickups.append(chunk_pickups)
+        deliveries.append(chunk_deliveries)
+        offset += len(df)
+
+    arrays = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in columns.items()}
+    table = CustomerTable(**arrays, has_tw=np.ones(offset, dtype=bool))
+
+    def merge(parts):
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    pdp_pairs = _match_pairs(merge(pickups), merge(deliveries))
+    return table, pdp_pairs, invalid_tw
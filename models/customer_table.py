@@ -0,0 +1,115 @@
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+
+Customer = namedtuple('Customer', ['index', 'demand', 'lat', 'lon', 'tw_open', 'tw_close'])
+
+# Ruolo del nodo nella colonna role
+ROLE_NONE = 0
+ROLE_PICKUP = 1
+ROLE_DELIVERY = 2
+ROLE_DEPOT = 3
+
+
+def _seconds(value):
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    return int(value)
+
+
+class CustomerTable:
+    """
+    Archivio colonnare dei nodi: un array NumPy contiguo per campo invece di una
+    lista di namedtuple.
+
+    Colonne: lat, lon (float64), demand, tw_open_s, tw_close_s (int64, secondi),
+    has_tw (bool, False = nessuna finestra, es. depot), role (ROLE_*) e pair
+    (indice del nodo partner della coppia PDP, -1 se assente).
+
+    Per compatibilità si comporta come la vecchia lista: ``table[i]`` restituisce un
+    ``Customer`` con finestre in timedelta (o None) e ``table[i] = customer`` aggiorna
+    le colonne, così i chiamanti esistenti continuano a funzionare; le operazioni in
+    blocco lavorano direttamente sugli array.
+    """
+
+    def __init__(self, lat, lon, demand=None, tw_open_s=None, tw_close_s=None, has_tw=None):
+        self.lat = np.array(lat, dtype=np.float64)
+        self.lon = np.array(lon, dtype=np.float64)
+        n = len(self.lat)
+        self.demand = np.zeros(n, dtype=np.int64) if demand is None else np.array(demand, dtype=np.int64)
+        self.tw_open_s = np.zeros(n, dtype=np.int64) if tw_open_s is None else np.array(tw_open_s, dtype=np.int64)
+        self.tw_close_s = np.zeros(n, dtype=np.int64) if tw_close_s is None else np.array(tw_close_s, dtype=np.int64)
+        if has_tw is None:
+            has_tw = np.full(n, tw_open_s is not None and tw_close_s is not None)
+        self.has_tw = np.array(has_tw, dtype=bool)
+        self.role = np.full(n, ROLE_NONE, dtype=np.int8)
+        self.pair = np.full(n, -1, dtype=np.int64)
+
+    @classmethod
+    def from_records(cls, records):
+        """Da una sequenza di Customer (finestre in timedelta, secondi o None)."""
+        if isinstance(records, cls):
+            return records
+        records = list(records)
+        has_tw = [r.tw_open is not None and r.tw_close is not None for r in records]
+        return cls(
+            lat=[r.lat for r in records],
+            lon=[r.lon for r in records],
+            demand=[int(r.demand) for r in records],
+            tw_open_s=[_seconds(r.tw_open) if ok else 0 for r, ok in zip(records, has_tw)],
+            tw_close_s=[_seconds(r.tw_close) if ok else 0 for r, ok in zip(records, has_tw)],
+            has_tw=has_tw
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if self.has_tw[i]:
+            tw_open = timedelta(seconds=int(self.tw_open_s[i]))
+            tw_close = timedelta(seconds=int(self.tw_close_s[i]))
+        else:
+            tw_open = tw_close = None
+        return Customer(i, int(self.demand[i]), float(self.lat[i]), float(self.lon[i]), tw_open, tw_close)
+
+    def __setitem__(self, i, customer):
+        self.lat[i] = customer.lat
+        self.lon[i] = customer.lon
+        self.demand[i] = int(customer.demand)
+        if customer.tw_open is None or customer.tw_close is None:
+            self.has_tw[i] = False
+        else:
+            self.has_tw[i] = True
+            self.tw_open_s[i] = _seconds(customer.tw_open)
+            self.tw_close_s[i] = _seconds(customer.tw_close)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def take(self, indices):
+        """Nuova tabella con i soli nodi indicati, rinumerati da 0 (coppie PDP azzerate)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return CustomerTable(self.lat[indices], self.lon[indices], self.demand[indices],
+                             self.tw_open_s[indices], self.tw_close_s[indices], self.has_tw[indices])
+
+    def set_pairs(self, pairs):
+        """Aggiorna role/pair dalle coppie (pickup, delivery); i depot restano marcati."""
+        depots = self.role == ROLE_DEPOT
+        self.role[~depots] = ROLE_NONE
+        self.pair[:] = -1
+        if len(pairs):
+            pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+            self.role[pairs[:, 0]] = ROLE_PICKUP
+            self.role[pairs[:, 1]] = ROLE_DELIVERY
+            self.pair[pairs[:, 0]] = pairs[:, 1]
+            self.pair[pairs[:, 1]] = pairs[:, 0]
+
+    def latlon(self):
+        """Array n × 2 [lat, lon]."""
+        return np.column_stack([self.lat, self.lon])
@@ -0,0 +1,73 @@
+import numpy as np
+
+# 6367 km is the radius of the Earth (stesso valore di Customers._haversine)
+EARTH_RADIUS_KM = 6367
+
+
+def haversine_matrix(lats_from, lons_from, lats_to=None, lons_to=None, chunk_size=None, out=None):
+    """
+    Calcola la matrice delle distanze haversine (km) tra due insiemi di punti
+    usando operazioni vettoriali NumPy, invece di una chiamata scalare per cella.
+
+    Args:
+        lats_from, lons_from: coordinate (gradi) dei punti di partenza, lunghezza n
+        lats_to, lons_to: coordinate dei punti di arrivo, lunghezza m (default: uguali a from)
+        chunk_size (int, optional): se indicato, calcola la matrice a blocchi di righe
+            così che i temporanei occupino al massimo chunk_size × m elementi
+        out (np.ndarray, optional): array n × m float64 già allocato in cui scrivere
+
+    Returns:
+        np.ndarray n × m float64 con le distanze in km
+    """
+    lat1 = np.radians(np.asarray(lats_from, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lons_from, dtype=np.float64))
+    if lats_to is None or lons_to is None:
+        lat2, lon2 = lat1, lon1
+    else:
+        lat2 = np.radians(np.asarray(lats_to, dtype=np.float64))
+        lon2 = np.radians(np.asarray(lons_to, dtype=np.float64))
+
+    n, m = len(lat1), len(lat2)
+    if out is None:
+        out = np.empty((n, m), dtype=np.float64)
+    elif out.shape != (n, m):
+        raise ValueError(f"❌ out deve avere forma {(n, m)}, trovato {out.shape}")
+
+    if n == 0 or m == 0:
+        return out
+
+    step = n if not chunk_size else max(1, int(chunk_size))
+    cos_lat2 = np.cos(lat2)
+
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        block_lat1 = lat1[start:stop, None]
+        block_lon1 = lon1[start:stop, None]
+
+        # haversine formula: stesso ordine di operazioni della versione scalare;
+        # float_power (pow di libm) invece di **2 per avere valori identici bit a bit
+        dlon = lon2[None, :] - block_lon1
+        dlat = lat2[None, :] - block_lat1
+        a = (np.float_power(np.sin(dlat / 2), 2) +
+             np.cos(block_lat1) * cos_lat2[None, :] * np.float_power(np.sin(dlon / 2), 2))
+        c = 2 * np.arcsin(np.sqrt(a))
+        out[start:stop] = EARTH_RADIUS_KM * c
+
+    return out
+
+
+def haversine_pairs(lats_from, lons_from, lats_to, lons_to):
+    """
+    Distanze haversine (km) elemento per elemento tra punti corrispondenti:
+    stessi valori della diagonale di haversine_matrix, senza la matrice n × n.
+    """
+    lat1 = np.radians(np.asarray(lats_from, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lons_from, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats_to, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons_to, dtype=np.float64))
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = (np.float_power(np.sin(dlat / 2), 2) +
+         np.cos(lat1) * np.cos(lat2) * np.float_power(np.sin(dlon / 2), 2))
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Valori per le coppie che GraphHopper non sa collegare (null nella risposta): abbastanza
+# grandi da rendere l'arco inutilizzabile (il tempo di percorrenza supera ogni orizzonte)
+# ma ben dentro int32 dopo la quantizzazione in metri/secondi
+UNREACHABLE_DISTANCE_M = 10_000_000
+UNREACHABLE_TIME_S = 1_000_000
+
+
+def get_matrix_url():
+    GH_BASE = os.getenv("GRAPHHOPPER_URL", "http://localhost:8989")  # default per test locale
+    return f"{GH_BASE}/matrix"
+
+
+def fetch_matrix_block(from_coords, to_coords, profile="car", url=None, session=None, timeout=60):
+    """
+    Richiede a GraphHopper /matrix il blocco distanze/tempi tra due insiemi di punti.
+
+    Args:
+        from_coords, to_coords: liste di punti [lon, lat] (formato GraphHopper)
+        profile (str): profilo GraphHopper
+        url (str, optional): endpoint /matrix, default da GRAPHHOPPER_URL
+        session (requests.Session, optional): sessione HTTP da riutilizzare
+
+    Returns:
+        (distances, times) come np.ndarray float64 di forma len(from) × len(to); le celle
+        null (coppie non raggiungibili) valgono UNREACHABLE_DISTANCE_M / UNREACHABLE_TIME_S
+
+    Solleva un'eccezione se la richiesta fallisce: il fallback è a carico del chiamante.
+    """
+    import requests
+
+    payload = {
+        "from_points": [list(p) for p in from_coords],
+        "to_points": [list(p) for p in to_coords],
+        "out_arrays": ["distances", "times"],
+        "profile": profile
+    }
+    headers = {"Content-Type": "application/json"}
+
+    http = session if session is not None else requests
+    response = http.post(url or get_matrix_url(), data=json.dumps(payload), headers=headers, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+
+    shape = (len(from_coords), len(to_coords))
+    distances = _fill_unreachable(result["distances"], shape, UNREACHABLE_DISTANCE_M)
+    times = _fill_unreachable(result["times"], shape, UNREACHABLE_TIME_S)
+    return distances, times
+
+
+def _fill_unreachable(values, shape, fill):
+    # i null diventano NaN nella conversione a float64: vanno sostituiti prima della quantizzazione
+    array = np.asarray(values, dtype=np.float64).reshape(shape)
+    missing = ~np.isfinite(array)
+    if missing.any():
+        print(f"⚠️ {int(missing.sum())} coppie non raggiungibili nella risposta GraphHopper")
+        array[missing] = fill
+    return array
+
+
+class TiledMatrixFetcher:
+    """
+    Scarica da GraphHopper /matrix una matrice grande suddividendola in blocchi
+    tile_size × tile_size, richiesti in parallelo su una sessione HTTP condivisa
+    (connessioni keep-alive) e riassemblati in un unico array.
+
+    Args:
+        tile_size (int): numero massimo di punti from/to per singola richiesta
+        max_workers (int): richieste concorrenti al massimo
+        max_retries (int): tentativi per blocco prima di rinunciare
+        backoff_s (float): attesa base tra i tentativi (raddoppia ad ogni tentativo)
+        url (str, optional): endpoint /matrix, default da GRAPHHOPPER_URL
+        timeout (float): timeout per singola richiesta in secondi
+    """
+
+    def __init__(self, tile_size=100, max_workers=4, max_retries=3, backoff_s=0.5, url=None, timeout=60):
+        self.tile_size = tile_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def _fetch_tile(self, from_coords, to_coords, profile):
+        for attempt in range(self.max_retries):
+            try:
+                return fetch_matrix_block(from_coords, to_coords, profile=profile, url=self.url or get_matrix_url(),
+                                          session=self._get_session(), timeout=self.timeout)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                wait = self.backoff_s * (2 ** attempt)
+                print(f"⚠️ Blocco matrice fallito ({e}), nuovo tentativo tra {wait:.1f}s")
+                time.sleep(wait)
+
+    def fetch(self, from_coords, to_coords=None, profile="car"):
+        """
+        Args:
+            from_coords, to_coords: liste di punti [lon, lat]; to_coords default = from_coords
+
+        Returns:
+            (distances, times) np.ndarray float64 len(from) × len(to)
+        """
+        if to_coords is None:
+            to_coords = from_coords
+        n, m = len(from_coords), len(to_coords)
+        distances = np.zeros((n, m), dtype=np.float64)
+        times = np.zeros((n, m), dtype=np.float64)
+
+        tiles = [(r, c)
+                 for r in range(0, n, self.tile_size)
+                 for c in range(0, m, self.tile_size)]
+        if not tiles:
+            return distances, times
+
+        print(f"📡 Richiesta matrice GraphHopper {n}×{m} in {len(tiles)} blocchi")
+        self._get_session()  # creata prima dei thread, poi condivisa
+
+        def work(tile):
+            r, c = tile
+            return tile, self._fetch_tile(from_coords[r:r + self.tile_size],
+                                          to_coords[c:c + self.tile_size], profile)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for (r, c), (dist_block, time_block) in pool.map(work, tiles):
+                distances[r:r + dist_block.shape[0], c:c + dist_block.shape[1]] = dist_block
+                times[r:r + time_block.shape[0], c:c + time_block.shape[1]] = time_block
+
+        return distances, times
@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+
+from models.compact_matrix import METRES_PER_KM, CompactMatrix, quantize
+from models.distance_matrix import haversine_matrix
+from models.graphhopper_matrix import TiledMatrixFetcher
+
+
+class HaversineBackend:
+    """Blocchi di distanze haversine (km, salvate in metri), simmetriche."""
+    names = ("distances",)
+    kind = "distance_m"
+    profile = "haversine"
+    scales = {"distances": METRES_PER_KM}
+    symmetric = True
+
+    def block(self, from_latlon, to_latlon):
+        return {"distances": haversine_matrix(from_latlon[:, 0], from_latlon[:, 1],
+                                              to_latlon[:, 0], to_latlon[:, 1])}
+
+
+class GraphHopperBackend:
+    """Blocchi distanze/tempi richiesti a GraphHopper /matrix (metri e secondi)."""
+    names = ("distances", "times")
+    kind = "graphhopper_m_s"
+    scales = {"distances": 1, "times": 1}
+    symmetric = False
+
+    def __init__(self, profile="car", fetch=None):
+        self.profile = profile
+        self.fetch = fetch if fetch is not None else TiledMatrixFetcher().fetch
+
+    def block(self, from_latlon, to_latlon):
+        # GraphHopper vuole i punti come [lon, lat]
+        distances, times = self.fetch(from_latlon[:, ::-1].tolist(), to_latlon[:, ::-1].tolist(),
+                                      profile=self.profile)
+        return {"distances": distances, "times": times}
+
+
+class IncrementalMatrixBuilder:
+    """
+    Costruisce le matrici distanza/tempo riutilizzando quelle della richiesta precedente.
+
+    I nodi sono identificati dai loro ID (``customers.node_id_to_index``, oppure
+    dall'indice se assente): per i nodi già noti con le stesse coordinate si copia la
+    sottomatrice, e al backend si chiedono solo le righe e colonne dei k nodi nuovi,
+    con costo O(k·n) invece di O(n²). I nodi rimossi vengono semplicemente scartati.
+    Le matrici sono CompactMatrix int32 (triangolari se il backend è simmetrico).
+
+    Args:
+        backend: HaversineBackend (default) o GraphHopperBackend
+        cache (MatrixCache, optional): cache su disco consultata per l'intero insieme di
+            coordinate prima del calcolo incrementale
+        precision (int): cifre decimali per decidere se un nodo noto è stato spostato
+    """
+
+    def __init__(self, backend=None, cache=None, precision=6):
+        self.backend = backend if backend is not None else HaversineBackend()
+        self.cache = cache
+        self.precision = precision
+
+        self._ids = []
+        self._latlon = np.empty((0, 2))
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self.last_stats = {}
+
+    def build(self, customers):
+        """Calcola le matrici per ``customers`` e le assegna a distmat (e timemat se disponibile)."""
+        index_to_id = getattr(customers, "index_to_node_id", None)
+        ids = [index_to_id[i] if index_to_id else i for i in range(customers.number)]
+        latlon = customers.customers.latlon()
+
+        matrices = None
+        if self.cache is not None:
+            key = self.cache.make_key(latlon[:, 0], latlon[:, 1], self.backend.profile,
+                                      kind=self.backend.kind)
+            cached = self.cache.get(key, list(self.backend.names))
+            if cached is not None:
+                matrices = {name: CompactMatrix.from_data(data, len(ids)) for name, data in cached.items()}
+
+        with self._lock:
+            if matrices is None:
+                matrices = self._extend(ids, latlon)
+                if self.cache is not None:
+                    self.cache.put(key, {name: matrix.data for name, matrix in matrices.items()})
+            else:
+                self.last_stats = {"reused": len(ids), "computed": 0, "cache_hit": True}
+
+            self._ids = ids
+            self._latlon = latlon
+            self._matrices = matrices
+
+        customers.distmat = matrices["distances"]
+        if "times" in matrices:
+            customers.timemat = matrices["times"]
+        return matrices
+
+    def _extend(self, ids, latlon):
+        n = len(ids)
+        rounded = np.round(latlon, self.precision)
+        old_rounded = np.round(self._latlon, self.precision)
+        old_pos = {node_id: i for i, node_id in enumerate(self._ids)}
+
+        # Nodi riutilizzabili: stesso ID e stesse coordinate (arrotondate)
+        kept_new, kept_old = [], []
+        for i, node_id in enumerate(ids):
+            j = old_pos.get(node_id)
+            if j is not None and np.array_equal(rounded[i], old_rounded[j]):
+                kept_new.append(i)
+                kept_old.append(j)
+        kept_new = np.array(kept_new, dtype=np.intp)
+        kept_old = np.array(kept_old, dtype=np.intp)
+        added = np.setdiff1d(np.arange(n), kept_new)
+
+        symmetric = self.backend.symmetric
+        matrices = {name: CompactMatrix.empty(n, symmetric) for name in self.backend.names}
+        rows = cols = None
+        if len(added):
+            # Righe dei nodi nuovi verso tutti, poi (se non simmetrico) colonne dai nodi noti verso i nuovi
+            rows = self._quantized_block(latlon[added], latlon)
+            if len(kept_new) and not symmetric:
+                cols = self._quantized_block(latlon[kept_new], latlon[added])
+
+        for name, matrix in matrices.items():
+            for r, i in enumerate(added):
+                matrix.set_row(i, rows[name][r])
+            old = self._matrices.get(name)
+            for r, (i, j) in enumerate(zip(kept_new, kept_old)):
+                row = np.empty(n, dtype=np.int32)
+                row[kept_new] = old.row(j)[kept_old]
+                if len(added):
+                    row[added] = rows[name][:, i] if symmetric else cols[name][r]
+                matrix.set_row(i, row)
+
+        self.last_stats = {"reused": len(kept_new), "computed": len(added), "cache_hit": False}
+        print(f"🧮 Matrice incrementale: {len(kept_new)} nodi riutilizzati, {len(added)} calcolati")
+        return matrices
+
+    def _quantized_block(self, from_latlon, to_latlon):
+        block = self.backend.block(from_latlon, to_latlon)
+        return {name: quantize(block[name], self.backend.scales[name]) for name in self.backend.names}
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+class MatrixCache:
+    """
+    Cache su disco delle matrici distanza/tempo, indirizzata dal contenuto.
+
+    La chiave è un hash SHA-256 delle coordinate arrotondate, del profilo e del
+    tipo di matrice; ogni voce è un gruppo di file ``<chiave>.<nome>.npy`` caricati
+    in memory mapping. Quando la dimensione totale supera ``max_bytes`` vengono
+    eliminate le voci usate meno di recente (LRU sul tempo di modifica dei file).
+
+    Args:
+        cache_dir (str): cartella in cui salvare i file .npy
+        max_bytes (int): dimensione massima complessiva della cache
+        precision (int): cifre decimali usate per arrotondare le coordinate nella chiave
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, precision=6):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, lats, lons, profile, kind):
+        coords = np.round(np.column_stack([
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lons, dtype=np.float64)
+        ]), self.precision)
+        digest = hashlib.sha256()
+        digest.update(f"{kind}|{profile}|{self.precision}|".encode())
+        digest.update(np.ascontiguousarray(coords).tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key, name):
+        return os.path.join(self.cache_dir, f"{key}.{name}.npy")
+
+    def get(self, key, names):
+        """Restituisce {nome: array in mmap} se tutte le matrici sono presenti, altrimenti None."""
+        paths = [self._path(key, name) for name in names]
+        try:
+            arrays = {name: np.load(path, mmap_mode='r') for name, path in zip(names, paths)}
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Aggiorna il tempo d'uso per la politica LRU
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.hits += 1
+        return arrays
+
+    def put(self, key, arrays):
+        """Salva le matrici (scrittura atomica) e applica l'evizione LRU."""
+        for name, array in arrays.items():
+            path = self._path(key, name)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = {}
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".npy"):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = filename.split(".", 1)[0]
+            size, mtime, paths = entries.get(key, (0, 0.0, []))
+            entries[key] = (size + st.st_size, max(mtime, st.st_mtime), paths + [path])
+
+        total = sum(size for size, _, _ in entries.values())
+        for key, (size, _, paths) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """
+    Cache condivisa del processo, configurata da variabili d'ambiente:
+    MATRIX_CACHE_DIR (default ".matrix_cache", vuoto per disabilitarla)
+    e MATRIX_CACHE_MAX_MB (default 512).
+    """
+    global _default_cache
+    if _default_cache is None:
+        cache_dir = os.getenv("MATRIX_CACHE_DIR", ".matrix_cache")
+        if not cache_dir:
+            return None
+        max_mb = int(os.getenv("MATRIX_CACHE_MAX_MB", "512"))
+        _default_cache = MatrixCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+    return _default_cache
@@ -0,0 +1,195 @@
+import math
+
+import numpy as np
+
+from models.distance_matrix import EARTH_RADIUS_KM, haversine_matrix
+
+
+def _unit_vectors(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class SpatialIndex:
+    """
+    Indice spaziale a griglia uniforme (solo NumPy) per query di prossimità sui nodi.
+
+    Le coordinate vengono proiettate in km sul piano tangente alla sfera nel baricentro
+    (proiezione ortografica) e assegnate a celle quadrate; i punti sono ordinati per
+    cella, così ogni query esamina solo le celle vicine. La proiezione non allunga mai
+    le distanze (piano ≤ corda ≤ haversine): le celle entro il raggio cercato bastano
+    senza margini, anche attraverso l'antimeridiano e vicino ai poli. Le distanze
+    restituite sono haversine esatte (km), le stesse di ``haversine_matrix`` e quindi
+    (in metri) di ``Customers.distmat``.
+
+    Args:
+        lats, lons: coordinate dei nodi in gradi
+        cell_km (float, optional): lato della cella; default ~2 punti per cella
+    """
+
+    def __init__(self, lats, lons, cell_km=None):
+        # copie: l'indice resta coerente anche se le coordinate originali vengono modificate
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lons = np.array(lons, dtype=np.float64)
+        self.size = len(self.lats)
+
+        # baricentro sulla sfera (media dei versori), non delle coordinate:
+        # con nodi a cavallo dell'antimeridiano la media delle longitudini cade dall'altra parte
+        center = _unit_vectors(self.lats, self.lons).sum(axis=0) if self.size else np.zeros(3)
+        if np.linalg.norm(center) < 1e-9:
+            center = np.array([1.0, 0.0, 0.0])
+        self.lat0 = math.degrees(math.atan2(center[2], math.hypot(center[0], center[1])))
+        self.lon0 = math.degrees(math.atan2(center[1], center[0]))
+        lat0, lon0 = math.radians(self.lat0), math.radians(self.lon0)
+        # assi est e nord del piano tangente
+        self.axes = np.array([[-math.sin(lon0), math.cos(lon0), 0.0],
+                              [-math.sin(lat0) * math.cos(lon0), -math.sin(lat0) * math.sin(lon0), math.cos(lat0)]])
+        xy = self._project(self.lats, self.lons)
+
+        if cell_km is None:
+            extent = np.ptp(xy, axis=0) if self.size else np.zeros(2)
+            area = max(float(extent[0] * extent[1]), 1e-6)
+            cell_km = max(math.sqrt(2 * area / max(self.size, 1)), 1e-3)
+        self.cell_km = cell_km
+
+        self.origin = xy.min(axis=0) if self.size else np.zeros(2)
+        cells = np.floor((xy - self.origin) / cell_km).astype(np.int64)
+        self.n_cols = int(cells[:, 0].max()) + 1 if self.size else 1
+        self.n_rows = int(cells[:, 1].max()) + 1 if self.size else 1
+
+        keys = cells[:, 1] * self.n_cols + cells[:, 0]
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def _project(self, lats, lons):
+        return _unit_vectors(lats, lons) @ self.axes.T * EARTH_RADIUS_KM
+
+    def _cell_of(self, lat, lon):
+        xy = self._project([lat], [lon])[0]
+        return np.floor((xy - self.origin) / self.cell_km).astype(np.int64)
+
+    def _points_in_cells(self, col_min, col_max, row_min, row_max):
+        col_min, col_max = max(col_min, 0), min(col_max, self.n_cols - 1)
+        row_min, row_max = max(row_min, 0), min(row_max, self.n_rows - 1)
+        if col_min > col_max or row_min > row_max:
+            return np.empty(0, dtype=np.int64)
+        # una fascia contigua di chiavi per ogni riga di celle
+        chunks = []
+        for row in range(row_min, row_max + 1):
+            lo = np.searchsorted(self.sorted_keys, row * self.n_cols + col_min, side="left")
+            hi = np.searchsorted(self.sorted_keys, row * self.n_cols + col_max, side="right")
+            if hi > lo:
+                chunks.append(self.order[lo:hi])
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def _distances(self, lat, lon, idx):
+        return haversine_matrix([lat], [lon], self.lats[idx], self.lons[idx])[0]
+
+    def radius(self, lat, lon, radius_km):
+        """Indici dei nodi entro radius_km da (lat, lon), ordinati per distanza, e le distanze."""
+        reach = int(math.ceil(radius_km / self.cell_km)) + 1
+        col, row = self._cell_of(lat, lon)
+        idx = self._points_in_cells(col - reach, col + reach, row - reach, row + reach)
+        dist = self._distances(lat, lon, idx)
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat, lon, k=1):
+        """I k nodi più vicini a (lat, lon) ordinati per distanza, e le distanze."""
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        col, row = self._cell_of(lat, lon)
+        ring = 0
+        max_ring = max(self.n_cols, self.n_rows) + abs(int(col)) + abs(int(row))
+        while True:
+            idx = self._points_in_cells(col - ring, col + ring, row - ring, row + ring)
+            if len(idx) >= k or ring >= max_ring:
+                dist = self._distances(lat, lon, idx)
+                order = np.argsort(dist, kind="stable")[:k]
+                # il k-esimo è certo solo se sta entro l'anello completamente esplorato:
+                # fuori dall'anello la distanza proiettata, e quindi l'haversine, supera ring · cell_km
+                if ring >= max_ring or dist[order[-1]] <= ring * self.cell_km:
+                    return idx[order], dist[order]
+                # altrimenti basta una query a raggio pari alla distanza trovata
+                idx, dist = self.radius(lat, lon, float(dist[order[-1]]))
+                return idx[:k], dist[:k]
+            ring = max(1, ring * 2)
+
+    def nearest_all(self, k):
+        """
+        I k nodi più vicini a ciascun nodo (escluso il nodo stesso), come array size × k
+        ordinato per distanza. Si interroga una volta per cella occupata: i nodi della
+        stessa cella condividono le celle candidate e le distanze si calcolano a blocchi.
+        """
+        k = min(k, self.size - 1)
+        result = np.empty((self.size, max(k, 0)), dtype=np.int64)
+        if k <= 0:
+            return result
+
+        max_ring = max(self.n_cols, self.n_rows)
+        bounds = np.flatnonzero(np.r_[True, self.sorted_keys[1:] != self.sorted_keys[:-1], True])
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            members = self.order[lo:hi]
+            row, col = divmod(int(self.sorted_keys[lo]), self.n_cols)
+            # ~2 punti per cella: un quadrato di lato 2·ring + 1 contiene circa 2k candidati
+            ring = max(1, math.ceil(math.sqrt(k) / 2))
+            idx = self._points_in_cells(col - ring, col + ring, row - ring, row + ring)
+            while len(idx) <= k and ring < max_ring:
+                ring *= 2
+                idx = self._points_in_cells(col - ring, col + ring, row - ring, row + ring)
+
+            dist = haversine_matrix(self.lats[members], self.lons[members], self.lats[idx], self.lons[idx])
+            dist[members[:, None] == idx[None, :]] = np.inf
+            order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+            result[members] = idx[order]
+
+            # come in nearest: il k-esimo è certo solo se sta entro l'anello esplorato
+            if ring >= max_ring:
+                continue
+            kth = dist[np.arange(len(members)), order[:, -1]]
+            for r in np.flatnonzero(kth > ring * self.cell_km).tolist():
+                node = int(members[r])
+                near, _ = self.nearest(self.lats[node], self.lons[node], k + 1)
+                result[node] = near[near != node][:k]
+        return result
+
+    def bbox(self, lat_min, lon_min, lat_max, lon_max):
+        """Indici dei nodi nel rettangolo di coordinate indicato (estremi inclusi)."""
+        if lon_max - lon_min <= 180:
+            # entro mezzo giro di longitudine il punto del rettangolo più lontano dal
+            # centro è uno degli spigoli: basta una query a raggio
+            lat_c, lon_c = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+            corners = haversine_matrix([lat_c], [lon_c], [lat_min, lat_min, lat_max, lat_max],
+                                       [lon_min, lon_max, lon_min, lon_max])[0]
+            idx, _ = self.radius(lat_c, lon_c, float(corners.max()))
+        else:
+            idx = np.arange(self.size)
+        lats, lons = self.lats[idx], self.lons[idx]
+        keep = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+        return np.sort(idx[keep])
+
+    def colocated_groups(self, tol_km=0.01):
+        """Gruppi (di almeno 2 nodi) che distano tra loro non più di tol_km: fermate coincidenti."""
+        parent = np.arange(self.size)
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(self.size):
+            idx, _ = self.radius(self.lats[i], self.lons[i], tol_km)
+            for j in idx:
+                ri, rj = find(i), find(int(j))
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+        groups = {}
+        for i in range(self.size):
+            groups.setdefault(find(i), []).append(i)
+        return [members for members in groups.values() if len(members) > 1]
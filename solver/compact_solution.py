@@ -0,0 +1,134 @@
+import numpy as np
+
+
+class CompactSolution:
+    """
+    Soluzione OR-Tools estratta in un solo passaggio, in array NumPy.
+
+    Le rotte si percorrono una volta sola seguendo NextVar, leggendo insieme i cumul
+    di Capacity e Time; stampa, JSON, CSV, tratte ed grafici lavorano poi su questi
+    array senza tornare sull'assignment. Il costo è lineare nella lunghezza delle rotte.
+
+    Attributes:
+        objective (int): valore obiettivo
+        nodes (np.ndarray): nodi di tutte le rotte concatenati, partenza e arrivo compresi
+        offsets (np.ndarray): la rotta del veicolo v è nodes[offsets[v]:offsets[v + 1]]
+        load, time_min, time_max (np.ndarray): cumul per posizione in ``nodes``
+            (None se estratta senza cumul)
+        node_vehicle (np.ndarray): veicolo che visita ciascun nodo (-1 se nessuno);
+            per i depot condivisi vale l'ultimo veicolo
+        dropped (np.ndarray): nodi non serviti (né visitati né depot), crescenti
+        pair_vehicle (np.ndarray): veicolo di ogni coppia di ``customers.pdp_pairs``
+            (-1 se pickup e delivery non sono sullo stesso veicolo)
+    """
+
+    def __init__(self, objective, nodes, offsets, load, time_min, time_max, node_vehicle, dropped, pair_vehicle):
+        self.objective = objective
+        self.nodes = nodes
+        self.offsets = offsets
+        self.load = load
+        self.time_min = time_min
+        self.time_max = time_max
+        self.node_vehicle = node_vehicle
+        self.dropped = dropped
+        self.pair_vehicle = pair_vehicle
+
+    @classmethod
+    def from_assignment(cls, manager, routing, assignment, customers, cumuls=True):
+        """
+        Args:
+            cumuls (bool): False durante la ricerca (callback di soluzione), dove
+                l'assignment espone solo Value e i cumul non servono
+        """
+        num_vehicles = routing.vehicles()
+        num_nodes = manager.GetNumberOfNodes()
+        capacity_dim = routing.GetDimensionOrDie('Capacity') if cumuls else None
+        time_dim = routing.GetDimensionOrDie('Time') if cumuls else None
+
+        nodes, load, time_min, time_max = [], [], [], []
+        offsets = [0]
+        for vehicle_id in range(num_vehicles):
+            index = routing.Start(vehicle_id)
+            while True:
+                nodes.append(manager.IndexToNode(index))
+                if cumuls:
+                    load.append(assignment.Value(capacity_dim.CumulVar(index)))
+                    time_var = time_dim.CumulVar(index)
+                    time_min.append(assignment.Min(time_var))
+                    time_max.append(assignment.Max(time_var))
+                if routing.IsEnd(index):
+                    break
+                index = assignment.Value(routing.NextVar(index))
+            offsets.append(len(nodes))
+
+        nodes = np.array(nodes, dtype=np.int32)
+        offsets = np.array(offsets, dtype=np.int64)
+        node_vehicle = _node_vehicle(nodes, offsets, num_nodes)
+
+        # Non serviti: tutto ciò che non compare in una rotta, tolti i depot di partenza/arrivo
+        is_depot = np.zeros(num_nodes, dtype=bool)
+        is_depot[[manager.IndexToNode(routing.Start(v)) for v in range(num_vehicles)]] = True
+        is_depot[[manager.IndexToNode(routing.End(v)) for v in range(num_vehicles)]] = True
+        dropped = np.flatnonzero((node_vehicle < 0) & ~is_depot).astype(np.int32)
+
+        as_array = (lambda values: np.array(values, dtype=np.int64)) if cumuls else (lambda values: None)
+        return cls(assignment.ObjectiveValue(), nodes, offsets, as_array(load), as_array(time_min),
+                   as_array(time_max), node_vehicle, dropped, _pair_vehicle(node_vehicle, customers))
+
+    @classmethod
+    def from_routes(cls, objective, routes, dropped, customers, load=None, time_min=None, time_max=None):
+        """
+        Da rotte costruite fuori da un unico assignment OR-Tools (es. decomposizione).
+
+        Args:
+            routes (list): nodi di ogni veicolo, partenza e arrivo compresi
+            dropped (iterable): nodi non serviti
+            load, time_min, time_max (list, optional): cumul per veicolo, allineati a routes
+        """
+        offsets = np.zeros(len(routes) + 1, dtype=np.int64)
+        np.cumsum([len(route) for route in routes], out=offsets[1:])
+        nodes = np.concatenate([np.asarray(route, dtype=np.int32) for route in routes]) if routes \
+            else np.empty(0, dtype=np.int32)
+        node_vehicle = _node_vehicle(nodes, offsets, customers.number)
+
+        def as_array(values):
+            return None if values is None else np.concatenate([np.asarray(v, dtype=np.int64) for v in values])
+
+        return cls(objective, nodes, offsets, as_array(load), as_array(time_min), as_array(time_max),
+                   node_vehicle, np.array(sorted(dropped), dtype=np.int32), _pair_vehicle(node_vehicle, customers))
+
+    @property
+    def num_vehicles(self):
+        return len(self.offsets) - 1
+
+    def route(self, vehicle_id):
+        """Nodi della rotta (partenza e arrivo compresi)."""
+        return self.nodes[self.offsets[vehicle_id]:self.offsets[vehicle_id + 1]]
+
+    def route_slice(self, vehicle_id):
+        """Intervallo delle posizioni del veicolo, per indicizzare load/time_min/time_max."""
+        return slice(int(self.offsets[vehicle_id]), int(self.offsets[vehicle_id + 1]))
+
+    def is_empty(self, vehicle_id):
+        """True se il veicolo va direttamente dalla partenza all'arrivo."""
+        return self.offsets[vehicle_id + 1] - self.offsets[vehicle_id] <= 2
+
+    def vehicles_used(self):
+        return int(np.count_nonzero(np.diff(self.offsets) > 2))
+
+
+def _node_vehicle(nodes, offsets, num_nodes):
+    node_vehicle = np.full(num_nodes, -1, dtype=np.int32)
+    node_vehicle[nodes] = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    return node_vehicle
+
+
+def _pair_vehicle(node_vehicle, customers):
+    pairs = np.array(getattr(customers, 'pdp_pairs', []), dtype=np.int64).reshape(-1, 2)
+    return same_vehicle(node_vehicle, pairs[:, 0], pairs[:, 1])
+
+
+def same_vehicle(node_vehicle, pickups, deliveries):
+    """Per ogni coppia, il veicolo che visita sia pickup sia delivery, altrimenti -1."""
+    first = node_vehicle[pickups]
+    return np.where(first == node_vehicle[deliveries], first, -1).astype(np.int32)
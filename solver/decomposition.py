@@ -0,0 +1,446 @@
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.compact_matrix import METRES_PER_KM, quantize
+from models.Customers import Customers
+from models.distance_matrix import haversine_pairs
+from models.Vehicles import Vehicles
+from solver.compact_solution import CompactSolution
+from solver.routing_model_builder import RoutingModelBuilder
+
+
+def _make_items(customers, vehicles):
+    """
+    Unità indivisibili da partizionare: ogni coppia PDP (pickup e delivery restano
+    insieme) e ogni altro nodo non depot come singolo.
+    """
+    depots = set(vehicles.starts) | set(vehicles.ends)
+    items = [tuple(pair) for pair in getattr(customers, 'pdp_pairs', [])]
+    in_pairs = {node for pair in items for node in pair}
+    items += [(node,) for node in range(customers.number) if node not in depots and node not in in_pairs]
+    return items
+
+
+def _item_points(customers, items):
+    # Baricentro di ogni unità in coordinate piane approssimate (lon scalata per cos(lat))
+    lats, lons = customers.customers.lat, customers.customers.lon
+    lat = np.array([lats[list(item)].mean() for item in items])
+    lon = np.array([lons[list(item)].mean() for item in items])
+    return np.column_stack([lat, lon * np.cos(np.deg2rad(lat.mean()))]) if len(items) else np.empty((0, 2))
+
+
+def _item_workloads(customers, vehicles, items):
+    """
+    Lavoro stimato (secondi) di ogni unità: servizio ai pickup più il viaggio diretto
+    pickup → delivery, che per coppie lontane pesa più della quantità trasportata.
+    """
+    speed = getattr(vehicles, "speed_kmph", 30)
+    table = customers.customers
+    load = np.maximum(table.demand, 0)
+    workloads = np.array([load[list(item)].sum() for item in items], dtype=np.float64) * customers.service_time_per_dem
+
+    pairs = [i for i, item in enumerate(items) if len(item) == 2]
+    if pairs:
+        first = np.array([items[i][0] for i in pairs])
+        second = np.array([items[i][1] for i in pairs])
+        drive = haversine_pairs(table.lat[first], table.lon[first], table.lat[second], table.lon[second])
+        workloads[pairs] += drive / speed * 3600
+    return workloads
+
+
+def sweep_clusters(points, center, n_clusters):
+    """
+    Partizione per angolo attorno al depot: le unità vengono ordinate per angolo
+    partendo dal vuoto angolare più ampio e tagliate in n_clusters settori di pari numerosità.
+    """
+    angles = np.arctan2(points[:, 0] - center[0], points[:, 1] - center[1])
+    order = np.argsort(angles)
+    if len(order) > 1:
+        sorted_angles = angles[order]
+        gaps = np.diff(np.append(sorted_angles, sorted_angles[0] + 2 * np.pi))
+        order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+    labels = np.empty(len(points), dtype=np.int64)
+    for label, chunk in enumerate(np.array_split(order, n_clusters)):
+        labels[chunk] = label
+    return labels
+
+
+def kmeans_clusters(points, n_clusters, iterations=25, seed=0):
+    """K-means (Lloyd) con inizializzazione k-means++, solo numpy."""
+    rng = np.random.default_rng(seed)
+    centroids = [points[rng.integers(len(points))]]
+    for _ in range(1, n_clusters):
+        dist2 = np.min(((points[:, None, :] - np.array(centroids)[None, :, :]) ** 2).sum(axis=2), axis=1)
+        total = dist2.sum()
+        probs = dist2 / total if total > 0 else None
+        centroids.append(points[rng.choice(len(points), p=probs)])
+    centroids = np.array(centroids)
+
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(iterations):
+        dist2 = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+        new_labels = np.argmin(dist2, axis=1)
+        if np.array_equal(new_labels, labels) and _ > 0:
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            members = points[labels == k]
+            if len(members):
+                centroids[k] = members.mean(axis=0)
+
+    # Rinumera i cluster per angolo, così i vicini hanno etichette consecutive (per la riparazione)
+    used = np.unique(labels)
+    angles = np.arctan2(centroids[used, 0] - points[:, 0].mean(), centroids[used, 1] - points[:, 1].mean())
+    relabel = {int(old): new for new, old in enumerate(used[np.argsort(angles)])}
+    return np.array([relabel[int(label)] for label in labels], dtype=np.int64)
+
+
+def allocate_vehicles(cluster_workloads, vehicles):
+    """
+    Divide la flotta tra i cluster in proporzione al lavoro stimato (metodo dei resti
+    maggiori), almeno un veicolo per cluster. I veicoli più capienti vanno ai cluster
+    con più lavoro per veicolo.
+    """
+    n_clusters = len(cluster_workloads)
+    demands = np.maximum(np.asarray(cluster_workloads, dtype=np.float64), 1e-9)
+    spare = vehicles.number - n_clusters
+    quota = demands / demands.sum() * spare
+    counts = np.floor(quota).astype(np.int64) + 1
+    for k in np.argsort(-(quota - np.floor(quota)))[:vehicles.number - counts.sum()]:
+        counts[k] += 1
+
+    by_capacity = sorted(range(vehicles.number), key=lambda v: -vehicles.vehicles[v].capacity)
+    assignment = [[] for _ in range(n_clusters)]
+    # giro a serpentina sui cluster ordinati per domanda/veicolo
+    order = sorted(range(n_clusters), key=lambda k: -demands[k] / counts[k])
+    remaining = list(counts)
+    i, step, pos = 0, 1, 0
+    while i < len(by_capacity):
+        k = order[pos]
+        if remaining[k] > 0:
+            assignment[k].append(by_capacity[i])
+            remaining[k] -= 1
+            i += 1
+        if pos + step < 0 or pos + step >= n_clusters:
+            step = -step
+        else:
+            pos += step
+    return [sorted(vs) for vs in assignment]
+
+
+def make_subproblem(customers, vehicles, nodes, vehicle_idxs):
+    """
+    Sottoproblema con i soli nodi e veicoli indicati, rinumerati da 0.
+
+    Returns:
+        (sub_customers, sub_vehicles, local_to_global): local_to_global[i] è il nodo
+        originale corrispondente al nodo locale i
+    """
+    depots = []
+    for v in vehicle_idxs:
+        for node in (vehicles.starts[v], vehicles.ends[v]):
+            if node not in depots:
+                depots.append(node)
+    local_to_global = depots + [n for n in sorted(nodes) if n not in depots]
+    global_to_local = {g: i for i, g in enumerate(local_to_global)}
+
+    sub_customers = Customers(prebuilt_customers=customers.customers.take(local_to_global))
+    sub_customers.time_horizon = customers.time_horizon
+    sub_customers.service_time_per_dem = customers.service_time_per_dem
+    sub_customers.pdp_pairs = [
+        (global_to_local[p], global_to_local[d]) for p, d in getattr(customers, 'pdp_pairs', [])
+        if p in global_to_local and d in global_to_local
+    ]
+    sub_customers.pdp_pairs_flat = list({n for pair in sub_customers.pdp_pairs for n in pair})
+
+    fleet = [vehicles.vehicles[v] for v in vehicle_idxs]
+    sub_vehicles = Vehicles(capacity=[v.capacity for v in fleet], cost=[v.cost for v in fleet],
+                            number=len(fleet), speed_kmph=vehicles.speed_kmph, ids=[v.id for v in fleet])
+    sub_vehicles.starts = [global_to_local[vehicles.starts[v]] for v in vehicle_idxs]
+    sub_vehicles.ends = [global_to_local[vehicles.ends[v]] for v in vehicle_idxs]
+    return sub_customers, sub_vehicles, local_to_global
+
+
+def _solve_subproblem(sub_customers, sub_vehicles, penalty, time_limit_s, initial_routes=None):
+    """
+    Eseguita in un processo separato. Restituisce le rotte come liste di nodi locali
+    (senza start/end), l'obiettivo e i nodi scartati.
+    initial_routes (liste di nodi locali per veicolo) fa partire la ricerca da quelle rotte.
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        builder = RoutingModelBuilder(sub_customers, sub_vehicles, penalty=penalty, use_transit_matrices=True,
+                                      droppable_pairs=True)
+        manager, routing = builder.get_model()
+        parameters = builder.get_default_parameters(time_limit_s=time_limit_s)
+        initial_objective = None
+        if initial_routes is not None:
+            # l'assignment restituito viene riusato dal solve successivo: prima l'obiettivo iniziale
+            index_routes = [[manager.NodeToIndex(n) for n in route] for route in initial_routes]
+            initial = builder.restore_routes(index_routes)
+            initial_objective = initial.ObjectiveValue() if initial else None
+            assignment = routing.SolveFromAssignmentWithParameters(
+                builder.make_assignment_from_routes(index_routes), parameters)
+        else:
+            assignment = routing.SolveWithParameters(parameters)
+
+    result = {"objective": None, "initial_objective": initial_objective, "routes": None, "dropped": [],
+              "seconds": time.perf_counter() - start}
+    if assignment:
+        result["objective"] = assignment.ObjectiveValue()
+        result["routes"] = [[manager.IndexToNode(i) for i in route] for route in builder.get_index_routes(assignment)]
+        result["dropped"] = [manager.IndexToNode(i) for i in range(routing.Size())
+                             if not routing.IsStart(i) and not routing.IsEnd(i)
+                             and assignment.Value(routing.NextVar(i)) == i]
+    return result
+
+
+def solve_decomposed(customers, vehicles, method="sweep", max_cluster_nodes=200, time_limit_s=40,
+                     repair=True, repair_time_s=None, penalty=9999999, max_workers=None, seed=0):
+    """
+    Risolve istanze molto grandi dividendo clienti e flotta in cluster geografici,
+    risolti in processi paralleli e poi ricuciti in un unico insieme di rotte.
+
+    Args:
+        customers, vehicles: problema completo (starts/ends già impostati)
+        method (str): "sweep" (angolo attorno al depot) o "kmeans"
+        max_cluster_nodes (int): nodi massimi per cluster (determina il numero di cluster)
+        time_limit_s (float): budget complessivo per la risoluzione dei cluster
+        repair (bool): riottimizza a coppie i cluster adiacenti partendo dalle rotte trovate,
+            così i nodi di confine possono cambiare veicolo
+        repair_time_s (float, optional): budget della riparazione (default metà di time_limit_s)
+        max_workers (int, optional): processi paralleli, default numero di core
+
+    Solo libreria (benchmarks/bench_decomposition.py): l'API non la espone.
+
+    Returns:
+        dict con "solution" (CompactSolution sui nodi originali, per SolutionPrinter.from_solution,
+        build_route_for_export, export e grafici), "dropped" (nodi originali non serviti),
+        "objective" (somma dei sottoproblemi) e "clusters"
+    """
+    items = _make_items(customers, vehicles)
+    points = _item_points(customers, items)
+    n_nodes = sum(len(item) for item in items)
+    n_clusters = max(1, min(vehicles.number, len(items), math.ceil(n_nodes / max_cluster_nodes)))
+
+    depots = sorted(set(vehicles.starts))
+    center_lat = customers.customers.lat[depots].mean()
+    center = (center_lat, customers.customers.lon[depots].mean() * np.cos(np.deg2rad(points[:, 0].mean())))
+    if method == "kmeans":
+        labels = kmeans_clusters(points, n_clusters, seed=seed)
+        n_clusters = int(labels.max()) + 1
+    elif method == "sweep":
+        labels = sweep_clusters(points, center, n_clusters)
+    else:
+        raise ValueError(f"❌ Metodo di decomposizione sconosciuto: {method}")
+
+    cluster_nodes = [[] for _ in range(n_clusters)]
+    cluster_workloads = np.zeros(n_clusters)
+    for item, workload, label in zip(items, _item_workloads(customers, vehicles, items), labels):
+        cluster_nodes[label].extend(item)
+        cluster_workloads[label] += workload
+    cluster_vehicles = allocate_vehicles(cluster_workloads, vehicles)
+
+    workers = max_workers or os.cpu_count() or 1
+    # Budget ripartito in "ondate" di cluster risolti in parallelo
+    waves = math.ceil(n_clusters / workers)
+    cluster_time_s = max(0.2, time_limit_s / waves)
+    print(f"🧩 Decomposizione {method}: {n_nodes} nodi in {n_clusters} cluster, "
+          f"{workers} processi, {cluster_time_s:.1f}s per cluster")
+
+    subproblems = [make_subproblem(customers, vehicles, cluster_nodes[k], cluster_vehicles[k])
+                   for k in range(n_clusters)]
+
+    # routes[v]: nodi originali visitati dal veicolo v (senza start/end)
+    routes = [[] for _ in range(vehicles.number)]
+    dropped = set()
+    stats = []
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = [executor.submit(_solve_subproblem, sub_c, sub_v, penalty, cluster_time_s)
+                   for sub_c, sub_v, _ in subproblems]
+        objectives = []
+        for k, future in enumerate(futures):
+            result = future.result()
+            _, _, local_to_global = subproblems[k]
+            stats.append({"cluster": k, "nodes": len(cluster_nodes[k]), "vehicles": len(cluster_vehicles[k]),
+                          "objective": result["objective"], "seconds": result["seconds"]})
+            if result["routes"] is None:
+                dropped.update(cluster_nodes[k])
+                objectives.append(None)
+                continue
+            for v, route in zip(cluster_vehicles[k], result["routes"]):
+                routes[v] = [local_to_global[n] for n in route]
+            dropped.update(local_to_global[n] for n in result["dropped"])
+            objectives.append(result["objective"])
+
+        if dropped and n_clusters > 1:
+            _retry_failed(executor, customers, vehicles, cluster_nodes, cluster_vehicles,
+                          routes, dropped, objectives, penalty, 2 * cluster_time_s)
+
+        objective = sum(o for o in objectives if o is not None)
+        if repair and n_clusters > 1:
+            repair_time_s = repair_time_s if repair_time_s is not None else time_limit_s / 2
+            objective -= _repair_boundaries(executor, customers, vehicles, cluster_nodes, cluster_vehicles,
+                                            routes, dropped, objectives, penalty, repair_time_s, workers)
+    finally:
+        executor.shutdown()
+
+    full_routes = [[vehicles.starts[v]] + routes[v] + [vehicles.ends[v]] for v in range(vehicles.number)]
+    load, time_min, time_max = zip(*[_route_cumuls(customers, vehicles, route) for route in full_routes])
+    solution = CompactSolution.from_routes(objective, full_routes, dropped, customers, load, time_min, time_max)
+    print(f"🧵 Rotte ricucite: obiettivo {objective}, {len(dropped)} nodi scartati")
+    return {"solution": solution, "dropped": sorted(dropped), "objective": objective, "clusters": stats}
+
+
+def _route_cumuls(customers, vehicles, route):
+    """
+    Carico e intervallo di arrivo [min, max] a ogni posizione di una rotta ricucita,
+    con le regole della dimensione Time del modello (make_time_matrix): partenza a 0,
+    servizio + viaggio haversine, attesa libera, nessun tempo in uscita dalla partenza
+    né in ingresso all'arrivo.
+
+    Returns:
+        (load, time_min, time_max) come array int64 lunghi quanto la rotta
+    """
+    table = customers.customers
+    route = np.asarray(route, dtype=np.int64)
+    load = np.concatenate([[0], np.cumsum(table.demand[route[:-1]])])
+
+    speed = getattr(vehicles, "speed_kmph", 30)
+    frm, to = route[:-1], route[1:]
+    distance_m = quantize(haversine_pairs(table.lat[frm], table.lon[frm], table.lat[to], table.lon[to]),
+                          METRES_PER_KM)
+    legs = np.trunc(table.demand[frm] * customers.service_time_per_dem
+                    + distance_m / (speed * METRES_PER_KM / 3600)).astype(np.int64)
+    legs[0] = legs[-1] = 0
+
+    opens = np.where(table.has_tw[route], table.tw_open_s[route], 0).tolist()
+    closes = np.where(table.has_tw[route], table.tw_close_s[route], customers.time_horizon).tolist()
+    legs = legs.tolist()
+    time_min, time_max = [0] * len(route), [0] * len(route)
+    for i in range(1, len(route)):
+        time_min[i] = max(time_min[i - 1] + legs[i - 1], opens[i])
+    time_max[-1] = closes[-1]
+    for i in range(len(route) - 2, 0, -1):
+        time_max[i] = min(closes[i], time_max[i + 1] - legs[i])
+    return load, np.array(time_min, dtype=np.int64), np.array(time_max, dtype=np.int64)
+
+
+def _reassign_nodes(a, b, cluster_nodes, cluster_vehicles, routes, dropped, new_dropped):
+    # Dopo aver risolto insieme i cluster a e b: ogni nodo va al cluster del veicolo che lo serve
+    pair_nodes = set(cluster_nodes[a]) | set(cluster_nodes[b])
+    dropped.difference_update(pair_nodes)
+    dropped.update(new_dropped)
+    served_by_b = {n for v in cluster_vehicles[b] for n in routes[v]}
+    old_b = set(cluster_nodes[b])
+    cluster_nodes[b] = [n for n in pair_nodes if n in served_by_b or (n in dropped and n in old_b)]
+    in_b = set(cluster_nodes[b])
+    cluster_nodes[a] = [n for n in pair_nodes if n not in in_b]
+
+
+def _adjacent_cluster(customers, cluster_nodes, k, candidates, neighbours=8):
+    """
+    Tra i candidati, il cluster che confina di più con k: quello a cui appartengono più
+    spesso i vicini (indice spaziale) dei nodi di k. Senza vicini negli altri cluster
+    si ripiega sull'adiacenza per etichetta (angolo attorno al depot).
+    """
+    owner = {node: j for j in candidates for node in cluster_nodes[j]}
+    index = customers.get_spatial_index()
+    lats, lons = customers.customers.lat, customers.customers.lon
+    votes = Counter()
+    for node in cluster_nodes[k]:
+        near, _ = index.nearest(lats[node], lons[node], neighbours)
+        votes.update(owner[j] for j in near.tolist() if j in owner)
+    if votes:
+        return votes.most_common(1)[0][0]
+    return min(candidates, key=lambda j: (abs(j - k), j < k))
+
+
+def _retry_failed(executor, customers, vehicles, cluster_nodes, cluster_vehicles,
+                  routes, dropped, objectives, penalty, time_limit_s):
+    """
+    Un cluster che ha scartato nodi (flotta insufficiente per il suo lavoro) viene
+    risolto di nuovo insieme al cluster confinante (_adjacent_cluster), con i veicoli di entrambi;
+    il risultato si tiene solo se l'obiettivo complessivo (penalità incluse) migliora.
+    Due cluster uniti non vengono più scelti né ritentati: l'obiettivo dell'unione sta
+    tutto in objectives[k], e confrontarlo con un sottoproblema di una sola metà
+    darebbe un riferimento sbagliato.
+    """
+    n_clusters = len(cluster_nodes)
+    merged = set()
+    for k in range(n_clusters):
+        if k in merged or (objectives[k] is not None and not dropped.intersection(cluster_nodes[k])):
+            continue
+        candidates = [j for j in range(n_clusters) if j != k and j not in merged and objectives[j] is not None]
+        if not candidates:
+            continue
+        j = _adjacent_cluster(customers, cluster_nodes, k, candidates)
+        vehicle_idxs = cluster_vehicles[k] + cluster_vehicles[j]
+        sub_c, sub_v, local_to_global = make_subproblem(customers, vehicles, cluster_nodes[k] + cluster_nodes[j],
+                                                        vehicle_idxs)
+        result = executor.submit(_solve_subproblem, sub_c, sub_v, penalty, time_limit_s).result()
+        before = None if objectives[k] is None else objectives[k] + objectives[j]
+        if result["objective"] is None or (before is not None and result["objective"] >= before):
+            continue
+        for v, route in zip(vehicle_idxs, result["routes"]):
+            routes[v] = [local_to_global[n] for n in route]
+        _reassign_nodes(k, j, cluster_nodes, cluster_vehicles, routes, dropped,
+                        [local_to_global[n] for n in result["dropped"]])
+        # obiettivo dell'unione attribuito al cluster k, il vicino non conta più a parte
+        objectives[k], objectives[j] = result["objective"], 0
+        merged.update((k, j))
+        print(f"🔁 Cluster {k} risolto insieme al cluster {j}: obiettivo {before} → {result['objective']}")
+
+
+def _repair_boundaries(executor, customers, vehicles, cluster_nodes, cluster_vehicles,
+                       routes, dropped, objectives, penalty, repair_time_s, workers):
+    """
+    Riottimizza ogni coppia di cluster adiacenti (k, k+1) come un unico sottoproblema
+    che parte dalle rotte correnti: prima le coppie pari, poi le dispari, così le coppie
+    di ciascuna fase sono disgiunte e girano in parallelo. Si accetta solo se migliora;
+    i nodi passano al cluster del veicolo che ora li serve.
+
+    Returns:
+        miglioramento totale dell'obiettivo
+    """
+    n_clusters = len(cluster_nodes)
+    phases = [[(k, k + 1) for k in range(start, n_clusters - 1, 2)] for start in (0, 1)]
+    pair_time_s = max(0.2, repair_time_s / sum(math.ceil(len(p) / workers) for p in phases if p))
+
+    improvement = 0
+    for pairs in phases:
+        jobs = []
+        for a, b in pairs:
+            if objectives[a] is None or objectives[b] is None:
+                continue
+            vehicle_idxs = cluster_vehicles[a] + cluster_vehicles[b]
+            sub_c, sub_v, local_to_global = make_subproblem(customers, vehicles, cluster_nodes[a] + cluster_nodes[b],
+                                                            vehicle_idxs)
+            global_to_local = {g: i for i, g in enumerate(local_to_global)}
+            initial = [[global_to_local[n] for n in routes[v]] for v in vehicle_idxs]
+            future = executor.submit(_solve_subproblem, sub_c, sub_v, penalty, pair_time_s, initial)
+            jobs.append((a, b, vehicle_idxs, local_to_global, future))
+
+        for a, b, vehicle_idxs, local_to_global, future in jobs:
+            result = future.result()
+            before = result["initial_objective"]
+            if result["objective"] is None or before is None or result["objective"] >= before:
+                continue
+            for v, route in zip(vehicle_idxs, result["routes"]):
+                routes[v] = [local_to_global[n] for n in route]
+
+            _reassign_nodes(a, b, cluster_nodes, cluster_vehicles, routes, dropped,
+                            [local_to_global[n] for n in result["dropped"]])
+            improvement += before - result["objective"]
+            print(f"🪡 Riparazione cluster {a}+{b}: {before} → {result['objective']}")
+    return improvement
@@ -1,30 +1,29 @@
 import csv
 from datetime import timedelta
 
-def export_vehicle_routes_csv(vehicle_routes, manager, routing, assignment, customers, output_path="solution.csv"):
-    capacity_dim = routing.GetDimensionOrDie("Capacity")
-    time_dim = routing.GetDimensionOrDie("Time")
+def export_vehicle_routes_csv(solution, customers, output_path="solution.csv"):
+    """Una riga per fermata (arrivo escluso) dalla CompactSolution, senza rileggere l'assignment."""
+    table = customers.customers
 
     rows = []
-    for veh_id, route in vehicle_routes.items():
-        if not route or len(route) < 2:
-            continue
-
-        for order_idx, cust in enumerate(route[:-1]):  # exclude last depot
-            index = manager.NodeToIndex(cust.index)
-            load = assignment.Value(capacity_dim.CumulVar(index))
-            tmin = str(timedelta(seconds=assignment.Min(time_dim.CumulVar(index))))
-            tmax = str(timedelta(seconds=assignment.Max(time_dim.CumulVar(index))))
-
+    for veh_id in range(solution.num_vehicles):
+        positions = solution.route_slice(veh_id)
+        route = solution.nodes[positions].tolist()[:-1]  # exclude last depot
+        loads = solution.load[positions].tolist()
+        tmins = solution.time_min[positions].tolist()
+        tmaxs = solution.time_max[positions].tolist()
+        lats, lons = table.lat[route].tolist(), table.lon[route].tolist()
+
+        for order_idx, node in enumerate(route):
             rows.append({
                 "vehicle": veh_id,
-                "customer_id": cust.index,
+                "customer_id": node,
                 "order": order_idx,
-                "load": load,
-                "arrival_min": tmin,
-                "arrival_max": tmax,
-                "lat": cust.lat,
-                "lon": cust.lon
+                "load": loads[order_idx],
+                "arrival_min": str(timedelta(seconds=tmins[order_idx])),
+                "arrival_max": str(timedelta(seconds=tmaxs[order_idx])),
+                "lat": lats[order_idx],
+                "lon": lons[order_idx]
             })
 
     with open(output_path, mode="w", newline="") as file:
@@ -0,0 +1,194 @@
+"""
+Strumentazione della pipeline: span di tempo per fase, contatori delle callback
+Python e statistiche del solver, esposti in formato testo Prometheus (senza
+dipendenze esterne) da ``/metrics``. Qui si imposta anche il livello di log
+(variabile LOG_LEVEL) che controlla le stampe riga per riga del builder.
+"""
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+PREFIX = "deliverygo_"
+
+# Limiti superiori (secondi) dei bucket degli istogrammi di durata
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# nome -> (tipo Prometheus, descrizione)
+METRICS = {
+    "phase_seconds": ("histogram", "Durata delle fasi della pipeline di ottimizzazione"),
+    "transit_callback_calls_total": ("counter", "Chiamate alle callback di transito Python"),
+    "transit_callback_seconds_total": ("counter", "Secondi spesi nelle callback di transito Python"),
+    "solves_total": ("counter", "Risoluzioni OR-Tools per esito"),
+    "solver_branches_total": ("counter", "Branch esplorati dal solver"),
+    "solver_solutions_total": ("counter", "Soluzioni trovate dal solver"),
+    "solver_last_objective": ("gauge", "Valore obiettivo dell'ultima soluzione trovata"),
+    "solution_cache_requests_total": ("counter", "Richieste /optimize per esito della cache (hit, miss, coalesced)"),
+    "solution_cache_entries": ("gauge", "Risposte memorizzate nella cache delle soluzioni"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Contatori, gauge e istogrammi in memoria, thread-safe.
+
+    I worker del SolverPool girano in altri processi: lì si usa drain() per
+    restituire quanto accumulato insieme al risultato, e il processo API lo
+    somma al proprio registro con merge().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}       # (nome, labels) -> valore di counter e gauge
+        self._histograms = {}   # (nome, labels) -> [conteggi per bucket, somma, conteggio]
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            key = (name, _key(labels))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            key = (name, _key(labels))
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0]
+            hist[0][bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def drain(self):
+        """Restituisce (serializzabile) e azzera quanto accumulato."""
+        with self._lock:
+            snapshot = {"values": self._values, "histograms": self._histograms}
+            self._values, self._histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Somma un drain() di un altro processo; i gauge prendono il valore più recente."""
+        with self._lock:
+            for key, value in snapshot["values"].items():
+                if METRICS[key[0]][0] == "gauge":
+                    self._values[key] = value
+                else:
+                    self._values[key] = self._values.get(key, 0) + value
+            for key, (buckets, total, count) in snapshot["histograms"].items():
+                hist = self._histograms.setdefault(key, [[0] * (len(DURATION_BUCKETS) + 1), 0.0, 0])
+                hist[0] = [a + b for a, b in zip(hist[0], buckets)]
+                hist[1] += total
+                hist[2] += count
+
+    def render(self):
+        """Testo nel formato di esposizione Prometheus (versione 0.0.4)."""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            if kind == "histogram":
+                for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(list(DURATION_BUCKETS) + ["+Inf"], buckets):
+                        cumulative += n
+                        lines.append(f"{full}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full}_sum{fmt(labels)} {total}")
+                    lines.append(f"{full}_count{fmt(labels)} {count}")
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{full}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Registro del processo
+REGISTRY = MetricsRegistry()
+
+
+@contextlib.contextmanager
+def span(phase, registry=None):
+    """Misura la durata di una fase della pipeline (istogramma phase_seconds{phase=...})."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        (registry or REGISTRY).observe("phase_seconds", elapsed, phase=phase)
+        logger.debug("span phase=%s seconds=%.6f", phase, elapsed)
+
+
+class CallbackStats:
+    """
+    Conteggio e tempo delle callback di transito Python. Nel percorso caldo si
+    aggiornano solo dizionari locali (le callback girano nel thread del solver);
+    flush() li pubblica nel registro a fine risoluzione.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def wrap(self, name, fn):
+        calls, seconds = self.calls, self.seconds
+        calls.setdefault(name, 0)
+        seconds.setdefault(name, 0.0)
+        clock = time.perf_counter
+
+        def wrapped(*args):
+            start = clock()
+            try:
+                return fn(*args)
+            finally:
+                calls[name] += 1
+                seconds[name] += clock() - start
+
+        return wrapped
+
+    def flush(self, registry=None):
+        registry = registry or REGISTRY
+        for name in self.calls:
+            if self.calls[name]:
+                registry.inc("transit_callback_calls_total", self.calls[name], callback=name)
+                registry.inc("transit_callback_seconds_total", self.seconds[name], callback=name)
+            self.calls[name], self.seconds[name] = 0, 0.0
+
+
+def record_solver_stats(routing, assignment, registry=None):
+    """Branch, soluzioni e obiettivo finale di una risoluzione appena conclusa."""
+    registry = registry or REGISTRY
+    solver = routing.solver()
+    registry.inc("solves_total", status="found" if assignment else "not_found")
+    registry.inc("solver_branches_total", solver.Branches())
+    registry.inc("solver_solutions_total", solver.Solutions())
+    if assignment:
+        registry.set("solver_last_objective", assignment.ObjectiveValue())
+
+
+def configure_logging():
+    """LOG_LEVEL (default INFO): con DEBUG tornano le stampe per nodo e per coppia PDP del builder."""
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("solver").setLevel(level)
@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from solver.instrumentation import REGISTRY
+from solver.routing_model_builder import RoutingModelBuilder
+
+# (first_solution_strategy, local_search_metaheuristic) provate in parallelo
+DEFAULT_PORTFOLIO = [
+    ("PATH_CHEAPEST_ARC", None),
+    ("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    ("PARALLEL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    ("LOCAL_CHEAPEST_INSERTION", "SIMULATED_ANNEALING"),
+    ("PATH_MOST_CONSTRAINED_ARC", "TABU_SEARCH"),
+]
+
+
+def _warmup():
+    # Importa in anticipo ciò che serve per deserializzare customers/vehicles
+    import models.Customers  # noqa: F401
+    import models.Vehicles  # noqa: F401
+    return os.getpid()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_portfolio_executor():
+    """
+    Pool di processi condiviso da tutte le risoluzioni portfolio del processo, avviato
+    alla prima chiamata (fuori dal budget di tempo della ricerca) e poi riusato.
+    Se un worker muore il pool viene scartato (vedi _discard_executor) e ricreato qui.
+    PORTFOLIO_WORKERS: numero di processi (default min(strategie, core)); con 0 restituisce
+    None e le strategie girano una dopo l'altra nel processo chiamante.
+    """
+    global _executor
+    workers = int(os.getenv("PORTFOLIO_WORKERS", str(min(len(DEFAULT_PORTFOLIO), os.cpu_count() or 1))))
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            for future in [_executor.submit(_warmup) for _ in range(workers)]:
+                future.result()
+        return _executor
+
+
+def _discard_executor(executor):
+    """Scarta un pool rotto (BrokenProcessPool): la prossima get_portfolio_executor ne crea uno nuovo."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_all(executor, customers, vehicles, penalty, strategies, deadline, solution_limit):
+    return [executor.submit(_solve_strategy, customers, vehicles, penalty, strategy, metaheuristic, deadline,
+                            solution_limit)
+            for strategy, metaheuristic in strategies]
+
+
+def _solve_strategy(customers, vehicles, penalty, strategy, metaheuristic, deadline, solution_limit=None):
+    """
+    Eseguita in un processo separato: costruisce il modello e risolve con una strategia
+    tramite RoutingModelBuilder.solve (warm start e statistiche del solver compresi).
+    Le metriche del processo tornano in "metrics", da sommare nel chiamante.
+    """
+    stats = {"strategy": strategy, "metaheuristic": metaheuristic, "objective": None,
+             "seconds": 0.0, "routes": None}
+
+    remaining_ms = int((deadline - time.time()) * 1000)
+    if remaining_ms <= 0:
+        return stats
+
+    builder = RoutingModelBuilder(customers, vehicles, penalty=penalty, use_transit_matrices=True)
+    builder.get_model()
+    parameters = builder.get_default_parameters(strategy, metaheuristic, time_limit_s=remaining_ms / 1000,
+                                                solution_limit=solution_limit)
+
+    start = time.perf_counter()
+    assignment = builder.solve(parameters)
+    stats["seconds"] = time.perf_counter() - start
+
+    if assignment:
+        stats["objective"] = assignment.ObjectiveValue()
+        # Rotte come liste di indici OR-Tools senza start/end (stabili tra processi:
+        # il manager è costruito in modo deterministico dagli stessi dati)
+        stats["routes"] = builder.get_index_routes(assignment)
+    stats["metrics"] = REGISTRY.drain()
+    return stats
+
+
+def _solve_sequential(customers, vehicles, penalty, strategies, time_limit_s, solution_limit):
+    # Senza pool: ogni strategia ha la sua parte del tempo che resta, così l'ultima
+    # non parte a budget esaurito
+    results = []
+    deadline = time.time() + time_limit_s
+    for i, (strategy, metaheuristic) in enumerate(strategies):
+        share = (deadline - time.time()) / (len(strategies) - i)
+        try:
+            result = _solve_strategy(customers, vehicles, penalty, strategy, metaheuristic, time.time() + share,
+                                     solution_limit)
+        except Exception as e:
+            print(f"❌ Strategia {strategy} / {metaheuristic} fallita: {e}")
+            result = {"strategy": strategy, "metaheuristic": metaheuristic, "objective": None,
+                      "seconds": 0.0, "routes": None, "error": str(e)}
+        results.append(result)
+    return results
+
+
+def _solve_parallel(executor, shared, customers, vehicles, penalty, strategies, time_limit_s, solution_limit):
+    deadline = time.time() + time_limit_s
+    try:
+        futures = _submit_all(executor, customers, vehicles, penalty, strategies, deadline, solution_limit)
+    except BrokenProcessPool:
+        # un worker è morto durante una richiesta precedente
+        if not shared:
+            raise
+        _discard_executor(executor)
+        print("⚠️ Pool del portfolio non più utilizzabile, si ricrea")
+        executor = get_portfolio_executor()
+        deadline = time.time() + time_limit_s  # l'avvio del pool non consuma il budget
+        futures = _submit_all(executor, customers, vehicles, penalty, strategies, deadline, solution_limit)
+
+    results = []
+    broken = False
+    for (strategy, metaheuristic), future in zip(strategies, futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            broken = broken or isinstance(e, BrokenProcessPool)
+            print(f"❌ Strategia {strategy} / {metaheuristic} fallita: {e}")
+            result = {"strategy": strategy, "metaheuristic": metaheuristic, "objective": None,
+                      "seconds": 0.0, "routes": None, "error": str(e)}
+        results.append(result)
+    if broken and shared:
+        _discard_executor(executor)
+    return results
+
+
+def solve_portfolio(customers, vehicles, strategies=None, time_limit_s=10, penalty=9999999,
+                    executor=None, solution_limit=None):
+    """
+    Risolve lo stesso problema con più strategie in processi paralleli, entro
+    un'unica scadenza, e tiene la soluzione con obiettivo minore. Una strategia che
+    fallisce (eccezione o worker terminato) compare nelle statistiche con "error"
+    e non impedisce di usare le altre. Un pool condiviso rotto viene ricreato: se
+    era già rotto prima della richiesta, le strategie ripartono sul pool nuovo.
+    Con PORTFOLIO_WORKERS=0 (e sempre nei worker del SolverPool) le strategie girano in
+    sequenza nel processo chiamante, dividendosi il tempo.
+
+    Args:
+        customers, vehicles: problema già preparato (depot, coppie PDP, matrici)
+        strategies: lista di (first_solution_strategy, local_search_metaheuristic)
+        time_limit_s (float): tempo totale a disposizione di tutte le strategie
+        executor (ProcessPoolExecutor, optional): pool da usare, default get_portfolio_executor()
+            (None se PORTFOLIO_WORKERS=0: risoluzione in sequenza)
+        solution_limit (int, optional): soluzioni massime per ciascuna strategia
+
+    Returns:
+        (manager, routing, assignment, stats): modello ricostruito nel processo chiamante
+        con la soluzione migliore (assignment None se nessuna strategia ha trovato
+        soluzioni) e le statistiche obiettivo/tempo di ogni strategia
+    """
+    strategies = strategies or DEFAULT_PORTFOLIO
+    shared = executor is None or executor is _executor
+    executor = executor or get_portfolio_executor()
+
+    # La matrice viene calcolata una volta qui e spedita ai worker con customers
+    customers.make_distance_mat()
+
+    if executor is None:
+        results = _solve_sequential(customers, vehicles, penalty, strategies, time_limit_s, solution_limit)
+    else:
+        results = _solve_parallel(executor, shared, customers, vehicles, penalty, strategies, time_limit_s,
+                                  solution_limit)
+    for result in results:
+        if "metrics" in result:
+            REGISTRY.merge(result.pop("metrics"))
+
+    solved = [r for r in results if r["objective"] is not None]
+    best = min(solved, key=lambda r: r["objective"]) if solved else None
+
+    stats = [{k: v for k, v in r.items() if k != "routes"} for r in results]
+    for s in stats:
+        s["best"] = best is not None and s["strategy"] == best["strategy"] \
+            and s["metaheuristic"] == best["metaheuristic"]
+
+    builder = RoutingModelBuilder(customers, vehicles, penalty=penalty, use_transit_matrices=True)
+    manager, routing = builder.get_model()
+    if best is None:
+        return manager, routing, None, stats
+
+    print(f"🏆 Strategia migliore: {best['strategy']} / {best['metaheuristic']} → {best['objective']}")
+    assignment = builder.restore_routes(best["routes"])
+    return manager, routing, assignment, stats
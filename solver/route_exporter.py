@@ -1,58 +1,158 @@
 import os
 import requests
 import json
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """
+    Rate limiter a token bucket: al massimo ``rate_per_s`` richieste al secondo
+    in media, con raffiche fino a ``burst`` richieste. Thread-safe.
+    """
+
+    def __init__(self, rate_per_s=10.0, burst=None):
+        self.rate_per_s = float(rate_per_s)
+        self.capacity = float(burst if burst is not None else max(1.0, rate_per_s))
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate_per_s <= 0:
+            return  # nessun limite
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate_per_s)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate_per_s
+            time.sleep(wait)
+
 
 class RouteExporter:
-    def __init__(self, route, vehicle_ids=None, profile="car"):
+    def __init__(self, route, vehicle_ids=None, profile="car", max_workers=8, rate_limit_per_s=10.0, burst=None,
+                 segment_cache=None):
+        """
+        Args:
+            route: lista di punti prodotta da build_route_for_export
+            vehicle_ids: ID reali dei veicoli, indicizzati per indice veicolo
+            profile (str): profilo GraphHopper
+            max_workers (int): richieste /route concorrenti
+            rate_limit_per_s (float): richieste al secondo verso GraphHopper (0 = nessun limite)
+            burst (int, optional): raffica massima del rate limiter, default = rate_limit_per_s
+            segment_cache (SegmentCache, optional): cache delle tratte già scaricate
+
+        La sessione HTTP resta aperta fino a close(); in alternativa si usa come
+        context manager (``with RouteExporter(...) as exporter``).
+        """
         self.route = route
         self.vehicle_ids = vehicle_ids or []  # 👈 lista di targhe o ID reali
         self.profile = profile
         self.routes_data = []
-
-    def fetch_routes(self):
-        headers = {"Content-Type": "application/json"}
-
-        GH_BASE = os.getenv("GRAPHHOPPER_URL", "http://localhost:8989")  # default per test locale
-        ROUTE_URL = f"{GH_BASE}/route"
-
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(rate_limit_per_s, burst)
+        self.segment_cache = segment_cache
+
+        # Sessione keep-alive condivisa dai thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """Chiude le connessioni keep-alive verso GraphHopper."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def build_legs(self):
+        """
+        Coppie (start, end) consecutive dello stesso veicolo, nell'ordine della route.
+        I veicoli senza fermate (solo partenza e arrivo) non generano tratte.
+        """
+        points_per_vehicle = Counter(point["vehicleId"] for point in self.route)
+        legs = []
         for i in range(len(self.route) - 1):
             start = self.route[i]
             end = self.route[i + 1]
+            # niente tratte fittizie tra l'ultimo nodo di un veicolo e il primo del successivo
+            if start["vehicleId"] != end["vehicleId"]:
+                continue
+            if points_per_vehicle[start["vehicleId"]] <= 2:
+                continue
+            legs.append((start, end))
+        return legs
+
+    def _fetch_leg(self, route_url, start, end):
+        headers = {"Content-Type": "application/json"}
+        params = {
+            "point": [f"{start['lat']},{start['lon']}", f"{end['lat']},{end['lon']}"],
+            "profile": self.profile,
+            "locale": "it",
+            "points_encoded": "false",
+            "instructions": "false"
+        }
 
-            params = {
-                "point": [f"{start['lat']},{start['lon']}", f"{end['lat']},{end['lon']}"],
-                "profile": self.profile,
-                "locale": "it",
-                "points_encoded": "false",
-                "instructions": "false"
-            }
+        try:
+            cache_key = None
+            leg = None
+            if self.segment_cache is not None:
+                cache_key = self.segment_cache.make_key(start, end, self.profile)
+                leg = self.segment_cache.get(cache_key)
 
-            try:
-                resp = requests.get(ROUTE_URL, params=params, headers=headers, timeout=10)
+            if leg is None:
+                self.rate_limiter.acquire()
+                resp = self.session.get(route_url, params=params, headers=headers, timeout=10)
                 resp.raise_for_status()
                 data = resp.json()
 
                 path = data["paths"][0]
-                geometry = path["points"]["coordinates"]
-                distance_m = path["distance"]
-                time_s = int(path["time"] / 1000)
-
-                segment = {
-                    "fromNodeIndex": start["index"],
-                    "toNodeIndex": end["index"],
-                    "fromLabel": start["label"],
-                    "toLabel": end["label"],
-                    "geometry": geometry,
-                    "distanceM": distance_m,
-                    "timeS": time_s,
-                    "vehicleId": self.vehicle_ids[start["vehicleId"]] if self.vehicle_ids else start["vehicleId"]
+                leg = {
+                    "geometry": path["points"]["coordinates"],
+                    "distanceM": path["distance"],
+                    "timeS": int(path["time"] / 1000)
                 }
-                self.routes_data.append(segment)
-                time.sleep(0.2)
+                if cache_key is not None:
+                    self.segment_cache.put(cache_key, leg)
+
+            return {
+                "fromNodeIndex": start["index"],
+                "toNodeIndex": end["index"],
+                "fromLabel": start["label"],
+                "toLabel": end["label"],
+                "geometry": leg["geometry"],
+                "distanceM": leg["distanceM"],
+                "timeS": leg["timeS"],
+                "vehicleId": self.vehicle_ids[start["vehicleId"]] if self.vehicle_ids else start["vehicleId"]
+            }
+
+        except Exception as e:
+            print(f"❌ Errore nel calcolo della rotta {start['index']} → {end['index']}: {e}")
+            return None
 
-            except Exception as e:
-                print(f"❌ Errore nel calcolo della rotta {start['index']} → {end['index']}: {e}")
+    def fetch_routes(self):
+        GH_BASE = os.getenv("GRAPHHOPPER_URL", "http://localhost:8989")  # default per test locale
+        ROUTE_URL = f"{GH_BASE}/route"
+
+        legs = self.build_legs()
+        if not legs:
+            return
+
+        # pool.map mantiene l'ordine delle tratte: routes_data resta deterministico
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            segments = pool.map(lambda leg: self._fetch_leg(ROUTE_URL, *leg), legs)
+            self.routes_data.extend(seg for seg in segments if seg is not None)
 
     def export_json(self, filepath="routes.json"):
         with open(filepath, "w") as f:
@@ -153,27 +253,29 @@ class RouteExporter:
         print(f"✅ Mappa salvata in: {save_path}")
 
 
-def build_route_for_export(vehicle_routes, customers):
+def build_route_for_export(solution, customers):
+    """Punti delle rotte (CompactSolution) con etichetta Pickup/Delivery/Depot, nell'ordine di visita."""
     route = []
     pdp_pairs = getattr(customers, "pdp_pairs", [])
+    pickups = {p for p, _ in pdp_pairs}
+    deliveries = {d for _, d in pdp_pairs}
+    table = customers.customers
 
-    for vehicle_id, cust_list in vehicle_routes.items():
-        for cust in cust_list:
+    for vehicle_id in range(solution.num_vehicles):
+        nodes = solution.route(vehicle_id)
+        for node, lat, lon in zip(nodes.tolist(), table.lat[nodes].tolist(), table.lon[nodes].tolist()):
             label = "Depot"
-            if any(cust.index == p for p, _ in pdp_pairs):
+            if node in pickups:
                 label = "Pickup"
-            elif any(cust.index == d for _, d in pdp_pairs):
+            elif node in deliveries:
                 label = "Delivery"
 
             route.append({
                 "vehicleId": vehicle_id,
-                "index": cust.index,
-                "lat": cust.lat,
-                "lon": cust.lon,
+                "index": node,
+                "lat": lat,
+                "lon": lon,
                 "label": label
             })
 
     return route
-
-
-
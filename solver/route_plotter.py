@@ -1,8 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
+
+# matplotlib viene importato solo quando si disegna: l'API non ne ha bisogno
+
 
 def discrete_cmap(N, base_cmap='tab10'):
+    import matplotlib.pyplot as plt
+    import matplotlib.colors as mcolors
+
     base = plt.cm.get_cmap(base_cmap)
     color_list = base(np.linspace(0, 1, N))
     return mcolors.ListedColormap(color_list, name=f'{base.name}_{N}')
@@ -21,7 +25,10 @@ class RoutePlotter:
                 self.pickup_nodes.add(p)
                 self.delivery_nodes.add(d)
 
-    def plot(self, vehicle_routes, save_path=None, plot_annotations=True):
+    def plot(self, solution, save_path=None, plot_annotations=True):
+        """Disegna le rotte di una CompactSolution."""
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(figsize=(10, 8))
         ax.set_title("Vehicle Routes (PDP)")
         ax.set_xlabel("Longitude")
@@ -30,14 +37,12 @@ class RoutePlotter:
 
         cmap = discrete_cmap(self.vehicles.number + 1)
 
-        for veh_id, route in vehicle_routes.items():
-            if not route or len(route) < 2:
-                continue
-
+        table = self.customers.customers
+        for veh_id in range(solution.num_vehicles):
+            nodes = solution.route(veh_id)
             color = cmap(veh_id % 10)
-            lats, lons = zip(*[(c.lat, c.lon) for c in route])
-            lats = np.array(lats)
-            lons = np.array(lons)
+            lats = table.lat[nodes]
+            lons = table.lon[nodes]
 
             # Frecce tra i nodi
             ax.quiver(lons[:-1], lats[:-1],
@@ -45,26 +50,26 @@ class RoutePlotter:
                       scale_units='xy', angles='xy', scale=1,
                       color=color, width=0.003, alpha=0.8)
 
-            for cust in route:
+            for node, lat, lon in zip(nodes.tolist(), lats.tolist(), lons.tolist()):
                 shape = 'o'
                 msize = 6
                 mcolor = color
 
-                if cust.index in self.pickup_nodes:
+                if node in self.pickup_nodes:
                     shape = '^'  # triangolo
                     mcolor = 'blue'
-                elif cust.index in self.delivery_nodes:
+                elif node in self.delivery_nodes:
                     shape = 'D'  # diamante
                     mcolor = 'red'
 
-                ax.plot(cust.lon, cust.lat, marker=shape, color=mcolor,
+                ax.plot(lon, lat, marker=shape, color=mcolor,
                         markersize=msize, markeredgecolor='black')
 
                 if plot_annotations:
-                    label = f"{'P' if cust.index in self.pickup_nodes else 'D' if cust.index in self.delivery_nodes else ''}@{cust.index}"
+                    label = f"{'P' if node in self.pickup_nodes else 'D' if node in self.delivery_nodes else ''}@{node}"
                     if label:
                         ax.annotate(label,
-                                    xy=(cust.lon, cust.lat),
+                                    xy=(lon, lat),
                                     xytext=(5, 5),
                                     textcoords='offset points',
                                     fontsize=7,
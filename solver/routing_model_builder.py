@@ -1,14 +1,36 @@
-from datetime import timedelta
+import logging
 
+import numpy as np
 from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
 
+from models.compact_matrix import INT32_MAX, METRES_PER_KM
+from solver.instrumentation import CallbackStats, record_solver_stats, span
+
+logger = logging.getLogger(__name__)
+
 
 class RoutingModelBuilder:
-    def __init__(self, customers, vehicles, penalty=9999999):
+    def __init__(self, customers, vehicles, penalty=9999999, use_transit_matrices=False, matrix_cache=None,
+                 matrix_builder=None, droppable_pairs=False, knn_k=None):
         self.customers = customers
         self.vehicles = vehicles
         self.penalty = penalty
+        # True: distanze, domande e tempi precalcolati e registrati come matrici/vettori
+        # nativi, così la ricerca locale non richiama mai l'interprete Python
+        self.use_transit_matrices = use_transit_matrices
+        # Cache su disco opzionale (MatrixCache) per non ricalcolare le matrici
+        self.matrix_cache = matrix_cache
+        # IncrementalMatrixBuilder opzionale: riusa la matrice della richiesta precedente
+        self.matrix_builder = matrix_builder
+        # True: anche le coppie PDP si possono scartare (con penalità), invece di rendere
+        # il problema inammissibile quando la flotta non basta
+        self.droppable_pairs = droppable_pairs
+        # k per il grafo dei candidati: ogni nodo può proseguire solo verso i suoi k vicini
+        # più prossimi (più depot e delivery della propria coppia); None = grafo completo
+        self.knn_k = knn_k
+        # chiamate e tempo delle callback Python, pubblicati in /metrics dopo solve()
+        self.callback_stats = CallbackStats()
 
         # 1. Manager
         self.manager = pywrapcp.RoutingIndexManager(
@@ -19,37 +41,50 @@ class RoutingModelBuilder:
         )
         customers.set_manager(self.manager)
         #customers.make_real_distance_time_matrix()
-        customers.make_distance_mat(method='haversine')
+        with span("matrix"):
+            if self.matrix_builder is not None:
+                self.matrix_builder.build(customers)
+            else:
+                customers.make_distance_mat(method='haversine', cache=self.matrix_cache)
 
-        # 2. Modello
-        self.model_params = pywrapcp.DefaultRoutingModelParameters()
-        self.routing = pywrapcp.RoutingModel(self.manager, self.model_params)
+        with span("model"):
+            # 2. Modello
+            self.model_params = pywrapcp.DefaultRoutingModelParameters()
+            self.routing = pywrapcp.RoutingModel(self.manager, self.model_params)
 
-        # 3. Callback e vincoli
-        self._register_callbacks()
-        self._set_costs()
-        self._add_capacity_dimension()
-        self._add_time_dimension()
-        self._add_disjunctions()
-        self._add_pickup_delivery_constraints()
+            # 3. Callback e vincoli
+            if self.use_transit_matrices:
+                self._register_transit_matrices()
+            else:
+                self._register_callbacks()
+            self._set_costs()
+            self._add_capacity_dimension()
+            self._add_time_dimension()
+            self._add_disjunctions()
+            self._add_pickup_delivery_constraints()
+            self._add_pinned_nodes()
+            if self.knn_k is not None:
+                self._restrict_to_neighbours()
 
     def _register_callbacks(self):
         print("🔧 Registrazione callback...")
 
         # distanza
         self.dist_fn_index = self.routing.RegisterTransitCallback(
-            self.customers.return_dist_callback()
+            self.callback_stats.wrap("distance", self.customers.return_dist_callback())
         )
 
         # domanda
         self.demand_fn_index = self.routing.RegisterUnaryTransitCallback(
-            self.customers.return_dem_callback()
+            self.callback_stats.wrap("demand", self.customers.return_dem_callback())
         )
 
         # tempo = transito + servizio
         service_time_fn = self.customers.make_service_time_call_callback()
         transit_time_fn = self.customers.make_transit_time_callback()
 
+        live_starts = getattr(self.customers, 'live_start_nodes', set())
+
         # FIX: usa closure corretta senza 'self' nel signature
         def total_time_fn(from_index, to_index):
             try:
@@ -58,15 +93,19 @@ class RoutingModelBuilder:
                         from_index >= self.routing.Size() or to_index >= self.routing.Size():
                     return 0
 
-                if self.routing.IsStart(from_index) or self.routing.IsEnd(to_index):
+                if self.routing.IsEnd(to_index):
                     return 0
 
                 from_node = self.manager.IndexToNode(from_index)
                 to_node = self.manager.IndexToNode(to_index)
 
-                service = self.customers.customers[from_node].demand * self.customers.service_time_per_dem
                 speed = getattr(self.vehicles, "speed_kmph", 30)  # valore di fallback
-                travel = self.customers.distmat[from_node][to_node] / (speed / 3600)
+                travel = self.customers.distmat.get(from_node, to_node) / (speed * METRES_PER_KM / 3600)
+                if self.routing.IsStart(from_index):
+                    # da una posizione live si viaggia davvero (senza servizio), dal depot no
+                    return int(travel) if from_node in live_starts else 0
+
+                service = int(self.customers.customers.demand[from_node]) * self.customers.service_time_per_dem
                 return int(service + travel)
             except Exception as e:
                 print(f"❌ Errore nella total_time_fn: {e}")
@@ -74,12 +113,50 @@ class RoutingModelBuilder:
                 traceback.print_exc()
                 return 0
 
-        self.time_fn_index = self.routing.RegisterTransitCallback(total_time_fn)
+        self.time_fn_index = self.routing.RegisterTransitCallback(
+            self.callback_stats.wrap("time", total_time_fn)
+        )
+
+    def _register_transit_matrices(self):
+        print("🔧 Registrazione matrici di transito...")
+
+        self.dist_fn_index = self.routing.RegisterTransitMatrix(
+            self.customers.make_distance_transit_matrix().tolist()
+        )
+        self.demand_fn_index = self.routing.RegisterUnaryTransitVector(
+            self.customers.make_demand_vector().tolist()
+        )
+        self.time_fn_index = self.routing.RegisterTransitMatrix(
+            self.make_time_matrix().tolist()
+        )
+
+    def make_time_matrix(self):
+        """
+        Matrice intera servizio + viaggio con gli stessi valori di total_time_fn:
+        zero in uscita dai nodi di partenza e in ingresso ai nodi di arrivo; dalle
+        partenze live (posizione attuale del veicolo) conta il solo viaggio.
+        """
+        distmat = self.customers.distmat.to_dense()
+        service = self.customers.make_demand_vector() * self.customers.service_time_per_dem
+        speed = getattr(self.vehicles, "speed_kmph", 30)  # valore di fallback
+
+        travel = distmat / (speed * METRES_PER_KM / 3600)  # metri / (m/s)
+        time_matrix = np.trunc(service[:, None] + travel).astype(np.int64)
+
+        # Un nodo start/end è solo partenza (righe) o solo arrivo (colonne) per OR-Tools
+        time_matrix[list(set(self.vehicles.starts)), :] = 0
+        live_starts = sorted(getattr(self.customers, 'live_start_nodes', set()))
+        if live_starts:
+            time_matrix[live_starts, :] = np.trunc(travel[live_starts, :])
+        time_matrix[:, list(set(self.vehicles.ends))] = 0
+        return time_matrix
 
     def _set_costs(self):
+        # Gli archi costano in metri: costi fissi e penalità, espressi in km come prima,
+        # vengono scalati per mantenere lo stesso compromesso
         self.routing.SetArcCostEvaluatorOfAllVehicles(self.dist_fn_index)
         for v in self.vehicles.vehicles:
-            self.routing.SetFixedCostOfVehicle(int(v.cost), int(v.index))
+            self.routing.SetFixedCostOfVehicle(int(v.cost) * METRES_PER_KM, int(v.index))
 
     def _add_capacity_dimension(self):
         self.routing.AddDimensionWithVehicleCapacity(
@@ -94,32 +171,35 @@ class RoutingModelBuilder:
         if not hasattr(self, "time_fn_index"):
             raise RuntimeError("❌ time_fn_index non definito! Callback 'total_time_fn' mancante.")
 
+        # Ripianificazione: i veicoli partono all'istante attuale, non da zero
+        start_time_s = getattr(self.customers, 'start_time_s', None)
         self.routing.AddDimension(
             self.time_fn_index,
             self.customers.time_horizon,
             self.customers.time_horizon,
-            True,
+            start_time_s is None,
             "Time"
         )
 
         time_dimension = self.routing.GetDimensionOrDie("Time")
-        for cust in self.customers.customers:
-            if cust.tw_open is None or cust.tw_close is None:
-                continue
-
-            index = self.manager.NodeToIndex(cust.index)
-
-            if isinstance(cust.tw_open, timedelta):
-                o = int(cust.tw_open.total_seconds())
-            else:
-                o = int(cust.tw_open)
-
-            if isinstance(cust.tw_close, timedelta):
-                c = int(cust.tw_close.total_seconds())
-            else:
-                c = int(cust.tw_close)
-
-            print(f"⏰ Nodo {cust.index} → finestra: {o} - {c} sec")
+        if start_time_s is not None:
+            live_starts = getattr(self.customers, 'live_start_nodes', set())
+            for v in range(self.routing.vehicles()):
+                start_var = time_dimension.CumulVar(self.routing.Start(v))
+                # in strada il veicolo è lì adesso; dal depot può anche partire più tardi
+                if self.vehicles.starts[v] in live_starts:
+                    start_var.SetValue(start_time_s)
+                else:
+                    start_var.SetMin(start_time_s)
+        table = self.customers.customers
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for node in np.flatnonzero(table.has_tw).tolist():
+            index = self.manager.NodeToIndex(node)
+            o = int(table.tw_open_s[node])
+            c = int(table.tw_close_s[node])
+
+            if debug:
+                logger.debug("⏰ Nodo %d → finestra: %d - %d sec", node, o, c)
 
             time_dimension.CumulVar(index).SetRange(o, c)
 
@@ -133,10 +213,13 @@ class RoutingModelBuilder:
         non_depot = set(range(self.customers.number))
         non_depot.difference_update(self.vehicles.starts)
         non_depot.difference_update(self.vehicles.ends)
-        non_depot.difference_update(pdp_nodes)
+        if not self.droppable_pairs:
+            non_depot.difference_update(pdp_nodes)
+        # consegne di merce già a bordo: obbligatorie
+        non_depot.difference_update(getattr(self.customers, 'pinned_nodes', {}))
 
         for c in non_depot:
-            self.routing.AddDisjunction([self.manager.NodeToIndex(c)], self.penalty)
+            self.routing.AddDisjunction([self.manager.NodeToIndex(c)], self.penalty * METRES_PER_KM)
 
     def _add_pickup_delivery_constraints(self):
         if not hasattr(self.customers, 'pdp_pairs'):
@@ -146,8 +229,10 @@ class RoutingModelBuilder:
         print("📦 Aggiunta vincoli pickup & delivery...")
         time_dimension = self.routing.GetDimensionOrDie("Time")
 
+        debug = logger.isEnabledFor(logging.DEBUG)
         for pickup, delivery in self.customers.pdp_pairs:
-            print(f"  → PDP: {pickup} → {delivery}")
+            if debug:
+                logger.debug("  → PDP: %d → %d", pickup, delivery)
             pickup_index = self.manager.NodeToIndex(pickup)
             delivery_index = self.manager.NodeToIndex(delivery)
 
@@ -159,13 +244,222 @@ class RoutingModelBuilder:
                 time_dimension.CumulVar(pickup_index) <= time_dimension.CumulVar(delivery_index)
             )
 
+    def _add_pinned_nodes(self):
+        # Nodi obbligatori che solo un veicolo può servire (es. consegne con merce già a bordo).
+        # SetAllowedVehiclesForIndex non accetta liste dal wrapper Python: si fissa VehicleVar
+        for node, vehicle_id in getattr(self.customers, 'pinned_nodes', {}).items():
+            self.routing.VehicleVar(self.manager.NodeToIndex(node)).SetValue(vehicle_id)
+
+    def make_candidate_neighbours(self):
+        """
+        Per ogni nodo, i k nodi più vicini (distmat) in entrambe le direzioni: j è candidato
+        per i se j è tra i k vicini di i oppure i tra i k vicini di j.
+
+        Con distanze haversine (matrice simmetrica) i vicini vengono dall'indice spaziale,
+        che esamina solo le celle attorno al nodo; con distanze stradali si scorre la
+        matrice una riga alla volta, senza copiarla densa.
+        """
+        distmat = self.customers.distmat
+        n = len(distmat)
+        k = min(self.knn_k, n - 1)
+        if k <= 0:
+            return [set() for _ in range(n)]
+
+        if getattr(distmat, 'symmetric', False):
+            nearest = self.customers.get_spatial_index().nearest_all(k)
+        else:
+            nearest = []
+            for i in range(n):
+                row = np.array(distmat[i], dtype=np.int64)
+                row[i] = INT32_MAX
+                nearest.append(np.argpartition(row, k - 1)[:k])
+
+        neighbours = [set(row.tolist()) for row in nearest]
+        for i, row in enumerate(nearest):
+            for j in row:
+                neighbours[j].add(i)
+        return neighbours
+
+    def _restrict_to_neighbours(self):
+        # Vieta tutti gli archi fuori dal grafo dei candidati: restano sempre gli archi
+        # da/verso i depot, pickup → delivery e il self-loop (nodo non visitato)
+        print(f"✂️ Filtro archi: {self.knn_k} vicini per nodo")
+        neighbours = self.make_candidate_neighbours()
+        depots = set(self.vehicles.starts) | set(self.vehicles.ends)
+        partner = {p: d for p, d in getattr(self.customers, 'pdp_pairs', [])}
+        ends = [self.routing.End(v) for v in range(self.vehicles.number)]
+
+        kept = 0
+        for index in range(self.routing.Size()):
+            node = self.manager.IndexToNode(index)
+            if self.routing.IsStart(index):
+                continue  # dal depot si può andare ovunque
+            allowed = set(ends)
+            allowed.add(index)
+            nodes = neighbours[node] - depots
+            if node in partner:
+                nodes.add(partner[node])
+            allowed.update(self.manager.NodeToIndex(n) for n in nodes)
+            self.routing.NextVar(index).SetValues(sorted(allowed))
+            kept += len(allowed)
+        print(f"✂️ Archi candidati: {kept} su {self.routing.Size() ** 2}")
+
     def get_model(self):
         return self.manager, self.routing
 
-    def get_default_parameters(self):
+    def make_assignment_from_routes(self, index_routes):
+        """
+        Assignment completo delle NextVar a partire da rotte espresse come indici
+        OR-Tools (uno per veicolo, senza start/end); i nodi non visitati puntano a sé stessi.
+        Funziona anche con depot condivisi, dove ReadAssignmentFromRoutes fallisce.
+        """
+        assignment = self.routing.solver().Assignment()
+        visited = set()
+        for vehicle_id, route in enumerate(index_routes):
+            prev = self.routing.Start(vehicle_id)
+            for index in list(route) + [self.routing.End(vehicle_id)]:
+                assignment.Add(self.routing.NextVar(prev))
+                assignment.SetValue(self.routing.NextVar(prev), index)
+                visited.add(index)
+                prev = index
+
+        for index in range(self.routing.Size()):
+            if not self.routing.IsStart(index) and index not in visited:
+                assignment.Add(self.routing.NextVar(index))
+                assignment.SetValue(self.routing.NextVar(index), index)
+        return assignment
+
+    def restore_routes(self, index_routes, parameters=None):
+        """Ricostruisce (senza ricerca) la soluzione completa, cumul inclusi, da rotte di indici."""
+        parameters = parameters or self.get_default_parameters()
+        parameters.solution_limit = 1
+        initial = self.make_assignment_from_routes(index_routes)
+        return self.routing.SolveFromAssignmentWithParameters(initial, parameters)
+
+    def make_initial_routes(self):
+        """
+        Rotte iniziali (indici OR-Tools per veicolo) dagli ordini già assegnati
+        (status ASSIGNED / IN_PROGRESS con assigned_vehicle_id noto). La richiesta non
+        porta la sequenza delle fermate, quindi ogni veicolo visita i propri nodi per
+        vicinanza, con pickup prima della delivery e senza superare la capacità.
+        Restituisce None se non c'è nessuna assegnazione da riusare.
+        """
+        orders = getattr(self.customers, 'orders', None)
+        if not orders:
+            return None
+
+        vehicle_by_id = {str(real_id): v for v, real_id in enumerate(self.vehicles.ids)}
+        id_to_index = self.customers.node_id_to_index
+        assigned = [[] for _ in range(self.vehicles.number)]
+        for order in orders:
+            status = getattr(order.status, 'value', order.status)
+            if status not in ("ASSIGNED", "IN_PROGRESS") or order.assigned_vehicle_id is None:
+                continue
+            vehicle_id = vehicle_by_id.get(str(order.assigned_vehicle_id))
+            if vehicle_id is None:
+                continue
+            assigned[vehicle_id].append((id_to_index[order.pickup_node_id],
+                                         id_to_index[order.delivery_node_id],
+                                         order.quantity))
+
+        if not any(assigned):
+            return None
+
+        distmat = self.customers.distmat
+        index_routes = []
+        for vehicle_id, pairs in enumerate(assigned):
+            capacity = self.vehicles.vehicles[vehicle_id].capacity
+            pending = {pickup: (delivery, quantity) for pickup, delivery, quantity in pairs}
+            on_board = {}
+            current, load, route = self.vehicles.starts[vehicle_id], 0, []
+            while pending or on_board:
+                candidates = list(on_board) + [p for p, (_, q) in pending.items() if load + q <= capacity]
+                if not candidates:
+                    # ordine più grande della capacità residua: lo si lascia al solver
+                    break
+                node = min(candidates, key=lambda n: distmat.get(current, n))
+                if node in on_board:
+                    load -= on_board.pop(node)
+                else:
+                    delivery, quantity = pending.pop(node)
+                    on_board[delivery] = quantity
+                    load += quantity
+                route.append(self.manager.NodeToIndex(node))
+                current = node
+            index_routes.append(route)
+        return index_routes
+
+    def get_index_routes(self, assignment):
+        """Rotte di una soluzione come liste di indici OR-Tools per veicolo, senza start/end."""
+        index_routes = []
+        for vehicle_id in range(self.vehicles.number):
+            index = assignment.Value(self.routing.NextVar(self.routing.Start(vehicle_id)))
+            route = []
+            while not self.routing.IsEnd(index):
+                route.append(index)
+                index = assignment.Value(self.routing.NextVar(index))
+            index_routes.append(route)
+        return index_routes
+
+    def solve(self, parameters=None):
+        """
+        Risolve partendo dal piano corrente se la richiesta contiene ordini già
+        assegnati (warm start), altrimenti da zero con la first_solution_strategy.
+
+        Il piano corrente viene bloccato come prefisso delle rotte e completato dalla
+        first_solution_strategy con gli ordini nuovi; i blocchi vengono poi rimossi e la
+        ricerca locale riparte da quella soluzione, libera di modificarla.
+        Se il piano corrente non è ammissibile si ripiega sulla risoluzione a freddo.
+        Durata, statistiche del solver e callback finiscono in /metrics.
+        """
+        parameters = parameters or self.get_default_parameters()
+        with span("solve"):
+            assignment = self._solve(parameters)
+        self.callback_stats.flush()
+        record_solver_stats(self.routing, assignment)
+        return assignment
+
+    def _solve(self, parameters):
+        index_routes = self.make_initial_routes()
+        if index_routes is None:
+            return self.routing.SolveWithParameters(parameters)
+
+        self.routing.CloseModelWithParameters(parameters)
+        initial = None
+        if self.routing.ApplyLocksToAllVehicles(index_routes, False):
+            first_parameters = pywrapcp.DefaultRoutingSearchParameters()
+            first_parameters.CopyFrom(parameters)
+            first_parameters.solution_limit = 1
+            initial = self.routing.SolveWithParameters(first_parameters)
+            # senza blocchi: la ricerca locale può spostare anche gli ordini assegnati
+            self.routing.ApplyLocksToAllVehicles([[] for _ in index_routes], False)
+
+        if not initial:
+            print("⚠️ Assegnazioni esistenti non ammissibili, risoluzione da zero")
+            return self.routing.SolveWithParameters(parameters)
+
+        print("♻️ Warm start dalle assegnazioni esistenti")
+        initial = self.make_assignment_from_routes(self.get_index_routes(initial))
+        return self.routing.SolveFromAssignmentWithParameters(initial, parameters)
+
+    def get_default_parameters(self, first_solution_strategy="PATH_CHEAPEST_ARC", local_search_metaheuristic=None,
+                               time_limit_s=10, solution_limit=None):
+        """
+        Args:
+            first_solution_strategy (str): nome di FirstSolutionStrategy (default PATH_CHEAPEST_ARC)
+            local_search_metaheuristic (str, optional): nome di LocalSearchMetaheuristic
+                (es. GUIDED_LOCAL_SEARCH); None lascia la scelta automatica di OR-Tools
+            time_limit_s (float): tempo massimo di ricerca in secondi (default 10)
+            solution_limit (int, optional): ferma la ricerca dopo questo numero di soluzioni
+        """
         parameters = pywrapcp.DefaultRoutingSearchParameters()
         parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-        parameters.time_limit.seconds = 10
+            getattr(routing_enums_pb2.FirstSolutionStrategy, first_solution_strategy))
+        if local_search_metaheuristic is not None:
+            parameters.local_search_metaheuristic = (
+                getattr(routing_enums_pb2.LocalSearchMetaheuristic, local_search_metaheuristic))
+        parameters.time_limit.FromMilliseconds(int(time_limit_s * 1000))
+        if solution_limit is not None:
+            parameters.solution_limit = solution_limit
         parameters.use_full_propagation = True
-        return parameters
\ No newline at end of file
+        return parameters
@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SegmentCache:
+    """
+    Cache a due livelli delle tratte GraphHopper (geometria, distanza, tempo).
+
+    La chiave è (from arrotondato, to arrotondato, profilo). Il primo livello è un
+    LRU in memoria, il secondo un database SQLite su disco che sopravvive ai riavvii.
+    Le voci più vecchie di ``ttl_s`` secondi vengono considerate scadute.
+
+    Il lock protegge solo il livello in memoria: ogni thread usa una propria
+    connessione SQLite (in WAL, letture concorrenti), così i thread dell'exporter non
+    si serializzano sull'I/O su disco. Ogni ``purge_every`` inserimenti si eliminano
+    dal disco le righe scadute e, oltre ``max_rows``, le più vecchie.
+
+    Args:
+        path (str, optional): file SQLite del livello su disco (None = solo memoria)
+        max_entries (int): voci massime nel livello in memoria
+        ttl_s (float): validità di una voce in secondi
+        precision (int): cifre decimali usate per arrotondare le coordinate
+        max_rows (int): righe massime nel livello su disco
+        purge_every (int): inserimenti tra due pulizie del livello su disco
+    """
+
+    def __init__(self, path=None, max_entries=10000, ttl_s=7 * 24 * 3600, precision=5, max_rows=200000,
+                 purge_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.precision = precision
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+        if path:
+            db = self._connection()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS segments (key TEXT PRIMARY KEY, stored_at REAL, data TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS segments_stored_at ON segments (stored_at)")
+            db.commit()
+
+    def _connection(self):
+        # una connessione per thread: sqlite3 non va condiviso tra thread senza un lock comune
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30)
+        return db
+
+    def make_key(self, start, end, profile):
+        p = self.precision
+        return (f"{round(start['lat'], p)},{round(start['lon'], p)}|"
+                f"{round(end['lat'], p)},{round(end['lon'], p)}|{profile}")
+
+    def _expired(self, stored_at):
+        return time.time() - stored_at > self.ttl_s
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, data = entry
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return data
+                del self._memory[key]
+
+        if self.path:
+            db = self._connection()
+            row = db.execute("SELECT stored_at, data FROM segments WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                stored_at, raw = row
+                if not self._expired(stored_at):
+                    data = json.loads(raw)
+                    with self._lock:
+                        self._remember(key, stored_at, data)
+                        self.disk_hits += 1
+                    return data
+                db.execute("DELETE FROM segments WHERE key = ?", (key,))
+                db.commit()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, data)
+            self._puts += 1
+            purge = self.purge_every > 0 and self._puts % self.purge_every == 0
+
+        if self.path:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO segments (key, stored_at, data) VALUES (?, ?, ?)",
+                (key, stored_at, json.dumps(data))
+            )
+            db.commit()
+            if purge:
+                self.purge()
+
+    def purge(self):
+        """Elimina dal disco le righe scadute e, oltre max_rows, le più vecchie."""
+        if not self.path:
+            return
+        db = self._connection()
+        db.execute("DELETE FROM segments WHERE stored_at < ?", (time.time() - self.ttl_s,))
+        excess = db.execute("SELECT COUNT(*) FROM segments").fetchone()[0] - self.max_rows
+        if excess > 0:
+            db.execute(
+                "DELETE FROM segments WHERE key IN (SELECT key FROM segments ORDER BY stored_at LIMIT ?)",
+                (excess,)
+            )
+        db.commit()
+
+    def _remember(self, key, stored_at, data):
+        self._memory[key] = (stored_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0
+            }
+
+
+_default_cache = None
+
+
+def get_default_segment_cache():
+    """
+    Cache condivisa del processo, configurata da variabili d'ambiente:
+    SEGMENT_CACHE_PATH (default ".segment_cache.sqlite", vuoto = solo memoria)
+    e SEGMENT_CACHE_TTL_S (default 7 giorni).
+    """
+    global _default_cache
+    if _default_cache is None:
+        path = os.getenv("SEGMENT_CACHE_PATH", ".segment_cache.sqlite") or None
+        ttl_s = float(os.getenv("SEGMENT_CACHE_TTL_S", str(7 * 24 * 3600)))
+        _default_cache = SegmentCache(path=path, ttl_s=ttl_s)
+    return _default_cache
@@ -1,116 +1,133 @@
 from datetime import timedelta
 
+import numpy as np
+
+from solver.compact_solution import CompactSolution, same_vehicle
+
+
 class SolutionPrinter:
-    def __init__(self, manager, routing, assignment, customers, vehicles):
+    """
+    Stampa e conversioni di una soluzione. L'assignment viene letto una volta sola,
+    alla prima richiesta, in una CompactSolution (``self.solution``) condivisa da
+    tutti i metodi e dagli export.
+
+    Args:
+        cumuls (bool): False per le soluzioni intermedie durante la ricerca, di cui
+            servono solo le rotte (get_vehicle_routes, get_solution_json)
+    """
+
+    def __init__(self, manager, routing, assignment, customers, vehicles, cumuls=True):
         self.manager = manager
         self.routing = routing
         self.assignment = assignment
         self.customers = customers
         self.vehicles = vehicles
-
-        self.capacity_dimension = routing.GetDimensionOrDie('Capacity')
-        self.time_dimension = routing.GetDimensionOrDie('Time')
+        self.cumuls = cumuls
+        self._solution = None
+
+    @classmethod
+    def from_solution(cls, solution, customers, vehicles):
+        """Printer su una CompactSolution già pronta (es. da solve_decomposed), senza modello OR-Tools."""
+        printer = cls(None, None, None, customers, vehicles)
+        printer._solution = solution
+        return printer
+
+    @property
+    def solution(self):
+        if self._solution is None:
+            self._solution = CompactSolution.from_assignment(self.manager, self.routing, self.assignment,
+                                                             self.customers, cumuls=self.cumuls)
+        return self._solution
+
+    def refresh(self):
+        """Da chiamare quando l'assignment è cambiato (es. nuova soluzione durante la ricerca)."""
+        self._solution = None
 
     def get_dropped_nodes(self):
-        dropped = []
-        for node_index in range(self.routing.Size()):
-            if self.assignment.Value(self.routing.NextVar(node_index)) == node_index:
-                dropped.append(str(self.manager.IndexToNode(node_index)))
-        return dropped
+        return [str(node) for node in self.solution.dropped.tolist()]
 
     def get_vehicle_routes(self):
-        vehicle_routes = {}
-        for vehicle_id in range(self.vehicles.number):
-            index = self.routing.Start(vehicle_id)
-            route = []
-
-            while not self.routing.IsEnd(index):
-                node = self.manager.IndexToNode(index)
-                route.append(self.customers.customers[node])
-                index = self.assignment.Value(self.routing.NextVar(index))
-
-            # Add the end node
-            end_node = self.manager.IndexToNode(index)
-            route.append(self.customers.customers[end_node])
-
-            vehicle_routes[vehicle_id] = route
-        return vehicle_routes
+        table = self.customers.customers
+        return {vehicle_id: [table[node] for node in self.solution.route(vehicle_id).tolist()]
+                for vehicle_id in range(self.solution.num_vehicles)}
 
     def print(self):
-        print(f'Objective value: {self.assignment.ObjectiveValue()}')
+        solution = self.solution
+        print(f'Objective value: {solution.objective}')
         print()
 
-        for vehicle_id in range(self.vehicles.number):
-            index = self.routing.Start(vehicle_id)
-            if self.routing.IsEnd(self.assignment.Value(self.routing.NextVar(index))):
+        for vehicle_id in range(solution.num_vehicles):
+            if solution.is_empty(vehicle_id):
                 print(f'Route for vehicle {vehicle_id}: Empty\n')
                 continue
 
+            positions = solution.route_slice(vehicle_id)
+            route = solution.nodes[positions].tolist()
+            loads = solution.load[positions].tolist()
+            tmins = solution.time_min[positions].tolist()
+            tmaxs = solution.time_max[positions].tolist()
+
             route_str = f'Route for vehicle {vehicle_id}:\n'
-            while not self.routing.IsEnd(index):
-                node = self.manager.IndexToNode(index)
-                load = self.assignment.Value(self.capacity_dimension.CumulVar(index))
-                time_var = self.time_dimension.CumulVar(index)
-                tmin = timedelta(seconds=self.assignment.Min(time_var))
-                tmax = timedelta(seconds=self.assignment.Max(time_var))
-
-                route_str += f' {node} Load({load}) Time({tmin}, {tmax}) ->'
-                index = self.assignment.Value(self.routing.NextVar(index))
-
-            end_node = self.manager.IndexToNode(index)
-            route_str += f' {end_node} End\n'
+            for node, load, tmin, tmax in zip(route[:-1], loads, tmins, tmaxs):
+                route_str += f' {node} Load({load}) Time({timedelta(seconds=tmin)}, {timedelta(seconds=tmax)}) ->'
+            route_str += f' {route[-1]} End\n'
             print(route_str)
 
         dropped = self.get_dropped_nodes()
         print(f'Dropped nodes: {", ".join(dropped)}')
 
     def get_solution_json(self):
-        vehicle_routes = self.get_vehicle_routes()
-        solution = {"path": [], "assignedOrders": []}
-
-        # Mappa ID nodo (stringa) → index interno (int)
+        solution = self.solution
+        table = self.customers.customers
         id_to_index = self.customers.node_id_to_index
-
-
-        # Mappatura da coppia (pickup_idx, delivery_idx) → order_id
-        node_to_order = {}
-        for order in self.customers.orders:
-            pickup_idx = id_to_index[order.pickup_node_id]
-            delivery_idx = id_to_index[order.delivery_node_id]
-            node_to_order[(pickup_idx, delivery_idx)] = {
-                "order_id": order.id,
-                "pickup_id": pickup_idx,
-                "delivery_id": delivery_idx
-            }
-
-        for vehicle_id, route in vehicle_routes.items():
+        solution_json = {"path": [], "assignedOrders": []}
+
+        # Veicolo di ogni ordine: pickup e delivery sulla stessa rotta
+        orders = self.customers.orders
+        if orders:
+            pickups = np.array([id_to_index[order.pickup_node_id] for order in orders], dtype=np.int64)
+            deliveries = np.array([id_to_index[order.delivery_node_id] for order in orders], dtype=np.int64)
+            order_vehicle = same_vehicle(solution.node_vehicle, pickups, deliveries).tolist()
+        else:
+            pickups = deliveries = np.empty(0, dtype=np.int64)
+            order_vehicle = []
+        by_vehicle = [[] for _ in range(solution.num_vehicles)]
+        for i, vehicle_id in enumerate(order_vehicle):
+            if vehicle_id >= 0:
+                by_vehicle[vehicle_id].append(i)
+
+        # Ordini con merce già a bordo: conta solo la consegna
+        onboard_by_vehicle = [[] for _ in range(solution.num_vehicles)]
+        for order in getattr(self.customers, 'onboard_orders', []):
+            vehicle_id = int(solution.node_vehicle[id_to_index[order.delivery_node_id]])
+            if vehicle_id >= 0:
+                onboard_by_vehicle[vehicle_id].append(order)
+
+        pickups, deliveries = pickups.tolist(), deliveries.tolist()
+        for vehicle_id in range(solution.num_vehicles):
             real_id = self.vehicles.ids[vehicle_id]
-            stops = []
-
-            for node in route:
-                stops.append({
-                    "nodeIndex": node.index,
-                    "lat": node.lat,
-                    "lon": node.lon
+            route = solution.route(vehicle_id)
+            lats, lons = table.lat[route].tolist(), table.lon[route].tolist()
+
+            for i in by_vehicle[vehicle_id]:
+                solution_json["assignedOrders"].append({
+                    "orderId": orders[i].id,
+                    "pickupNodeId": self.customers.index_to_node_id[pickups[i]],
+                    "deliveryNodeId": self.customers.index_to_node_id[deliveries[i]],
+                    "assignedVehicleId": real_id
+                })
+            for order in onboard_by_vehicle[vehicle_id]:
+                solution_json["assignedOrders"].append({
+                    "orderId": order.id,
+                    "pickupNodeId": order.pickup_node_id,
+                    "deliveryNodeId": order.delivery_node_id,
+                    "assignedVehicleId": real_id
                 })
 
-            # Verifica quali ordini sono stati rispettati da questo veicolo
-            indices = [n.index for n in route]
-            for pickup, delivery in self.customers.pdp_pairs:
-                if pickup in indices and delivery in indices:
-                    entry = node_to_order.get((pickup, delivery))
-                    if entry:
-                        solution["assignedOrders"].append({
-                            "orderId": entry["order_id"],
-                            "pickupNodeId": self.customers.index_to_node_id[entry["pickup_id"]],
-                            "deliveryNodeId": self.customers.index_to_node_id[entry["delivery_id"]],
-                            "assignedVehicleId": real_id
-                        })
-
-            solution["path"].append({
+            solution_json["path"].append({
                 "vehicleId": real_id,
-                "route": stops
+                "route": [{"nodeIndex": node, "lat": lat, "lon": lon}
+                          for node, lat, lon in zip(route.tolist(), lats, lons)]
             })
 
-        return solution
-
+        return solution_json
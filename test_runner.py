@@ -5,12 +5,19 @@ from solver.solution_printer import SolutionPrinter
 from solver.route_plotter import RoutePlotter
 from solver.export_solution import export_vehicle_routes_csv, export_dropped_nodes_csv
 from solver.pdp_validator import validate_pdp
+from solver.instrumentation import configure_logging
 from datetime import datetime
 import os
 
-def run_test(test_id, num_stops=30, num_pairs=5, box_size=10, min_qty=5, max_qty=15, penalty=1_000_000):
+import numpy as np
+
+def run_test(test_id, num_stops=30, num_pairs=5, box_size=10, min_qty=5, max_qty=15, penalty=1_000_000, seed=None):
     print(f"\n🔍 TEST #{test_id}: {num_stops} clienti, {num_pairs} PDP richieste")
 
+    # seed opzionale per rigenerare la stessa istanza (vedi anche benchmarks/bench_suite.py)
+    if seed is not None:
+        np.random.seed(seed)
+
     # 1. Clienti
     customers = Customers(
         num_stops=num_stops,
@@ -78,20 +85,20 @@ def run_test(test_id, num_stops=30, num_pairs=5, box_size=10, min_qty=5, max_qty
         printer = SolutionPrinter(manager, routing, assignment, customers, vehicles)
         printer.print()
 
-        vehicle_routes = printer.get_vehicle_routes()
         dropped = printer.get_dropped_nodes()
 
-        export_vehicle_routes_csv(vehicle_routes, manager, routing, assignment, customers,
-                                  output_path=f"solutions/{prefix}_solution.csv")
+        export_vehicle_routes_csv(printer.solution, customers, output_path=f"solutions/{prefix}_solution.csv")
         export_dropped_nodes_csv(dropped, output_path=f"solutions/{prefix}_dropped.csv")
 
         plotter = RoutePlotter(customers, vehicles)
-        plotter.plot(vehicle_routes, save_path=f"solutions/{prefix}_plot.png")
+        plotter.plot(printer.solution, save_path=f"solutions/{prefix}_plot.png")
     else:
         print("❌ Nessuna soluzione trovata.")
 
 
 if __name__ == "__main__":
+    configure_logging()
+
     # Test parametrizzati
     test_cases = [
         (1, 10, 2),
@@ -0,0 +1,46 @@
+import os
+
+# Nessuna cache su disco durante i test: niente file nella directory di lavoro
+os.environ.setdefault("MATRIX_CACHE_DIR", "")
+os.environ.setdefault("SEGMENT_CACHE_PATH", "")
+# Niente rete né risposte riusate tra un test e l'altro: GraphHopper irraggiungibile
+# (le tratte falliscono subito) e cache delle soluzioni spenta
+os.environ.setdefault("GRAPHHOPPER_URL", "http://127.0.0.1:1")
+os.environ.setdefault("SOLUTION_CACHE_TTL_S", "0")
+
+
+def make_request(n_orders=6, n_vehicles=2, seed=0, spread=0.2):
+    """OptimizeRequest casuale ma riproducibile: depot D, coppie p<i> → d<i>, veicoli v<i>."""
+    import random
+
+    from api.models import OptimizeRequest
+
+    rng = random.Random(seed)
+    nodes = [{"id": "D", "name": "Depot", "lat": 45.0, "lon": 9.0, "type": "DEPOT"}]
+    orders = []
+    for i in range(n_orders):
+        for kind in "pd":
+            nodes.append({"id": f"{kind}{i}", "name": f"{kind}{i}", "lat": 45 + rng.uniform(-spread, spread),
+                          "lon": 9 + rng.uniform(-spread, spread), "type": "CLIENT"})
+        orders.append({"id": f"o{i}", "pickupNodeId": f"p{i}", "deliveryNodeId": f"d{i}",
+                       "quantity": rng.randint(1, 4), "twOpen": 0, "twClose": 72000})
+    vehicles = [{"id": f"v{i}", "capacity": 20, "cost": 10} for i in range(n_vehicles)]
+    return OptimizeRequest.model_validate({"nodes": nodes, "orders": orders, "vehicles": vehicles})
+
+
+def request_json(request):
+    """Corpo JSON di una OptimizeRequest, come lo invia un client."""
+    return request.model_dump(mode="json", by_alias=True, exclude_none=True)
+
+
+def make_problem(request):
+    """(customers, vehicles) come li prepara solve_request, con il depot nel nodo 0."""
+    from models.Customers import Customers
+    from models.Vehicles import Vehicles
+
+    customers = Customers.from_nodes_and_orders(request.nodes, request.orders)
+    vehicles = Vehicles.from_json(request.vehicles)
+    vehicles.starts = [0] * vehicles.number
+    vehicles.ends = [0] * vehicles.number
+    customers.zero_depot_demands(0)
+    return customers, vehicles
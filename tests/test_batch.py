@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from api.batch import restrict_matrices, run_scenario, scenario_requests, summarize
+from api.models import OptimizeBatchRequest
+from models.compact_matrix import CompactMatrix
+
+
+def make_batch(n_orders=8, seed=0):
+    rng = random.Random(seed)
+    nodes = [{"id": "D", "name": "Depot", "lat": 45.0, "lon": 9.0, "type": "DEPOT"}]
+    orders = []
+    for i in range(n_orders):
+        for kind in "pd":
+            nodes.append({"id": f"{kind}{i}", "name": f"{kind}{i}", "lat": 45 + rng.uniform(-0.2, 0.2),
+                          "lon": 9 + rng.uniform(-0.2, 0.2), "type": "CLIENT"})
+        orders.append({"id": f"o{i}", "pickupNodeId": f"p{i}", "deliveryNodeId": f"d{i}",
+                       "quantity": rng.randint(1, 4), "twOpen": 0, "twClose": 72000})
+    fleet = [{"id": f"v{i}", "capacity": 20, "cost": 10} for i in range(2)]
+    return OptimizeBatchRequest.model_validate({
+        "nodes": nodes, "orders": orders,
+        "scenarios": [
+            {"name": "tutti", "vehicles": fleet, "solutionLimit": 20},
+            {"name": "tre", "vehicles": fleet, "orders": orders[:3], "solutionLimit": 20},
+            {"vehicles": fleet[:1], "orders": [{**orders[0], "pickupNodeId": "nope"}]},
+        ]})
+
+
+@pytest.fixture
+def batch():
+    return make_batch()
+
+
+@pytest.fixture
+def matrices(batch):
+    return {"distances": CompactMatrix.from_haversine([n.lat for n in batch.nodes], [n.lon for n in batch.nodes])}
+
+
+def test_scenarios_keep_only_referenced_nodes(batch):
+    scenarios = scenario_requests(batch)
+    assert [name for name, _, _ in scenarios] == ["tutti", "tre", "scenario-3"]
+
+    _, everything, all_idx = scenarios[0]
+    assert all_idx == list(range(len(batch.nodes)))
+    assert len(everything.orders) == len(batch.orders)
+
+    _, three, idx = scenarios[1]
+    assert [str(batch.nodes[i].id) for i in idx] == ["D", "p0", "d0", "p1", "d1", "p2", "d2"]
+    assert [n.id for n in three.nodes] == [batch.nodes[i].id for i in idx]
+
+
+def test_restrict_matrices(batch, matrices):
+    scenarios = scenario_requests(batch)
+    assert restrict_matrices(matrices, scenarios[0][2]) is matrices
+
+    idx = scenarios[1][2]
+    sub = restrict_matrices(matrices, idx)["distances"]
+    assert len(sub) == len(idx)
+    assert sub.get(1, 2) == matrices["distances"].get(idx[1], idx[2])
+
+
+def test_run_and_summarize(batch, matrices):
+    results = [run_scenario(name, request, restrict_matrices(matrices, idx), idx)
+               for name, request, idx in scenario_requests(batch)]
+    everything, three, bad = results
+
+    for result in (everything, three):
+        assert set(result) == {"name", "objective", "vehiclesUsed", "droppedOrders", "solveSeconds", "solution"}
+        assert result["droppedOrders"] == 0
+        assert 1 <= result["vehiclesUsed"] <= 2
+    assert "error" in bad
+
+    # il sottoinsieme non visita nodi di altri scenari; i nodeIndex restano quelli del batch
+    visited = {stop["nodeIndex"] for path in three["solution"]["path"] for stop in path["route"]}
+    assert {str(batch.nodes[i].id) for i in visited} <= {"D", "p0", "d0", "p1", "d1", "p2", "d2"}
+    assert len(three["solution"]["assignedOrders"]) == 3
+
+    summary = summarize(results)
+    assert [row["name"] for row in summary["table"]] == ["tutti", "tre", "scenario-3"]
+    assert "solution" not in summary["table"][0]
+    assert set(summary["table"][2]) == {"name", "error"}
+    assert summary["best"] == "tre"
+    assert three["objective"] < everything["objective"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from models.compact_matrix import METRES_PER_KM, CompactMatrix, quantize
+from models.distance_matrix import haversine_matrix
+
+
+@pytest.fixture
+def coords():
+    rng = np.random.default_rng(0)
+    return 45 + rng.uniform(-0.5, 0.5, 37), 9 + rng.uniform(-0.5, 0.5, 37)
+
+
+@pytest.mark.parametrize("bad", [np.nan, np.inf, -np.inf])
+def test_quantize_rejects_non_finite(bad):
+    values = np.ones((3, 3))
+    values[1, 2] = bad
+    with pytest.raises(ValueError):
+        quantize(values)
+
+
+def test_quantize_rejects_overflow():
+    with pytest.raises(ValueError):
+        quantize([3e9])
+
+
+def test_packed_haversine_matches_dense(coords):
+    lats, lons = coords
+    expected = quantize(haversine_matrix(lats, lons), METRES_PER_KM)
+
+    packed = CompactMatrix.from_haversine(lats, lons, chunk_size=5)
+    assert packed.symmetric
+    assert packed.data.size == len(lats) * (len(lats) + 1) // 2
+    np.testing.assert_array_equal(packed.to_dense(), expected)
+    np.testing.assert_array_equal(CompactMatrix.from_haversine(lats, lons, packed=False).to_dense(), expected)
+
+
+@pytest.mark.parametrize("symmetric", [True, False])
+def test_round_trips(coords, symmetric):
+    lats, lons = coords
+    dense = quantize(haversine_matrix(lats, lons), METRES_PER_KM)
+    matrix = CompactMatrix.from_dense(dense, symmetric=symmetric)
+
+    np.testing.assert_array_equal(matrix.to_dense(), dense)
+    np.testing.assert_array_equal(np.asarray(matrix), dense)
+    np.testing.assert_array_equal(CompactMatrix.from_data(matrix.data, matrix.n).to_dense(), dense)
+    for i in (0, 5, len(lats) - 1):
+        np.testing.assert_array_equal(matrix.row(i), dense[i])
+        assert matrix.get(i, 3) == matrix[i, 3] == dense[i, 3]
+
+    idx = [7, 2, 30, 2]
+    np.testing.assert_array_equal(matrix.submatrix(idx).to_dense(), dense[np.ix_(idx, idx)])
+
+
+def test_set_row_round_trip(coords):
+    lats, lons = coords
+    dense = quantize(haversine_matrix(lats, lons), METRES_PER_KM)
+    matrix = CompactMatrix.empty(len(lats), True)
+    for i in range(len(lats)):
+        matrix.set_row(i, dense[i])
+    np.testing.assert_array_equal(matrix.to_dense(), dense)
@@ -0,0 +1,93 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+
+from models.customer_loader import load_customer_table, read_csv_chunks  # noqa: E402
+from models.customer_table import ROLE_DELIVERY, ROLE_PICKUP  # noqa: E402
+from models.Customers import Customers  # noqa: E402
+
+HORIZON = 24 * 3600
+
+CSV = """name,lat,lon,demand,tw_open,tw_close,type,pair_id
+depot,45.0,9.0,0,,,,
+p1,45.1,9.1,3,3600,7200,pickup,1
+d1,45.2,9.2,-3,3600,90000,delivery,1
+p2,45.3,9.3,2,7200,3600,Pickup ,2
+x,45.4,9.4,1,abc,100,delivery,
+d2,45.5,9.5,-2,0,86400,delivery,2
+p2bis,45.6,9.6,4,100,200,pickup,2
+solo,45.7,9.7,1,10,20,pickup,7
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "clienti.csv"
+    path.write_text(CSV)
+    return path
+
+
+def _load(path, chunksize=None):
+    return load_customer_table(read_csv_chunks(path, chunksize=chunksize), time_horizon=HORIZON)
+
+
+def test_hand_written_csv(csv_path):
+    table, pairs, invalid_tw = _load(csv_path)
+
+    assert len(table) == 8
+    np.testing.assert_array_equal(table.lat, [45.0, 45.1, 45.2, 45.3, 45.4, 45.5, 45.6, 45.7])
+    assert table.demand.tolist() == [0, 3, -3, 2, 1, -2, 4, 1]
+    # mancanti, aperture dopo la chiusura, oltre l'orizzonte o non numeriche: tutto il giorno
+    assert table.tw_open_s.tolist() == [0, 3600, 0, 0, 0, 0, 100, 10]
+    assert table.tw_close_s.tolist() == [HORIZON, 7200, HORIZON, HORIZON, HORIZON, 86400, 200, 20]
+    assert invalid_tw == 4
+    assert table.has_tw.all()
+
+    # pair_id 2 ripetuto dai pickup: vince l'ultima riga, nell'ordine della prima apparizione;
+    # senza pair_id o senza partner nessuna coppia
+    assert pairs == [(1, 2), (6, 5)]
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 5, 100])
+def test_chunked_loading_matches_unchunked(csv_path, chunksize):
+    table, pairs, invalid_tw = _load(csv_path)
+    chunked, chunked_pairs, chunked_invalid = _load(csv_path, chunksize=chunksize)
+
+    for column in ("lat", "lon", "demand", "tw_open_s", "tw_close_s", "has_tw"):
+        np.testing.assert_array_equal(getattr(chunked, column), getattr(table, column))
+    assert chunked_pairs == pairs
+    assert chunked_invalid == invalid_tw
+
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_missing_demand_raises(tmp_path, chunksize):
+    path = tmp_path / "clienti.csv"
+    path.write_text("lat,lon,demand\n45.0,9.0,0\n45.1,9.1,2\n45.2,9.2,\n")
+    with pytest.raises(ValueError, match="riga 2"):
+        _load(path, chunksize=chunksize)
+
+
+def test_without_optional_columns(tmp_path):
+    path = tmp_path / "clienti.csv"
+    path.write_text("lat,lon,demand\n45.0,9.0,0\n45.1,9.1,2\n")
+    table, pairs, invalid_tw = _load(path)
+
+    assert table.tw_open_s.tolist() == [0, 0]
+    assert table.tw_close_s.tolist() == [HORIZON, HORIZON]
+    assert pairs == [] and invalid_tw == 0
+
+
+def test_customers_from_csv(csv_path):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        customers = Customers.from_csv(csv_path, chunksize=3)
+
+    assert customers.number == 8
+    assert customers.pdp_pairs == [(1, 2), (6, 5)]
+    assert sorted(customers.pdp_pairs_flat) == [1, 2, 5, 6]
+    assert customers.customers.role[[1, 6]].tolist() == [ROLE_PICKUP] * 2
+    assert customers.customers.role[[2, 5]].tolist() == [ROLE_DELIVERY] * 2
+    assert "4 finestre temporali non valide" in out.getvalue()
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import numpy as np
+
+from models.customer_table import ROLE_DELIVERY, ROLE_DEPOT, ROLE_NONE, ROLE_PICKUP, Customer, CustomerTable
+
+RECORDS = [
+    Customer(0, 0, 45.0, 9.0, None, None),
+    Customer(1, 3, 45.1, 9.1, timedelta(hours=1), timedelta(hours=2)),
+    Customer(2, -3, 45.2, 9.2, 600, 7200),
+    Customer(3, 2, 45.3, 9.3, timedelta(0), None),
+]
+
+
+def test_from_records_roundtrip():
+    table = CustomerTable.from_records(RECORDS)
+
+    assert len(table) == 4
+    assert table.demand.tolist() == [0, 3, -3, 2]
+    assert table.has_tw.tolist() == [False, True, True, False]
+    assert table.tw_open_s.tolist() == [0, 3600, 600, 0]
+    assert table.tw_close_s.tolist() == [0, 7200, 7200, 0]
+    # finestre restituite in timedelta, None se assenti (anche a metà)
+    assert table[0] == RECORDS[0]
+    assert table[1] == RECORDS[1]
+    assert table[2] == Customer(2, -3, 45.2, 9.2, timedelta(seconds=600), timedelta(hours=2))
+    assert table[3] == Customer(3, 2, 45.3, 9.3, None, None)
+    assert table[-1] == table[3]
+    assert table[1:3] == [table[1], table[2]]
+    assert list(table) == [table[i] for i in range(4)]
+    assert CustomerTable.from_records(table) is table
+
+
+def test_setitem_updates_the_columns():
+    table = CustomerTable.from_records(RECORDS)
+
+    table[0] = Customer(0, 5, 46.0, 10.0, timedelta(minutes=5), timedelta(minutes=10))
+    assert table.lat[0] == 46.0 and table.lon[0] == 10.0 and table.demand[0] == 5
+    assert table.has_tw[0] and (table.tw_open_s[0], table.tw_close_s[0]) == (300, 600)
+
+    # togliere la finestra lascia i secondi com'erano ma il nodo risulta senza finestra
+    table[1] = table[1]._replace(tw_open=None)
+    assert not table.has_tw[1]
+    assert table[1].tw_open is None and table[1].tw_close is None
+
+
+def test_take_renumbers_and_clears_pairs():
+    table = CustomerTable.from_records(RECORDS)
+    table.set_pairs([(1, 2)])
+
+    sub = table.take([3, 1])
+    assert len(sub) == 2
+    assert sub[0] == Customer(0, 2, 45.3, 9.3, None, None)
+    assert sub[1] == Customer(1, 3, 45.1, 9.1, timedelta(hours=1), timedelta(hours=2))
+    assert sub.role.tolist() == [ROLE_NONE] * 2
+    assert sub.pair.tolist() == [-1, -1]
+    # copia: modificare la sottotabella non tocca l'originale
+    sub.demand[0] = 99
+    assert table.demand[3] == 2
+
+
+def test_set_pairs_keeps_depots():
+    table = CustomerTable.from_records(RECORDS)
+    table.role[0] = ROLE_DEPOT
+
+    table.set_pairs([(1, 2)])
+    assert table.role.tolist() == [ROLE_DEPOT, ROLE_PICKUP, ROLE_DELIVERY, ROLE_NONE]
+    assert table.pair.tolist() == [-1, 2, 1, -1]
+
+    # le nuove coppie sostituiscono le precedenti
+    table.set_pairs(np.array([[3, 1]]))
+    assert table.role.tolist() == [ROLE_DEPOT, ROLE_DELIVERY, ROLE_NONE, ROLE_PICKUP]
+    assert table.pair.tolist() == [-1, 3, -1, 1]
+
+    table.set_pairs([])
+    assert table.role.tolist() == [ROLE_DEPOT] + [ROLE_NONE] * 3
+    assert table.pair.tolist() == [-1] * 4
+
+
+def test_defaults_and_latlon():
+    table = CustomerTable([45.0, 45.5], [9.0, 9.5])
+    assert table.demand.tolist() == [0, 0]
+    assert table.has_tw.tolist() == [False, False]
+    np.testing.assert_array_equal(table.latlon(), [[45.0, 9.0], [45.5, 9.5]])
+
+    timed = CustomerTable([45.0], [9.0], tw_open_s=[10], tw_close_s=[20])
+    assert timed.has_tw.tolist() == [True]
@@ -0,0 +1,71 @@
+import contextlib
+import io
+from concurrent.futures import Future
+
+from conftest import make_problem, make_request
+from solver import decomposition
+
+
+class InlineExecutor:
+    """Esegue i sottoproblemi nel processo dei test, come un pool già concluso."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_merged_clusters_are_not_retried_again(monkeypatch):
+    customers, vehicles = make_problem(make_request(n_orders=6, n_vehicles=3, seed=4))
+    cluster_nodes = [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]]
+    cluster_vehicles = [[0], [1], [2]]
+    routes = [[1, 2], [5, 6, 7, 8], [9, 10]]
+    dropped = {3, 4, 11, 12}
+    objectives = [100, 100, 100]
+
+    calls = []
+
+    def fake_solve(sub_customers, sub_vehicles, penalty, time_limit_s, initial_routes=None):
+        calls.append(sub_customers.number)
+        return {"objective": 1, "routes": [[]] * sub_vehicles.number, "dropped": []}
+
+    candidates_seen = []
+
+    def first_candidate(customers, cluster_nodes, k, candidates):
+        candidates_seen.append((k, candidates))
+        return candidates[0]
+
+    monkeypatch.setattr(decomposition, "_solve_subproblem", fake_solve)
+    monkeypatch.setattr(decomposition, "_adjacent_cluster", first_candidate)
+    with contextlib.redirect_stdout(io.StringIO()):
+        decomposition._retry_failed(InlineExecutor(), customers, vehicles, cluster_nodes, cluster_vehicles,
+                                    routes, dropped, objectives, 9999999, 1)
+
+    # il cluster 0 si unisce all'1; il 2 ha ancora nodi scartati ma l'unico vicino
+    # rimasto sarebbe una metà dell'unione: nessun secondo tentativo
+    assert candidates_seen == [(0, [1, 2])]
+    assert len(calls) == 1
+    assert objectives == [1, 0, 100]
+    assert dropped == {11, 12}
+
+
+def test_solve_decomposed_serves_every_node():
+    customers, vehicles = make_problem(make_request(n_orders=30, n_vehicles=4, seed=5))
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = decomposition.solve_decomposed(customers, vehicles, max_cluster_nodes=20, time_limit_s=3,
+                                                repair_time_s=1, max_workers=1)
+
+    assert len(result["clusters"]) > 1
+    assert result["dropped"] == []
+
+    solution = result["solution"]
+    owner = {}
+    for v in range(vehicles.number):
+        route = solution.route(v).tolist()
+        assert route[0] == route[-1] == 0
+        for node in route[1:-1]:
+            assert node not in owner
+            owner[node] = v
+    assert sorted(owner) == list(range(1, customers.number))
+    for pickup, delivery in customers.pdp_pairs:
+        assert owner[pickup] == owner[delivery]
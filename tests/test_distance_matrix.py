@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from models.Customers import Customers
+from models.distance_matrix import haversine_matrix, haversine_pairs
+
+N, M = 23, 17
+
+
+def _scalar(lat1, lon1, lat2, lon2):
+    # versione scalare usata da Customers prima della vettorizzazione (self non serve)
+    return Customers._haversine(None, float(lon1), float(lat1), float(lon2), float(lat2))
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(3)
+    lats = np.r_[rng.uniform(-89, 89, N - 3), 45.0, 45.0, -0.5]
+    lons = np.r_[rng.uniform(-180, 180, N - 3), 9.0, 9.0, 179.9]  # un punto ripetuto
+    return lats, lons, rng.uniform(-60, 60, M), rng.uniform(-180, 180, M)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 3, 7, N, N + 5])
+def test_matrix_matches_scalar_haversine_bit_for_bit(points, chunk_size):
+    lats, lons, lats_to, lons_to = points
+
+    square = haversine_matrix(lats, lons, chunk_size=chunk_size)
+    expected = np.array([[_scalar(lats[i], lons[i], lats[j], lons[j]) for j in range(N)] for i in range(N)])
+    np.testing.assert_array_equal(square, expected)
+
+    rect = haversine_matrix(lats, lons, lats_to, lons_to, chunk_size=chunk_size)
+    expected = np.array([[_scalar(lats[i], lons[i], lats_to[j], lons_to[j]) for j in range(M)] for i in range(N)])
+    np.testing.assert_array_equal(rect, expected)
+
+
+def test_pairs_match_scalar_haversine_bit_for_bit(points):
+    lats, lons, lats_to, lons_to = points
+    expected = [_scalar(lats[i], lons[i], lats_to[i], lons_to[i]) for i in range(M)]
+    np.testing.assert_array_equal(haversine_pairs(lats[:M], lons[:M], lats_to, lons_to), expected)
+    # stessa diagonale della matrice
+    np.testing.assert_array_equal(haversine_pairs(lats, lons, lats, lons), np.diag(haversine_matrix(lats, lons)))
+
+
+def test_matrix_writes_into_out(points):
+    lats, lons, lats_to, lons_to = points
+    out = np.full((N, M), -1.0)
+    assert haversine_matrix(lats, lons, lats_to, lons_to, chunk_size=4, out=out) is out
+    np.testing.assert_array_equal(out, haversine_matrix(lats, lons, lats_to, lons_to))
+
+    with pytest.raises(ValueError):
+        haversine_matrix(lats, lons, lats_to, lons_to, out=np.empty((M, N)))
+
+
+def test_empty_inputs():
+    assert haversine_matrix([], []).shape == (0, 0)
+    assert haversine_matrix([45.0], [9.0], [], []).shape == (1, 0)
+    assert haversine_pairs([], [], [], []).shape == (0,)
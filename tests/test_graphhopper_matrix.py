@@ -0,0 +1,93 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from models.graphhopper_matrix import UNREACHABLE_DISTANCE_M, UNREACHABLE_TIME_S, TiledMatrixFetcher
+
+# Coppia (from, to) per cui il finto GraphHopper risponde null
+UNREACHABLE = (2, 5)
+
+
+def expected_distance(i, j):
+    return 1000.0 * i + j
+
+
+class FakeMatrixHandler(BaseHTTPRequestHandler):
+    """Finto /matrix: il punto i ha lon = i, la distanza i → j è 1000·i + j, il tempo un decimo."""
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            fail = server.failures_left > 0
+            if fail:
+                server.failures_left -= 1
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        rows = [int(p[0]) for p in payload["from_points"]]
+        cols = [int(p[0]) for p in payload["to_points"]]
+        with server.lock:
+            server.tiles.append((len(rows), len(cols)))
+        distances = [[None if (i, j) == UNREACHABLE else expected_distance(i, j) for j in cols] for i in rows]
+        times = [[None if d is None else d / 10 for d in row] for row in distances]
+
+        body = json.dumps({"distances": distances, "times": times}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def matrix_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMatrixHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.failures_left = 0
+    server.tiles = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_tiles_are_reassembled_with_retry_and_unreachable_cells(matrix_server):
+    matrix_server.failures_left = 1
+    url = f"http://127.0.0.1:{matrix_server.server_address[1]}/matrix"
+    fetcher = TiledMatrixFetcher(tile_size=3, max_workers=2, backoff_s=0, url=url)
+
+    coords = [[float(i), 0.0] for i in range(7)]
+    distances, times = fetcher.fetch(coords)
+
+    # 7 punti in blocchi da 3: 3 × 3 blocchi, più la richiesta fallita e ripetuta
+    assert len(matrix_server.tiles) == 9
+    assert matrix_server.requests == 10
+    assert sorted(matrix_server.tiles)[0] == (1, 1)
+
+    expected = np.array([[expected_distance(i, j) for j in range(7)] for i in range(7)])
+    expected[UNREACHABLE] = UNREACHABLE_DISTANCE_M
+    np.testing.assert_array_equal(distances, expected)
+    assert times[UNREACHABLE] == UNREACHABLE_TIME_S
+    assert np.isfinite(distances).all() and np.isfinite(times).all()
+
+
+def test_gives_up_after_max_retries(matrix_server):
+    matrix_server.failures_left = 10
+    url = f"http://127.0.0.1:{matrix_server.server_address[1]}/matrix"
+    fetcher = TiledMatrixFetcher(tile_size=10, max_retries=2, backoff_s=0, url=url)
+
+    with pytest.raises(Exception):
+        fetcher.fetch([[0.0, 0.0], [1.0, 0.0]])
+    assert matrix_server.requests == 2
@@ -0,0 +1,84 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from api.models import Node
+from models.Customers import Customers
+from models.graphhopper_matrix import TiledMatrixFetcher
+from models.incremental_matrix import GraphHopperBackend, HaversineBackend, IncrementalMatrixBuilder
+from test_graphhopper_matrix import matrix_server  # noqa: F401 - fixture del finto /matrix
+
+# Il finto GraphHopper usa la longitudine (intera) come indice del punto: i nodi hanno
+# longitudini intere distinte, e uno spostamento cambia la longitudine
+BASE = [("D", 45.0, 0), ("a", 45.1, 1), ("b", 45.2, 2), ("c", 45.3, 3), ("d", 45.4, 4), ("e", 45.5, 5)]
+
+CHANGES = {
+    "unchanged": BASE,
+    "added": BASE + [("f", 45.6, 6), ("g", 45.7, 7)],
+    "removed": [BASE[0], BASE[2], BASE[4]],
+    "moved": BASE[:3] + [("c", 45.35, 9)] + BASE[4:],
+    # stessi nodi in un altro ordine: cambiano solo gli indici
+    "reordered": [BASE[0]] + BASE[:0:-1],
+    "mixed": [BASE[0], ("g", 45.7, 7), BASE[3], ("b", 45.25, 8), BASE[1]],
+}
+
+
+def _customers(spec):
+    nodes = [Node(id=node_id, name=node_id, lat=lat, lon=float(lon)) for node_id, lat, lon in spec]
+    return Customers.from_nodes_and_orders(nodes, [])
+
+
+def _build(builder, spec):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return builder.build(_customers(spec))
+
+
+def _check_incremental(make_backend, change):
+    builder = IncrementalMatrixBuilder(backend=make_backend())
+    _build(builder, BASE)
+    incremental = _build(builder, CHANGES[change])
+    full = _build(IncrementalMatrixBuilder(backend=make_backend()), CHANGES[change])
+
+    assert incremental.keys() == full.keys()
+    for name in full:
+        assert incremental[name].symmetric == full[name].symmetric
+        np.testing.assert_array_equal(incremental[name].to_dense(), full[name].to_dense())
+    return builder.last_stats
+
+
+def _expected_stats(change):
+    old = {node_id: (lat, lon) for node_id, lat, lon in BASE}
+    spec = CHANGES[change]
+    reused = sum(1 for node_id, lat, lon in spec if old.get(node_id) == (lat, lon))
+    return {"reused": reused, "computed": len(spec) - reused, "cache_hit": False}
+
+
+@pytest.mark.parametrize("change", list(CHANGES))
+def test_haversine_incremental_matches_full_rebuild(change):
+    assert _check_incremental(HaversineBackend, change) == _expected_stats(change)
+
+
+@pytest.mark.parametrize("change", list(CHANGES))
+def test_graphhopper_incremental_matches_full_rebuild(matrix_server, change):  # noqa: F811
+    url = f"http://127.0.0.1:{matrix_server.server_address[1]}/matrix"
+
+    def backend():
+        return GraphHopperBackend(fetch=TiledMatrixFetcher(tile_size=4, backoff_s=0, url=url).fetch)
+
+    stats = _check_incremental(backend, change)
+    assert stats == _expected_stats(change)
+
+
+def test_graphhopper_requests_only_the_new_rows_and_columns(matrix_server):  # noqa: F811
+    url = f"http://127.0.0.1:{matrix_server.server_address[1]}/matrix"
+    builder = IncrementalMatrixBuilder(
+        backend=GraphHopperBackend(fetch=TiledMatrixFetcher(tile_size=100, backoff_s=0, url=url).fetch))
+    _build(builder, BASE)
+    matrix_server.tiles.clear()
+
+    _build(builder, CHANGES["added"])
+
+    # righe dei 2 nodi nuovi verso tutti gli 8, colonne dai 6 noti verso i 2 nuovi
+    assert sorted(matrix_server.tiles) == [(2, 8), (6, 2)]
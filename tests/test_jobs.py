@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import api, jobs
+from api.jobs import JobManager, JobStatus
+from conftest import make_request, request_json
+
+FINAL = {"COMPLETED", "FAILED", "CANCELLED"}
+
+
+def _wait(client, job_id, timeout_s=30):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in FINAL:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} non terminato: {job['status']}")
+
+
+def _long_request():
+    # senza limite di soluzioni la ricerca guidata usa tutto il tempo a disposizione
+    request = make_request(n_orders=40, n_vehicles=4, seed=3)
+    request.time_limit_s = 30
+    return request
+
+
+@pytest.fixture(scope="module")
+def client():
+    # senza lifespan: nessun pool, i job si risolvono nel processo dei test
+    assert jobs.job_manager.pool is None
+    return TestClient(api.app)
+
+
+@pytest.fixture(scope="module")
+def pool_client():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SOLVER_WORKERS", "1")
+        with TestClient(api.app) as client:
+            yield client
+
+
+def test_submit_poll_completed(client):
+    request = make_request(n_orders=4, seed=1)
+    request.solution_limit = 10
+
+    response = client.post("/jobs", json=request_json(request))
+    assert response.status_code == 202
+    created = response.json()
+    assert created["status"] in ("PENDING", "RUNNING")
+    assert created["finishedAt"] is None
+
+    job = _wait(client, created["jobId"])
+    assert job["status"] == "COMPLETED"
+    assert job["finishedAt"] >= job["createdAt"]
+    assert {e["orderId"] for e in job["result"]["solution"]["assignedOrders"]} == {o.id for o in request.orders}
+    # a job finito la richiesta non resta in memoria
+    assert jobs.job_manager.get(created["jobId"]).request is None
+
+
+def test_cancel_during_a_long_solve(client):
+    job_id = client.post("/jobs", json=request_json(_long_request())).json()["jobId"]
+    while client.get(f"/jobs/{job_id}").json()["status"] != "RUNNING":
+        time.sleep(0.05)
+    time.sleep(1)  # ricerca avviata
+
+    start = time.monotonic()
+    assert client.delete(f"/jobs/{job_id}").status_code == 200
+    job = _wait(client, job_id, timeout_s=10)
+
+    assert job["status"] == "CANCELLED"
+    assert "result" not in job
+    assert time.monotonic() - start < 5
+
+
+def test_failing_jobs_end_failed(client, monkeypatch):
+    # errore restituito dalla pipeline: richiesta senza depot
+    data = request_json(make_request(n_orders=2))
+    data["nodes"][0]["type"] = "CLIENT"
+    job = _wait(client, client.post("/jobs", json=data).json()["jobId"])
+    assert job["status"] == "FAILED"
+    assert job["error"] == "Manca un nodo di tipo depot"
+
+    # eccezione durante la risoluzione
+    def explode(request, cancel_event=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(jobs, "run_optimization", explode)
+    job = _wait(client, client.post("/jobs", json=request_json(make_request(n_orders=2))).json()["jobId"])
+    assert job["status"] == "FAILED"
+    assert job["error"] == "boom"
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.delete("/jobs/nope").status_code == 404
+
+
+def test_pending_job_is_cancelled_without_running(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def blocking(request, cancel_event=None):
+        calls.append(request)
+        release.wait(10)
+        return {"solution": {}}
+
+    monkeypatch.setattr(jobs, "run_optimization", blocking)
+    manager = JobManager(max_workers=1)
+    first, second = manager.submit("primo"), manager.submit("secondo")
+    while first.status != JobStatus.RUNNING:
+        time.sleep(0.01)
+
+    assert second.status == JobStatus.PENDING
+    assert manager.cancel(second.id).status == JobStatus.CANCELLED
+    release.set()
+    manager.executor.shutdown(wait=True)
+
+    assert first.status == JobStatus.COMPLETED
+    assert calls == ["primo"]
+
+
+def test_finished_jobs_are_trimmed_oldest_first(monkeypatch):
+    monkeypatch.setattr(jobs, "run_optimization", lambda request, cancel_event=None: {"solution": request})
+    manager = JobManager(max_workers=1, max_finished=2)
+    submitted = [manager.submit(i) for i in range(4)]
+    manager.executor.shutdown(wait=True)
+
+    assert [manager.get(job.id) for job in submitted] == [None, None, submitted[2], submitted[3]]
+
+
+def test_pool_job_completes_and_cancels(pool_client):
+    assert jobs.job_manager.pool is api.solver_pool
+    request = make_request(n_orders=4, seed=2)
+    request.solution_limit = 10
+    job = _wait(pool_client, pool_client.post("/jobs", json=request_json(request)).json()["jobId"])
+    assert job["status"] == "COMPLETED"
+
+    job_id = pool_client.post("/jobs", json=request_json(_long_request())).json()["jobId"]
+    # l'evento di annullamento è del Manager del pool, visibile dal processo worker
+    assert not isinstance(jobs.job_manager.get(job_id).cancel_event, threading.Event)
+    while pool_client.get(f"/jobs/{job_id}").json()["status"] != "RUNNING":
+        time.sleep(0.05)
+    time.sleep(3)  # richiesta arrivata al worker e ricerca avviata
+
+    start = time.monotonic()
+    pool_client.delete(f"/jobs/{job_id}")
+    assert _wait(pool_client, job_id, timeout_s=10)["status"] == "CANCELLED"
+    assert time.monotonic() - start < 5
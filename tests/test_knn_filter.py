@@ -0,0 +1,96 @@
+import contextlib
+import io
+
+import numpy as np
+
+from conftest import make_problem, make_request
+from models.compact_matrix import CompactMatrix
+from solver.routing_model_builder import RoutingModelBuilder
+
+
+def _builder(request, knn_k, distmat=None):
+    customers, vehicles = make_problem(request)
+    if distmat is not None:
+        customers.distmat = distmat
+    with contextlib.redirect_stdout(io.StringIO()):
+        return RoutingModelBuilder(customers, vehicles, use_transit_matrices=True, knn_k=knn_k)
+
+
+def _brute_force_neighbours(distmat, k):
+    dense = np.array(distmat.to_dense(), dtype=np.float64)
+    np.fill_diagonal(dense, np.inf)
+    nearest = np.argsort(dense, axis=1, kind="stable")[:, :k]
+    neighbours = [set(row.tolist()) for row in nearest]
+    for i, row in enumerate(nearest):
+        for j in row:
+            neighbours[j].add(i)
+    return neighbours
+
+
+def test_filter_keeps_every_pickup_delivery_arc():
+    # pochi vicini e punti sparsi: molte delivery non sono tra i vicini del proprio pickup
+    request = make_request(n_orders=15, n_vehicles=2, seed=2, spread=1.0)
+    builder = _builder(request, knn_k=1)
+    routing, manager = builder.routing, builder.manager
+    neighbours = builder.make_candidate_neighbours()
+
+    outside = 0
+    for pickup, delivery in builder.customers.pdp_pairs:
+        pickup_index, delivery_index = manager.NodeToIndex(pickup), manager.NodeToIndex(delivery)
+        assert routing.NextVar(pickup_index).Contains(delivery_index)
+        outside += delivery not in neighbours[pickup]
+    assert outside > 0
+
+
+def test_filter_keeps_ends_and_self_loops_and_drops_far_arcs():
+    request = make_request(n_orders=15, n_vehicles=2, seed=2, spread=1.0)
+    builder = _builder(request, knn_k=1)
+    routing, manager = builder.routing, builder.manager
+    neighbours = builder.make_candidate_neighbours()
+    partner = dict(builder.customers.pdp_pairs)
+    ends = [routing.End(v) for v in range(routing.vehicles())]
+
+    removed = 0
+    for index in range(routing.Size()):
+        if routing.IsStart(index):
+            continue
+        next_var = routing.NextVar(index)
+        assert next_var.Contains(index)
+        assert all(next_var.Contains(end) for end in ends)
+        node = manager.IndexToNode(index)
+        for other in range(1, builder.customers.number):
+            if other != node and other not in neighbours[node] and other != partner.get(node):
+                assert not next_var.Contains(manager.NodeToIndex(other))
+                removed += 1
+    assert removed > 0
+
+
+def test_filtered_model_is_solvable():
+    request = make_request(n_orders=15, n_vehicles=2, seed=2, spread=1.0)
+    builder = _builder(request, knn_k=5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        params = builder.get_default_parameters("LOCAL_CHEAPEST_INSERTION", solution_limit=20)
+        assignment = builder.solve(params)
+    assert assignment
+    visited = {builder.manager.IndexToNode(i) for route in builder.get_index_routes(assignment) for i in route}
+    assert visited == set(range(1, builder.customers.number))
+
+
+def test_spatial_index_neighbours_match_brute_force():
+    request = make_request(n_orders=40, n_vehicles=2, seed=4, spread=0.5)
+    builder = _builder(request, knn_k=5)
+    assert builder.customers.distmat.symmetric
+    assert builder.make_candidate_neighbours() == _brute_force_neighbours(builder.customers.distmat, 5)
+
+
+def test_asymmetric_matrix_neighbours_match_brute_force():
+    request = make_request(n_orders=20, n_vehicles=2, seed=6)
+    n = 1 + 2 * 20
+    rng = np.random.default_rng(6)
+    # distanze stradali: asimmetriche e senza pari merito
+    dense = rng.permutation(n * n).reshape(n, n) + 1000
+    np.fill_diagonal(dense, 0)
+    distmat = CompactMatrix.from_dense(dense)
+    builder = _builder(request, knn_k=4, distmat=distmat)
+    assert not builder.customers.distmat.symmetric
+    assert builder.make_candidate_neighbours() == _brute_force_neighbours(distmat, 4)
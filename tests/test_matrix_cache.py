@@ -0,0 +1,70 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+
+from conftest import make_problem, make_request
+from models.incremental_matrix import IncrementalMatrixBuilder
+from models.matrix_cache import MatrixCache
+
+
+def _put(cache, key, size, mtime):
+    cache.put(key, {"distances": np.zeros(size, dtype=np.int32)})
+    # LRU sul tempo di modifica: lo si fissa per non dipendere dalla risoluzione del filesystem
+    os.utime(cache._path(key, "distances"), (mtime, mtime))
+
+
+def test_hit_and_miss(tmp_path):
+    cache = MatrixCache(str(tmp_path))
+    key = cache.make_key([45.0, 45.1], [9.0, 9.1], "car", kind="haversine")
+
+    assert cache.get(key, ["distances"]) is None
+    cache.put(key, {"distances": np.arange(4, dtype=np.int32)})
+    cached = cache.get(key, ["distances"])
+    np.testing.assert_array_equal(cached["distances"], np.arange(4))
+    # manca una delle matrici richieste: è un miss
+    assert cache.get(key, ["distances", "times"]) is None
+
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_key_depends_on_rounded_coordinates_profile_and_kind(tmp_path):
+    cache = MatrixCache(str(tmp_path), precision=4)
+    key = cache.make_key([45.0], [9.0], "car", kind="haversine")
+
+    assert cache.make_key([45.00001], [9.0], "car", kind="haversine") == key
+    assert cache.make_key([45.001], [9.0], "car", kind="haversine") != key
+    assert cache.make_key([45.0], [9.0], "bike", kind="haversine") != key
+    assert cache.make_key([45.0], [9.0], "car", kind="graphhopper") != key
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = MatrixCache(str(tmp_path), max_bytes=10 ** 9)
+    _put(cache, "a", 1000, 1000)
+    entry_bytes = os.path.getsize(cache._path("a", "distances"))
+
+    cache.max_bytes = 2 * entry_bytes
+    _put(cache, "b", 1000, 2000)
+    # una lettura rinfresca "a", che diventa la più recente
+    assert cache.get("a", ["distances"]) is not None
+    _put(cache, "c", 1000, 3000)
+
+    assert cache.get("b", ["distances"]) is None
+    assert cache.get("a", ["distances"]) is not None
+    assert cache.get("c", ["distances"]) is not None
+
+
+def test_builder_uses_cache_for_same_coordinates(tmp_path):
+    cache = MatrixCache(str(tmp_path))
+    request = make_request(n_orders=4)
+    customers, _ = make_problem(request)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = IncrementalMatrixBuilder(cache=cache).build(customers)
+        # un builder nuovo (altro processo) non ha matrici in memoria: le legge dalla cache
+        builder = IncrementalMatrixBuilder(cache=cache)
+        second = builder.build(customers)
+
+    assert builder.last_stats["cache_hit"]
+    np.testing.assert_array_equal(second["distances"].to_dense(), first["distances"].to_dense())
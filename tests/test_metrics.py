@@ -0,0 +1,83 @@
+import re
+
+from solver.instrumentation import DURATION_BUCKETS, METRICS, PREFIX, MetricsRegistry, span
+
+# riga di campione Prometheus: nome{etichette} valore
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.e+-]+$')
+
+
+def _samples(text, name):
+    return [line for line in text.splitlines() if line.startswith(PREFIX + name) and not line.startswith("#")]
+
+
+def test_render_declares_every_metric():
+    text = MetricsRegistry().render()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    for name, (kind, help_text) in METRICS.items():
+        i = lines.index(f"# HELP {PREFIX}{name} {help_text}")
+        assert lines[i + 1] == f"# TYPE {PREFIX}{name} {kind}"
+
+
+def test_samples_are_well_formed():
+    registry = MetricsRegistry()
+    registry.inc("solves_total", status="found")
+    registry.inc("solves_total", 2, status="found")
+    registry.set("solver_last_objective", 1234)
+    registry.observe("phase_seconds", 0.02, phase="solve")
+
+    text = registry.render()
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            assert line.startswith(PREFIX)
+            assert SAMPLE.match(line), line
+    assert _samples(text, "solves_total") == [f'{PREFIX}solves_total{{status="found"}} 3']
+    assert _samples(text, "solver_last_objective") == [f"{PREFIX}solver_last_objective 1234"]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    for value in (0.002, 0.02, 0.02, 1000):
+        registry.observe("phase_seconds", value, phase="matrix")
+
+    text = registry.render()
+    buckets = _samples(text, "phase_seconds_bucket")
+    assert len(buckets) == len(DURATION_BUCKETS) + 1
+    assert buckets[0] == f'{PREFIX}phase_seconds_bucket{{phase="matrix",le="0.001"}} 0'
+    assert buckets[-1] == f'{PREFIX}phase_seconds_bucket{{phase="matrix",le="+Inf"}} 4'
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert _samples(text, "phase_seconds_count") == [f'{PREFIX}phase_seconds_count{{phase="matrix"}} 4']
+    total = float(_samples(text, "phase_seconds_sum")[0].rsplit(" ", 1)[1])
+    assert abs(total - 1000.042) < 1e-9
+
+
+def test_drain_and_merge_across_processes():
+    worker, api = MetricsRegistry(), MetricsRegistry()
+    api.inc("solves_total", status="found")
+    api.set("solver_last_objective", 1)
+    worker.inc("solves_total", status="found")
+    worker.set("solver_last_objective", 7)
+    with span("solve", registry=worker):
+        pass
+
+    api.merge(worker.drain())
+    text = api.render()
+    # i contatori si sommano, i gauge prendono l'ultimo valore
+    assert _samples(text, "solves_total") == [f'{PREFIX}solves_total{{status="found"}} 2']
+    assert _samples(text, "solver_last_objective") == [f"{PREFIX}solver_last_objective 7"]
+    assert _samples(text, "phase_seconds_count") == [f'{PREFIX}phase_seconds_count{{phase="solve"}} 1']
+    # dopo drain il registro del worker è vuoto
+    assert not _samples(worker.render(), "solves_total")
+
+
+def test_metrics_endpoint():
+    from fastapi.testclient import TestClient
+
+    from api.api import app
+
+    # senza il context manager il lifespan non parte: nessun pool di processi
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert f"# TYPE {PREFIX}phase_seconds histogram" in response.text
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from conftest import make_problem, make_request
+from solver import portfolio
+
+STRATEGY = [("PATH_CHEAPEST_ARC", None)]
+
+
+@pytest.fixture
+def one_worker_pool(monkeypatch):
+    monkeypatch.setenv("PORTFOLIO_WORKERS", "1")
+    monkeypatch.setattr(portfolio, "_executor", None)
+    yield
+    if portfolio._executor is not None:
+        portfolio._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _kill_workers(executor):
+    for pid in list(executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def _solve(request, **kwargs):
+    customers, vehicles = make_problem(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return portfolio.solve_portfolio(customers, vehicles, **kwargs)
+
+
+def test_portfolio_recovers_from_a_worker_killed_between_requests(one_worker_pool):
+    request = make_request(n_orders=4, seed=1)
+    _, _, assignment, _ = _solve(request, strategies=STRATEGY, time_limit_s=5, solution_limit=10)
+    assert assignment
+
+    broken = portfolio._executor
+    _kill_workers(broken)
+    time.sleep(0.5)  # il pool si accorge del processo morto
+
+    _, _, assignment, stats = _solve(request, strategies=STRATEGY, time_limit_s=5, solution_limit=10)
+    assert assignment
+    assert "error" not in stats[0]
+    assert portfolio._executor is not None and portfolio._executor is not broken
+
+
+def test_portfolio_recovers_from_a_worker_killed_during_a_request(one_worker_pool):
+    request = make_request(n_orders=10, seed=2)
+    executor = portfolio.get_portfolio_executor()
+    # senza limite di soluzioni la ricerca guidata usa tutto il tempo: il worker muore a metà
+    killer = threading.Timer(1.0, _kill_workers, args=(executor,))
+    killer.start()
+    _, _, assignment, stats = _solve(request, strategies=[("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH")],
+                                     time_limit_s=10)
+    killer.join()
+
+    assert assignment is None
+    assert "error" in stats[0]
+    assert portfolio._executor is None
+
+    _, _, assignment, _ = _solve(request, strategies=STRATEGY, time_limit_s=5, solution_limit=10)
+    assert assignment
+
+
+def test_strategy_failure_does_not_discard_the_pool(one_worker_pool):
+    request = make_request(n_orders=4, seed=1)
+    executor = portfolio.get_portfolio_executor()
+    _, _, assignment, stats = _solve(request, strategies=[("NOT_A_STRATEGY", None)] + STRATEGY,
+                                     time_limit_s=5, solution_limit=10)
+    assert assignment
+    assert "error" in stats[0] and stats[1]["best"]
+    assert portfolio._executor is executor
+
+
+def test_sequential_portfolio_without_workers(monkeypatch):
+    monkeypatch.setenv("PORTFOLIO_WORKERS", "0")
+    monkeypatch.setattr(portfolio, "_executor", None)
+    assert portfolio.get_portfolio_executor() is None
+
+    strategies = [("PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"), ("PARALLEL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH")]
+    start = time.perf_counter()
+    _, _, assignment, stats = _solve(make_request(n_orders=6, seed=3), strategies=strategies, time_limit_s=2)
+
+    assert assignment
+    assert [s["strategy"] for s in stats] == [s for s, _ in strategies]
+    # le strategie si dividono il budget: anche l'ultima ha tempo per una soluzione
+    assert all(s["objective"] is not None for s in stats)
+    assert time.perf_counter() - start < 3.5
+    assert portfolio._executor is None
@@ -0,0 +1,113 @@
+import contextlib
+import io
+
+import pytest
+
+from api.models import OptimizeRequest
+from api.pipeline import solve_request
+from api.reoptimization import prepare_reoptimization, vehicle_start_node_id
+from conftest import make_request, request_json
+
+NOW = 5000
+
+
+def _live_request():
+    """Ordini 0-1 in corso (a bordo di v0), 2 consegnato, gli altri aperti; v0 in strada, v1 al depot."""
+    data = request_json(make_request(n_orders=5, n_vehicles=2, seed=9))
+    data.update(reoptimize=True, currentTimeSeconds=NOW, solutionLimit=30)
+    data["vehicles"][0].update(currentLat=45.05, currentLon=9.05)
+    for order in data["orders"][:2]:
+        order.update(status="IN_PROGRESS", assignedVehicleId="v0")
+    data["orders"][2]["status"] = "DELIVERED"
+    return OptimizeRequest.model_validate(data)
+
+
+def _solve(request):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return solve_request(request)
+
+
+def _stops(plan, vehicle_id):
+    customers = plan.printer.customers
+    return [customers.index_to_node_id[node] for node in plan.printer.solution.route(vehicle_id).tolist()]
+
+
+def test_live_plan_keeps_only_residual_work():
+    live = prepare_reoptimization(_live_request())
+
+    assert [str(o.id) for o in live.orders] == ["o3", "o4"]
+    assert [str(o.id) for o in live.onboard] == ["o0", "o1"]
+    node_ids = {str(n.id) for n in live.nodes}
+    # le pickup già fatte e l'ordine consegnato escono dal modello
+    assert not node_ids & {"p0", "p1", "p2", "d2"}
+    assert {"d0", "d1", "p3", "d3", "D", vehicle_start_node_id(live.vehicles[0])} <= node_ids
+    assert live.start_node_ids == ["vehicle:v0", None]
+    assert live.start_time_s == NOW
+
+
+def test_onboard_vehicle_starts_loaded_and_visits_its_deliveries():
+    request = _live_request()
+    plan = _solve(request)
+    assert not isinstance(plan, dict), plan
+
+    stops = _stops(plan, 0)
+    assert stops[0] == "vehicle:v0"
+    assert {"d0", "d1"} <= set(stops)
+    assert not {"d0", "d1"} & set(_stops(plan, 1))
+
+    # la merce a bordo è la domanda del nodo di partenza: si arriva alla prima fermata
+    # già carichi, e il carico cala della quantità a ogni consegna
+    solution = plan.printer.solution
+    loads = solution.load[solution.route_slice(0)].tolist()
+    assert loads[1] == sum(o.quantity for o in request.orders[:2])
+    for order in request.orders[:2]:
+        position = stops.index(str(order.delivery_node_id))
+        assert loads[position + 1] == loads[position] - order.quantity
+
+    assigned = {e["orderId"]: e["assignedVehicleId"] for e in plan.solution["assignedOrders"]}
+    assert assigned["o0"] == assigned["o1"] == "v0"
+
+
+def test_vehicles_start_at_the_current_time():
+    plan = _solve(_live_request())
+    customers, solution = plan.printer.customers, plan.printer.solution
+
+    assert customers.start_time_s == NOW
+    assert customers.time_horizon >= NOW + 3600
+    # la posizione live parte esattamente adesso, il depot non prima di adesso
+    assert solution.time_min[solution.route_slice(0)][0] == solution.time_max[solution.route_slice(0)][0] == NOW
+    assert solution.time_min[solution.route_slice(1)][0] >= NOW
+
+
+def _set(path_value):
+    def apply(data):
+        for path, value in path_value:
+            target = data
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = value
+    return apply
+
+
+@pytest.mark.parametrize("change, error", [
+    # veicolo assegnato sconosciuto
+    (_set([(("orders", 0, "assignedVehicleId"), "v9")]), "Ordine in corso o0 senza veicolo"),
+    # veicolo offline o senza posizione nota
+    (_set([(("vehicles", 0, "status"), "OFFLINE")]), "Ordine in corso o0 senza veicolo"),
+    (_set([(("orders", 0, "assignedVehicleId"), "v1")]), "Ordine in corso o0 senza veicolo"),
+    # consegna di merce già ritirata su un nodo usato da un ordine aperto
+    (_set([(("orders", 0, "deliveryNodeId"), "p3")]), "il nodo di consegna p3 è usato anche da un ordine aperto"),
+    # stesso nodo di consegna con merce a bordo di due veicoli
+    (_set([(("vehicles", 1, "currentLat"), 45.1), (("vehicles", 1, "currentLon"), 9.1),
+           (("orders", 1, "assignedVehicleId"), "v1"), (("orders", 1, "deliveryNodeId"), "d0")]),
+     "ha merce a bordo di più veicoli"),
+    # nodo sconosciuto
+    (_set([(("orders", 0, "deliveryNodeId"), "x")]), "Ordine in corso o0: nodo di consegna x sconosciuto"),
+    (_set([(("orders", 3, "pickupNodeId"), "x")]), "ID non trovato in mapping: x"),
+])
+def test_live_errors(change, error):
+    data = request_json(_live_request())
+    change(data)
+    result = _solve(OptimizeRequest.model_validate(data))
+    assert isinstance(result, dict)
+    assert error in result["error"]
@@ -0,0 +1,136 @@
+import contextlib
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from solver.route_exporter import RouteExporter, TokenBucket
+
+
+def point(vehicle_id, index):
+    return {"vehicleId": vehicle_id, "index": index, "lat": 45.0 + index / 100, "lon": 9.0, "label": "Depot"}
+
+
+def test_idle_vehicles_request_no_legs():
+    route = [
+        point(0, 0), point(0, 0),                # veicolo 0: solo partenza e arrivo
+        point(1, 0), point(1, 3), point(1, 0),   # veicolo 1: una fermata
+        point(2, 7), point(2, 0),                # veicolo 2: posizione live → depot, nessuna fermata
+    ]
+    legs = RouteExporter(route).build_legs()
+
+    assert [(start["index"], end["index"]) for start, end in legs] == [(0, 3), (3, 0)]
+    assert {start["vehicleId"] for start, _ in legs} == {1}
+
+
+class FakeRouteHandler(BaseHTTPRequestHandler):
+    """
+    Finto /route: la tratta da A a B (lat = 45 + indice / 100) risponde dopo un ritardo
+    che decresce con l'indice di partenza, quindi le risposte arrivano in ordine inverso.
+    La tratta che parte dal nodo FAILING risponde 500.
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start, end = [round((float(p.split(",")[0]) - 45.0) * 100) for p in query["point"]]
+        with self.server.lock:
+            self.server.calls.append((start, end))
+        time.sleep(0.02 * (10 - start))
+        if start == FAILING:
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        body = json.dumps({"paths": [{"points": {"coordinates": [[9.0, 45.0], [9.0, 45.1]]},
+                                      "distance": 1000.0 * start + end, "time": 60000 * end}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+FAILING = 4
+
+
+@pytest.fixture
+def route_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRouteHandler)
+    server.lock = threading.Lock()
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GRAPHHOPPER_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_routes_keeps_leg_order_and_skips_failed_legs(route_server):
+    route = [point(0, 0), point(0, 1), point(0, 2), point(0, 0),
+             point(1, 0), point(1, 3), point(1, FAILING), point(1, 5), point(1, 0)]
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        with RouteExporter(route, vehicle_ids=["v0", "v1"], max_workers=8, rate_limit_per_s=0) as exporter:
+            exporter.fetch_routes()
+
+    # tutte le tratte richieste in parallelo (in serie servirebbe più di un secondo),
+    # le risposte arrivano in ordine inverso ma routes_data segue l'ordine delle tratte
+    assert len(route_server.calls) == 7
+    assert time.monotonic() - start < 0.6
+    legs = [(s["fromNodeIndex"], s["toNodeIndex"], s["vehicleId"]) for s in exporter.routes_data]
+    assert legs == [(0, 1, "v0"), (1, 2, "v0"), (2, 0, "v0"), (0, 3, "v1"), (3, FAILING, "v1"), (5, 0, "v1")]
+    assert [s["distanceM"] for s in exporter.routes_data] == [1.0, 1002.0, 2000.0, 3.0, 3004.0, 5000.0]
+    assert [s["timeS"] for s in exporter.routes_data] == [60, 120, 0, 180, 240, 0]
+    assert f"{FAILING} → 5" in out.getvalue()
+
+
+def test_close_releases_the_session():
+    with RouteExporter([]) as exporter:
+        adapter = exporter.session.get_adapter("http://localhost")
+        adapter.poolmanager.connection_from_url("http://localhost")
+        assert adapter.poolmanager.pools
+    # chiudendo la sessione si svuota il pool di connessioni keep-alive
+    assert not adapter.poolmanager.pools
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate_per_s=20, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # la raffica iniziale non aspetta
+    assert time.monotonic() - start < 0.05
+
+    for _ in range(10):
+        bucket.acquire()
+    # altre 10 richieste a 20/s: almeno mezzo secondo
+    elapsed = time.monotonic() - start
+    assert 0.45 <= elapsed < 1.0
+
+
+def test_token_bucket_is_shared_between_threads():
+    bucket = TokenBucket(rate_per_s=50, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 20 richieste, 1 subito e 19 a 50/s
+    assert time.monotonic() - start >= 19 / 50 * 0.95
+
+
+def test_token_bucket_without_limit():
+    bucket = TokenBucket(rate_per_s=0)
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.1
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+
+from solver.segment_cache import SegmentCache
+
+
+def _rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+
+def test_disk_tier_is_capped(tmp_path):
+    path = str(tmp_path / "segments.db")
+    cache = SegmentCache(path, max_entries=5, max_rows=10, purge_every=5)
+    errors = []
+
+    def worker(t):
+        try:
+            for i in range(20):
+                cache.put(f"{t}-{i}", {"i": i})
+                cache.get(f"{t}-{i}")
+        except Exception as e:  # noqa: BLE001 - da riportare al thread principale
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    # tra due pulizie il disco può superare il limite di al più purge_every - 1 righe
+    assert _rows(path) < 10 + 5
+    cache.purge()
+    assert _rows(path) == 10
+
+
+def test_purge_removes_expired_rows(tmp_path):
+    path = str(tmp_path / "segments.db")
+    cache = SegmentCache(path)
+    cache.put("a", {"x": 1})
+    assert _rows(path) == 1
+
+    expired = SegmentCache(path, ttl_s=-1)
+    assert expired.get("a") is None
+    expired.put("b", {"x": 2})
+    expired.purge()
+    assert _rows(path) == 0
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from api import solution_cache
+from api.models import OptimizeRequest
+from api.solution_cache import SolutionCache
+from conftest import make_request
+
+
+class SlowSolve:
+    """compute() che conta le chiamate e resta in attesa finché il test non lo sblocca."""
+
+    def __init__(self, response=None, error=None):
+        self.calls = 0
+        self.response = response if response is not None else {"solution": "ok"}
+        self.error = error
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+async def _concurrent(cache, key, compute, n):
+    compute.release = asyncio.Event()
+    tasks = [asyncio.ensure_future(cache.get_or_compute(key, compute)) for _ in range(n)]
+    await asyncio.sleep(0)  # tutte le richieste arrivano mentre il primo solve è in corso
+    compute.release.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_concurrent_identical_requests_share_one_solve():
+    cache = SolutionCache()
+    compute = SlowSolve()
+
+    results = asyncio.run(_concurrent(cache, "k", compute, 5))
+
+    assert compute.calls == 1
+    assert all(result is compute.response for result in results)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 0)
+    assert stats["entries"] == 1
+
+    # la richiesta successiva è un hit, senza nuovo solve
+    assert asyncio.run(cache.get_or_compute("k", compute)) is compute.response
+    assert compute.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_failures_are_shared_but_not_cached():
+    cache = SolutionCache()
+
+    failing = SlowSolve(error=RuntimeError("solver"))
+    results = asyncio.run(_concurrent(cache, "k", failing, 3))
+    assert failing.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    error = SlowSolve(response={"error": "Nessuna soluzione trovata"})
+    asyncio.run(_concurrent(cache, "k", error, 2))
+    assert cache.stats()["entries"] == 0
+
+    retry = SlowSolve()
+    asyncio.run(_concurrent(cache, "k", retry, 1))
+    assert retry.calls == 1
+    assert cache.get("k") is retry.response
+
+
+def test_key_ignores_json_layout_but_not_content():
+    cache = SolutionCache()
+    request = make_request(n_orders=3)
+    data = request.model_dump(mode="json", by_alias=True)
+    reordered = OptimizeRequest.model_validate(dict(reversed(list(data.items()))))
+    changed = OptimizeRequest.model_validate({**data, "timeLimitSeconds": request.time_limit_s + 1})
+
+    assert cache.make_key(reordered) == cache.make_key(request)
+    assert cache.make_key(changed) != cache.make_key(request)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(solution_cache.time, "time", lambda: now[0])
+    cache = SolutionCache(ttl_s=60)
+    cache.put("k", {"solution": 1})
+
+    now[0] += 60
+    assert cache.get("k") == {"solution": 1}
+    now[0] += 1
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SolutionCache(max_entries=2)
+    cache.put("a", {"solution": "a"})
+    cache.put("b", {"solution": "b"})
+    assert cache.get("a") is not None  # "a" diventa la più recente
+    cache.put("c", {"solution": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+@pytest.mark.parametrize("ttl, enabled", [("0", False), ("30", True)])
+def test_default_cache_configuration(monkeypatch, ttl, enabled):
+    monkeypatch.setattr(solution_cache, "_default_cache", None)
+    monkeypatch.setenv("SOLUTION_CACHE_TTL_S", ttl)
+    cache = solution_cache.get_default_solution_cache()
+    assert (cache is not None) == enabled
+    if enabled:
+        assert cache.ttl_s == 30
@@ -0,0 +1,149 @@
+import contextlib
+import io
+from datetime import timedelta
+
+import pytest
+
+from conftest import make_problem, make_request
+from solver.compact_solution import CompactSolution
+from solver.routing_model_builder import RoutingModelBuilder
+from solver.solution_printer import SolutionPrinter
+
+
+class LegacyPrinter:
+    """Il printer prima di CompactSolution: rilegge l'assignment seguendo NextVar a ogni chiamata."""
+
+    def __init__(self, manager, routing, assignment, customers, vehicles):
+        self.manager = manager
+        self.routing = routing
+        self.assignment = assignment
+        self.customers = customers
+        self.vehicles = vehicles
+        self.capacity_dimension = routing.GetDimensionOrDie('Capacity')
+        self.time_dimension = routing.GetDimensionOrDie('Time')
+
+    def get_dropped_nodes(self):
+        return [str(self.manager.IndexToNode(index)) for index in range(self.routing.Size())
+                if self.assignment.Value(self.routing.NextVar(index)) == index]
+
+    def get_vehicle_routes(self):
+        vehicle_routes = {}
+        for vehicle_id in range(self.vehicles.number):
+            index = self.routing.Start(vehicle_id)
+            route = []
+            while not self.routing.IsEnd(index):
+                route.append(self.customers.customers[self.manager.IndexToNode(index)])
+                index = self.assignment.Value(self.routing.NextVar(index))
+            route.append(self.customers.customers[self.manager.IndexToNode(index)])
+            vehicle_routes[vehicle_id] = route
+        return vehicle_routes
+
+    def print(self):
+        print(f'Objective value: {self.assignment.ObjectiveValue()}')
+        print()
+        for vehicle_id in range(self.vehicles.number):
+            index = self.routing.Start(vehicle_id)
+            if self.routing.IsEnd(self.assignment.Value(self.routing.NextVar(index))):
+                print(f'Route for vehicle {vehicle_id}: Empty\n')
+                continue
+            route_str = f'Route for vehicle {vehicle_id}:\n'
+            while not self.routing.IsEnd(index):
+                node = self.manager.IndexToNode(index)
+                load = self.assignment.Value(self.capacity_dimension.CumulVar(index))
+                time_var = self.time_dimension.CumulVar(index)
+                tmin = timedelta(seconds=self.assignment.Min(time_var))
+                tmax = timedelta(seconds=self.assignment.Max(time_var))
+                route_str += f' {node} Load({load}) Time({tmin}, {tmax}) ->'
+                index = self.assignment.Value(self.routing.NextVar(index))
+            route_str += f' {self.manager.IndexToNode(index)} End\n'
+            print(route_str)
+        print(f'Dropped nodes: {", ".join(self.get_dropped_nodes())}')
+
+    def get_solution_json(self):
+        id_to_index = self.customers.node_id_to_index
+        node_to_order = {(id_to_index[o.pickup_node_id], id_to_index[o.delivery_node_id]): o.id
+                         for o in self.customers.orders}
+        solution = {"path": [], "assignedOrders": []}
+        for vehicle_id, route in self.get_vehicle_routes().items():
+            real_id = self.vehicles.ids[vehicle_id]
+            indices = [node.index for node in route]
+            for pickup, delivery in self.customers.pdp_pairs:
+                if pickup in indices and delivery in indices and (pickup, delivery) in node_to_order:
+                    solution["assignedOrders"].append({
+                        "orderId": node_to_order[(pickup, delivery)],
+                        "pickupNodeId": self.customers.index_to_node_id[pickup],
+                        "deliveryNodeId": self.customers.index_to_node_id[delivery],
+                        "assignedVehicleId": real_id
+                    })
+            solution["path"].append({
+                "vehicleId": real_id,
+                "route": [{"nodeIndex": node.index, "lat": node.lat, "lon": node.lon} for node in route]
+            })
+        return solution
+
+
+def _solve(request, droppable_pairs=False):
+    customers, vehicles = make_problem(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        builder = RoutingModelBuilder(customers, vehicles, use_transit_matrices=True, droppable_pairs=droppable_pairs)
+        assignment = builder.solve(builder.get_default_parameters(solution_limit=30))
+    assert assignment
+    return builder, assignment
+
+
+def _printed(printer):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        printer.print()
+    return out.getvalue()
+
+
+def _scenarios():
+    # flotta più grande del necessario: qualche veicolo resta vuoto
+    yield pytest.param(make_request(n_orders=4, n_vehicles=4, seed=1), False, id="empty-vehicles")
+    request = make_request(n_orders=8, n_vehicles=2, seed=7)
+    for order in request.orders[:2]:
+        order.quantity = 30
+    # ordini più grandi di ogni veicolo e coppie facoltative: restano non serviti
+    yield pytest.param(request, True, id="dropped-orders")
+
+
+@pytest.mark.parametrize("request_, droppable", list(_scenarios()))
+def test_compact_solution_matches_legacy_printer(request_, droppable):
+    builder, assignment = _solve(request_, droppable)
+    args = (builder.manager, builder.routing, assignment, builder.customers, builder.vehicles)
+    printer, legacy = SolutionPrinter(*args), LegacyPrinter(*args)
+
+    assert _printed(printer) == _printed(legacy)
+    assert printer.get_dropped_nodes() == legacy.get_dropped_nodes()
+    assert printer.get_solution_json() == legacy.get_solution_json()
+    routes, legacy_routes = printer.get_vehicle_routes(), legacy.get_vehicle_routes()
+    assert {v: [n.index for n in r] for v, r in routes.items()} == \
+           {v: [n.index for n in r] for v, r in legacy_routes.items()}
+
+    if droppable:
+        assert printer.get_dropped_nodes()
+    else:
+        assert "Empty" in _printed(printer)
+
+
+def test_pair_vehicle_and_routes_round_trip():
+    builder, assignment = _solve(make_request(n_orders=6, n_vehicles=2, seed=3))
+    solution = CompactSolution.from_assignment(builder.manager, builder.routing, assignment, builder.customers)
+
+    for vehicle_id, route in enumerate(builder.get_index_routes(assignment)):
+        nodes = solution.route(vehicle_id).tolist()
+        assert nodes[1:-1] == [builder.manager.IndexToNode(i) for i in route]
+    for (pickup, delivery), vehicle_id in zip(builder.customers.pdp_pairs, solution.pair_vehicle.tolist()):
+        assert solution.node_vehicle[pickup] == solution.node_vehicle[delivery] == vehicle_id
+
+    # la stessa soluzione ricostruita dalle rotte (come fa la decomposizione) stampa lo stesso testo
+    routes = [solution.route(v).tolist() for v in range(solution.num_vehicles)]
+    slices = [solution.route_slice(v) for v in range(solution.num_vehicles)]
+    rebuilt = CompactSolution.from_routes(solution.objective, routes, solution.dropped.tolist(), builder.customers,
+                                          load=[solution.load[s] for s in slices],
+                                          time_min=[solution.time_min[s] for s in slices],
+                                          time_max=[solution.time_max[s] for s in slices])
+    printer = SolutionPrinter(builder.manager, builder.routing, assignment, builder.customers, builder.vehicles)
+    rebuilt_printer = SolutionPrinter.from_solution(rebuilt, builder.customers, builder.vehicles)
+    assert _printed(rebuilt_printer) == _printed(printer)
+    assert rebuilt_printer.get_solution_json() == printer.get_solution_json()
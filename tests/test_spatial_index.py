@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from models.distance_matrix import haversine_matrix
+from models.spatial_index import SpatialIndex
+
+
+def _wrap(lons):
+    return (np.asarray(lons) + 180) % 360 - 180
+
+
+def _points(kind, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    if kind == "milano":
+        return 45.46 + rng.uniform(-0.3, 0.3, n), 9.19 + rng.uniform(-0.4, 0.4, n)
+    if kind == "antimeridiano":
+        # metà dei nodi a lon ~179.x, metà a ~-179.x: vicini in km, lontani in gradi
+        return rng.uniform(-0.5, 0.5, n), _wrap(180 + rng.uniform(-0.5, 0.5, n))
+    if kind == "polo nord":
+        return rng.uniform(88.5, 89.9, n), rng.uniform(-180, 180, n)
+    if kind == "polo sud":
+        return rng.uniform(-89.9, -88.5, n), rng.uniform(-180, 180, n)
+    raise ValueError(kind)
+
+
+KINDS = ["milano", "antimeridiano", "polo nord", "polo sud"]
+
+
+@pytest.fixture(params=KINDS)
+def points(request):
+    lats, lons = _points(request.param)
+    return lats, lons, haversine_matrix(lats, lons)
+
+
+def test_nearest_matches_brute_force(points):
+    lats, lons, dist = points
+    index = SpatialIndex(lats, lons)
+    for i in range(0, len(lats), 7):
+        idx, d = index.nearest(lats[i], lons[i], 6)
+        expected = np.argsort(dist[i], kind="stable")[:6]
+        np.testing.assert_array_equal(idx, expected)
+        np.testing.assert_allclose(d, dist[i, expected])
+
+
+def test_nearest_from_points_not_in_the_index(points):
+    lats, lons, _ = points
+    index = SpatialIndex(lats, lons)
+    rng = np.random.default_rng(1)
+    queries = zip(lats[:20] + rng.uniform(-0.05, 0.05, 20), _wrap(lons[:20] + rng.uniform(-0.05, 0.05, 20)))
+    for lat, lon in queries:
+        exact = haversine_matrix([lat], [lon], lats, lons)[0]
+        idx, d = index.nearest(lat, lon, 4)
+        np.testing.assert_array_equal(idx, np.argsort(exact, kind="stable")[:4])
+        np.testing.assert_allclose(d, np.sort(exact)[:4])
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 5, 30])
+def test_radius_matches_brute_force(points, radius_km):
+    lats, lons, dist = points
+    index = SpatialIndex(lats, lons)
+    for i in range(0, len(lats), 11):
+        idx, d = index.radius(lats[i], lons[i], radius_km)
+        expected = np.flatnonzero(dist[i] <= radius_km)
+        np.testing.assert_array_equal(np.sort(idx), expected)
+        assert np.all(np.diff(d) >= 0)
+        np.testing.assert_allclose(d, dist[i, idx])
+
+
+@pytest.mark.parametrize("k", [1, 5, 12])
+def test_nearest_all_matches_brute_force(points, k):
+    lats, lons, dist = points
+    dist = dist.copy()
+    np.fill_diagonal(dist, np.inf)
+    expected = np.argsort(dist, axis=1, kind="stable")[:, :k]
+    np.testing.assert_array_equal(SpatialIndex(lats, lons).nearest_all(k), expected)
+
+
+def test_bbox_matches_brute_force(points):
+    lats, lons, _ = points
+    index = SpatialIndex(lats, lons)
+    lat_min, lat_max = np.quantile(lats, [0.2, 0.7])
+    lon_min, lon_max = np.quantile(lons, [0.1, 0.6])
+    expected = np.flatnonzero((lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max))
+    np.testing.assert_array_equal(index.bbox(lat_min, lon_min, lat_max, lon_max), expected)
+
+
+def test_colocated_groups_match_brute_force():
+    lats, lons = _points("milano", n=100, seed=2)
+    # fermate ripetute, anche a catena (a-b e b-c entro la tolleranza, a-c oltre)
+    lats = np.r_[lats, lats[3], lats[3] + 0.00006, lats[3] + 0.00012, lats[40], 0.0, 0.0]
+    lons = np.r_[lons, lons[3], lons[3], lons[3], lons[40] + 0.00005, 179.99999, -179.99999]
+    groups = SpatialIndex(lats, lons).colocated_groups(tol_km=0.01)
+
+    # componenti connesse del grafo "distanza ≤ tolleranza"
+    close = haversine_matrix(lats, lons) <= 0.01
+    seen, expected = set(), []
+    for i in range(len(lats)):
+        if i in seen:
+            continue
+        component, frontier = {i}, [i]
+        while frontier:
+            new = set(np.flatnonzero(close[frontier.pop()]).tolist()) - component
+            component |= new
+            frontier.extend(new)
+        seen |= component
+        if len(component) > 1:
+            expected.append(sorted(component))
+
+    assert sorted(map(sorted, groups)) == sorted(expected)
+    assert [3, 100, 101, 102] in expected and [104, 105] in expected
+
+
+def test_k_larger_than_n():
+    lats, lons = _points("milano", n=5)
+    index = SpatialIndex(lats, lons)
+
+    idx, d = index.nearest(lats[0], lons[0], 50)
+    np.testing.assert_array_equal(idx, np.argsort(haversine_matrix(lats, lons)[0], kind="stable"))
+    assert len(d) == 5
+
+    nearest = index.nearest_all(50)
+    assert nearest.shape == (5, 4)
+    for i, row in enumerate(nearest):
+        assert sorted(row.tolist()) == [j for j in range(5) if j != i]
+
+
+def test_empty_and_single_point_index():
+    empty = SpatialIndex([], [])
+    assert len(empty.nearest(45.0, 9.0, 3)[0]) == 0
+    assert len(empty.radius(45.0, 9.0, 10)[0]) == 0
+    assert empty.colocated_groups() == []
+
+    single = SpatialIndex([45.0], [9.0])
+    assert single.nearest(0.0, 0.0, 3)[0].tolist() == [0]
+    assert single.nearest_all(3).shape == (1, 0)
@@ -0,0 +1,80 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import api
+from conftest import make_request, request_json
+from solver.instrumentation import REGISTRY
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(api.app)
+
+
+def _events(client, data):
+    events = []
+    with client.stream("POST", "/optimize/stream", json=data) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    return events
+
+
+def _solutions_found():
+    snapshot = REGISTRY.drain()
+    REGISTRY.merge(snapshot)
+    return sum(v for (name, _), v in snapshot["values"].items() if name == "solver_solutions_total")
+
+
+def test_stream_sends_improving_solutions_then_one_result(client):
+    request = make_request(n_orders=12, n_vehicles=3, seed=8)
+    request.time_limit_s = 2
+
+    events = _events(client, request_json(request))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds.count("solution") >= 1
+    assert kinds.count("result") == 1 and kinds[-1] == "result"
+    assert set(kinds) == {"solution", "result"}
+
+    objectives = [data["objective"] for kind, data in events if kind == "solution"]
+    assert all(later < earlier for earlier, later in zip(objectives, objectives[1:]))
+    assert all("path" in data["solution"] for kind, data in events if kind == "solution")
+    assert "geoRoutes" in events[-1][1]
+
+
+def test_stream_reports_pipeline_errors(client):
+    data = request_json(make_request(n_orders=2))
+    data["nodes"][0]["type"] = "CLIENT"
+    assert _events(client, data) == [("error", {"error": "Manca un nodo di tipo depot"})]
+
+
+@pytest.mark.parametrize("field, value", [("timeLimitSeconds", 0), ("timeLimitSeconds", -1), ("solutionLimit", 0)])
+@pytest.mark.parametrize("path", ["/optimize", "/optimize/stream", "/jobs"])
+def test_invalid_budgets_are_rejected(client, path, field, value):
+    data = {**request_json(make_request(n_orders=2)), field: value}
+    assert client.post(path, json=data).status_code == 422
+
+
+def test_solution_limit_is_respected(client):
+    request = make_request(n_orders=12, n_vehicles=3, seed=8)
+    request.time_limit_s = 30
+    request.solution_limit = 3
+
+    before, start = _solutions_found(), time.monotonic()
+    events = _events(client, request_json(request))
+    found = _solutions_found() - before
+
+    assert events[-1][0] == "result"
+    # la ricerca si ferma al limite di soluzioni, molto prima del limite di tempo
+    assert time.monotonic() - start < 10
+    assert 1 <= found <= 3
+    assert sum(kind == "solution" for kind, _ in events) <= 3
@@ -0,0 +1,43 @@
+import contextlib
+import io
+
+import pytest
+
+from conftest import make_problem, make_request
+from solver.routing_model_builder import RoutingModelBuilder
+
+
+def solve(request, use_transit_matrices):
+    customers, vehicles = make_problem(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        builder = RoutingModelBuilder(customers, vehicles, use_transit_matrices=use_transit_matrices)
+        # senza metaeuristica e con un limite di soluzioni la ricerca è deterministica
+        assignment = builder.solve(builder.get_default_parameters(time_limit_s=30, solution_limit=50))
+    assert assignment
+    return assignment.ObjectiveValue(), builder.get_index_routes(assignment), builder
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_transit_matrices_match_callbacks(seed):
+    request = make_request(n_orders=8, n_vehicles=3, seed=seed)
+    objective_cb, routes_cb, _ = solve(request, use_transit_matrices=False)
+    objective_tm, routes_tm, _ = solve(request, use_transit_matrices=True)
+    assert objective_tm == objective_cb
+    assert routes_tm == routes_cb
+
+
+def test_time_matrix_matches_time_callback():
+    # la matrice dei tempi registrata deve dare gli stessi transiti della total_time_fn
+    request = make_request(n_orders=5, n_vehicles=2, seed=3)
+    _, _, builder = solve(request, use_transit_matrices=False)
+    time_matrix = builder.make_time_matrix()
+    routing, manager = builder.routing, builder.manager
+    time_dimension = routing.GetDimensionOrDie("Time")
+
+    for from_index in range(routing.Size()):
+        for to_index in range(routing.Size() + routing.vehicles()):
+            # OR-Tools non percorre archi verso le partenze né dagli arrivi
+            if from_index == to_index or routing.IsStart(to_index) or routing.IsEnd(from_index):
+                continue
+            from_node, to_node = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
+            assert time_dimension.GetTransitValue(from_index, to_index, 0) == time_matrix[from_node, to_node]
@@ -0,0 +1,83 @@
+import contextlib
+import io
+
+from api.models import OrderStatus
+from conftest import make_problem, make_request
+from solver.routing_model_builder import RoutingModelBuilder
+
+# ordine → veicolo del piano corrente
+PLAN = {0: "v0", 1: "v0", 2: "v1", 3: "v1", 4: "v1"}
+
+
+def _builder(request):
+    customers, vehicles = make_problem(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return RoutingModelBuilder(customers, vehicles, use_transit_matrices=True)
+
+
+def _planned_request():
+    request = make_request(n_orders=7, n_vehicles=3, seed=5)
+    for i, vehicle_id in PLAN.items():
+        request.orders[i].status = OrderStatus.ASSIGNED
+        request.orders[i].assigned_vehicle_id = vehicle_id
+    return request
+
+
+def _check_feasible(builder, assignment):
+    routing, manager = builder.routing, builder.manager
+    capacity = routing.GetDimensionOrDie("Capacity")
+    served = {}
+    for vehicle_id, route in enumerate(builder.get_index_routes(assignment)):
+        for position, index in enumerate(route):
+            served[manager.IndexToNode(index)] = (vehicle_id, position)
+            load = assignment.Value(capacity.CumulVar(index))
+            assert 0 <= load <= builder.vehicles.vehicles[vehicle_id].capacity
+
+    for pickup, delivery in builder.customers.pdp_pairs:
+        assert pickup in served and delivery in served
+        assert served[pickup][0] == served[delivery][0]
+        assert served[pickup][1] < served[delivery][1]
+    return served
+
+
+def test_initial_routes_follow_the_plan():
+    request = _planned_request()
+    builder = _builder(request)
+    index_routes = builder.make_initial_routes()
+
+    node_vehicle = {builder.manager.IndexToNode(index): v
+                    for v, route in enumerate(index_routes) for index in route}
+    for i, vehicle_id in PLAN.items():
+        pickup, delivery = builder.customers.pdp_pairs[i]
+        assert node_vehicle[pickup] == node_vehicle[delivery] == int(vehicle_id[1:])
+    # gli ordini non assegnati non fanno parte del piano iniziale
+    assert len(node_vehicle) == 2 * len(PLAN)
+
+
+def test_warm_start_first_solution_is_feasible_and_keeps_the_plan():
+    request = _planned_request()
+    builder = _builder(request)
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        # una sola soluzione: la ricerca locale non ha modo di spostare gli ordini assegnati
+        assignment = builder.solve(builder.get_default_parameters(solution_limit=1))
+
+    assert assignment
+    assert "Warm start" in out.getvalue()
+    served = _check_feasible(builder, assignment)
+    for i, vehicle_id in PLAN.items():
+        pickup, _ = builder.customers.pdp_pairs[i]
+        assert served[pickup][0] == int(vehicle_id[1:])
+
+
+def test_local_search_starts_from_the_plan():
+    request = _planned_request()
+    builder = _builder(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        warm = builder.solve(builder.get_default_parameters(solution_limit=50))
+    _check_feasible(builder, warm)
+
+    # il piano iniziale è un punto di partenza: la ricerca locale lo migliora o lo mantiene
+    first = _builder(request)
+    with contextlib.redirect_stdout(io.StringIO()):
+        initial = first.solve(first.get_default_parameters(solution_limit=1))
+    assert warm.ObjectiveValue() <= initial.ObjectiveValue()
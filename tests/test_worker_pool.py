@@ -0,0 +1,112 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import api
+from api.worker_pool import WORKER_CRASHED
+from conftest import make_request, request_json
+
+
+@pytest.fixture(scope="module")
+def client():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SOLVER_WORKERS", "1")
+        # il context manager esegue il lifespan: pool di un processo, già avviato
+        with TestClient(api.app) as client:
+            yield client
+
+
+def _kill_workers():
+    for pid in list(api.solver_pool.executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def _phase_count(client, phase):
+    prefix = f'deliverygo_phase_seconds_count{{phase="{phase}"}} '
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(prefix):
+            return int(line[len(prefix):])
+    return 0
+
+
+def test_optimize_runs_in_the_worker_and_merges_metrics(client):
+    assert api.solver_pool is not None
+    request = make_request(n_orders=5, seed=1)
+    request.solution_limit = 20
+    validated = _phase_count(client, "validate")
+
+    response = client.post("/optimize", json=request_json(request))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert "error" not in body
+    # la richiesta è arrivata al worker come JSON ed è tornata indietro completa
+    assigned = {entry["orderId"] for entry in body["solution"]["assignedOrders"]}
+    assert assigned == {order.id for order in request.orders}
+    assert [path["vehicleId"] for path in body["solution"]["path"]] == ["v0", "v1"]
+    # "validate" si misura solo nel worker: compare qui perché le metriche sono state sommate
+    assert _phase_count(client, "validate") == validated + 1
+
+
+def test_pool_is_rebuilt_after_a_worker_dies_between_requests(client):
+    broken = api.solver_pool.executor
+    _kill_workers()
+    time.sleep(0.5)  # il pool si accorge del processo morto
+
+    request = make_request(n_orders=4, seed=2)
+    request.solution_limit = 10
+    response = client.post("/optimize", json=request_json(request))
+
+    assert "error" not in response.json()
+    assert api.solver_pool.executor is not broken
+
+
+def test_request_hit_by_a_worker_crash_gets_a_clean_error(client):
+    # abbastanza grande da essere ancora in ricerca quando il worker viene ucciso
+    request = make_request(n_orders=40, n_vehicles=4, seed=3)
+    request.time_limit_s = 20
+    killer = threading.Timer(3.0, _kill_workers)
+    killer.start()
+    response = client.post("/optimize", json=request_json(request))
+    killer.join()
+
+    assert response.status_code == 200
+    assert response.json() == {"error": WORKER_CRASHED}
+
+    retry = make_request(n_orders=4, seed=2)
+    retry.solution_limit = 10
+    assert "error" not in client.post("/optimize", json=request_json(retry)).json()
+
+
+def test_batch_scenarios_run_in_the_worker(client):
+    request = request_json(make_request(n_orders=4, seed=4))
+    vehicles = request["vehicles"]
+    batch = {"nodes": request["nodes"], "orders": request["orders"], "scenarios": [
+        {"name": "due", "vehicles": vehicles, "solutionLimit": 10},
+        {"name": "uno", "vehicles": vehicles[:1], "solutionLimit": 10},
+    ]}
+
+    body = client.post("/optimize/batch", json=batch).json()
+
+    # le matrici ristrette (CompactMatrix) arrivano al worker insieme allo scenario
+    assert [s["name"] for s in body["scenarios"]] == ["due", "uno"]
+    assert all("error" not in s and s["droppedOrders"] == 0 for s in body["scenarios"])
+    assert body["summary"]["best"] in ("due", "uno")
+
+
+def test_portfolio_runs_sequentially_inside_the_worker(client):
+    # nessun pool annidato nei worker: PORTFOLIO_WORKERS è forzato a 0 all'avvio
+    assert api.solver_pool.executor.submit(os.getenv, "PORTFOLIO_WORKERS").result() == "0"
+
+    request = make_request(n_orders=5, seed=5)
+    request.portfolio = True
+    request.time_limit_s = 2
+    body = client.post("/optimize", json=request_json(request)).json()
+
+    assert "error" not in body
+    assert len(body["portfolioStats"]) == 5
+    assert sum(s["best"] for s in body["portfolioStats"]) == 1